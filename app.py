@@ -6,15 +6,22 @@ import shutil
 import uuid
 from src.service.video_synthesis.voice_connect import connect_voice
 from src.service.translation import get_translator
-from src.service.tts import get_tts_client
-from src.workload_client import EasyVideoTransWorkloadClient
-from src.task_manager.celery_tasks.tasks import video_preview_task
+from src.service.tts import get_tts_client, preload_tts_models
+from src.service.tts.model_pool import tts_model_pool
+from src.service.tts.edge_tts import prepare_tts_output_dir
+from src.service.tts.segment_cache import get_tts_segment_cache
+from src.workload_client import EasyVideoTransWorkloadClient, WorkloadResponseError
+from src.task_manager.celery_tasks.tasks import video_preview_task, pipeline_stage_task, pipeline_streaming_task
+from src.service.pipeline import PipelineJobStore, ArtifactStore, STAGE_NAMES, plan_stages, find_missing_inputs
+from src.service.pipeline.streaming import STREAMING_STAGES, can_stream
+from src.data_models.workflow import Workflow
 from src.task_manager.celery_tasks.celery_utils import get_queue_length
 from src.utils.video_validator import validate_video_file
 from werkzeug.utils import secure_filename
 from pytubefix import YouTube
 from moviepy.editor import VideoFileClip
 from functools import wraps
+from celery import chain
 from flask import Flask, request, jsonify, render_template, send_from_directory
 from prometheus_flask_exporter import PrometheusMetrics
 
@@ -44,8 +51,14 @@ tts_duration_histogram = metrics.histogram(
 gpu_workload = EasyVideoTransWorkloadClient(
     audio_separation_endpoint=app.config['VOICE_BACKGROUND_SEPARATION_ENDPOINT'],
     audio_transcribe_endpoint=app.config['AUDIO_TRANSCRIBE_ENDPOINT'],
+    jobs_endpoint=app.config.get('GPU_JOBS_ENDPOINT'),
+    job_timeout=app.config.get('GPU_JOB_TIMEOUT'),
 )
 
+# XTTS v2 / CosyVoice2 models stay loaded between /tts requests, idle ones are evicted beyond the memory budget
+tts_model_pool.memory_budget_bytes = app.config.get('TTS_MODEL_POOL_MAX_MB', 12288) * 1024 * 1024
+preload_tts_models(app.config.get('TTS_PRELOAD_MODELS', []))
+
 
 def pytvzhen_stage():
     return os.environ[PYTVZHEN_STAGE] if PYTVZHEN_STAGE in os.environ else 'default'
@@ -348,6 +361,13 @@ def remove_audio_bg(video_id):
             f'not found at {output_path}, please extract it first')}), 404
 
     try:
+        # 非阻塞模式：提交任务后立即返回任务ID，通过 /gpu_job_status/<job_id> 查询进度
+        if not request.get_json().get('blocking', True):
+            job_id = gpu_workload.submit_audio_separation(audio_fn)
+            return jsonify({"message": log_info_return_str(
+                f"Submitted background music removal job {job_id} for {audio_fn}."),
+                "video_id": video_id, "gpu_job_id": job_id}), 202
+
         audio_bg_fn_path, audio_no_bg_fn = gpu_workload.separate_audio(audio_fn)
         return jsonify({"message": log_info_return_str(
             f"Remove remove background music for {audio_fn} as {audio_no_bg_fn} and {audio_bg_fn_path} successfully."),
@@ -413,6 +433,13 @@ def transcribe(video_id):
             f'not found at {audio_no_bg_path}, please extract it first')}), 404
 
     try:
+        # 非阻塞模式：提交任务后立即返回任务ID，通过 /gpu_job_status/<job_id> 查询进度
+        if not request.get_json().get('blocking', True):
+            job_id = gpu_workload.submit_audio_transcribe(audio_no_bg_fn, [en_srt_fn, en_srt_merged_fn])
+            return jsonify({"message": log_info_return_str(
+                f"Submitted transcribe job {job_id} for {audio_no_bg_fn}."),
+                "video_id": video_id, "gpu_job_id": job_id}), 202
+
         gpu_workload.transcribe_audio(audio_no_bg_fn, [en_srt_fn, en_srt_merged_fn])
         return jsonify({"message": log_info_return_str(
             f"Transcribed SRT from {audio_no_bg_fn} as {en_srt_fn} and {en_srt_merged_fn} successfully."),
@@ -425,6 +452,15 @@ def transcribe(video_id):
         f'An error occurred while transcribing SRT from {audio_no_bg_fn} as {en_srt_fn} and {en_srt_merged_fn}: {exception}')}), 500
 
 
+@app.route('/gpu_job_status/<job_id>', methods=['GET'])
+@pytvzhen_api_request_counter
+def gpu_job_status(job_id):
+    try:
+        return jsonify(gpu_workload.get_job(job_id)), 200
+    except WorkloadResponseError as e:
+        return jsonify({"message": log_warning_return_str(f"GPU job {job_id} status unavailable: {e}")}), e.status_code
+
+
 @app.route('/srt_en/<video_id>', methods=['GET'])
 def srt_en_serve(video_id):
     output_path = app.config['OUTPUT_PATH']
@@ -550,7 +586,8 @@ def voice_connect(video_id):
         return jsonify({"message": log_warning_return_str(
             f'Voice directory {voiceDir} not found at {output_path}')}), 404
 
-    ret = connect_voice(app.logger, voiceDir, voice_connect_path, warning_log_path)
+    ret = connect_voice(app.logger, voiceDir, voice_connect_path, warning_log_path,
+                        workers=app.config.get('VOICE_CONNECT_WORKERS', 0))
     if ret:
         return jsonify({"message": log_info_return_str(
             f"Voice connect {voice_connect_fn} successfully."),
@@ -621,9 +658,8 @@ def tts(video_id):
         return jsonify({"message": log_warning_return_str(
             f'Chinese SRT {srt_fn} not found at {output_path}')}), 404
 
-    if os.path.exists(tts_dir):
-        # delete old tts dir
-        shutil.rmtree(tts_dir)
+    # 上次 Edge TTS 合成中途失败时保留已完成的片段，续传剩余部分；其它情况删除旧的配音目录
+    prepare_tts_output_dir(tts_dir, tts_vendor, data.get('resume', True))
 
     try:
         # 根据 TTS 供应商创建客户端
@@ -656,7 +692,8 @@ def tts(video_id):
                 character=character,
                 reference_audio_path=reference_audio_path,
                 language=language,
-                model_name=model_name
+                model_name=model_name,
+                latent_cache_dir=os.path.join(output_path, "xtts_speaker_latents")
             )
         elif tts_vendor == 'openai':
             # Parse OpenAI parameters
@@ -708,6 +745,9 @@ def tts(video_id):
         else:
              return jsonify({"message": log_warning_return_str(f"Unsupported TTS vendor: {tts_vendor}")}), 400
         
+        # 跨视频共用的片段缓存，只合成未命中的字幕
+        tts_client.segment_cache = get_tts_segment_cache(os.path.join(output_path, "tts_cache"),
+                                                         app.config.get('TTS_CACHE_MAX_MB', 2048) * 1024 * 1024)
         tts_client.srt_to_voice(srt_path, tts_dir)
         duration = time.time() - start_time
         return jsonify({"message": log_info_return_str(f"TTS success using {tts_vendor} (took {duration:.2f}s)."),"video_id": video_id, "duration": duration}), 200
@@ -796,6 +836,9 @@ def video_preview(video_id):
     
     # 获取字幕换行配置
     max_chars_per_line = data.get('max_chars_per_line', 30)
+
+    # 硬编码字幕时按关键帧分段并行编码的段数
+    encode_segments = int(data.get('encode_segments', app.config.get('PREVIEW_ENCODE_SEGMENTS', 1)))
     
     # 字幕文件路径
     srt_path = os.path.join(output_path, f"{video_id}_zh_merged.srt")
@@ -826,11 +869,13 @@ def video_preview(video_id):
     # 生成视频预览
     if blocking:
         video_preview_task.apply_async(
-            args=(video_source_path, voice_connect_path, audio_bg_path, video_out_path, srt_path, hardcode_subtitles, max_chars_per_line)).get()
+            args=(video_source_path, voice_connect_path, audio_bg_path, video_out_path, srt_path, hardcode_subtitles, max_chars_per_line,
+                  encode_segments)).get()
         return jsonify({"message": log_info_return_str(
             f"Video preview {video_id} successfully rendered.")}), 200
 
-    task = video_preview_task.delay(video_source_path, voice_connect_path, audio_bg_path, video_out_path, srt_path, hardcode_subtitles, max_chars_per_line)
+    task = video_preview_task.delay(video_source_path, voice_connect_path, audio_bg_path, video_out_path, srt_path, hardcode_subtitles, max_chars_per_line,
+                                    encode_segments)
 
     queue_length = get_queue_length('video_preview')
     return jsonify({
@@ -867,6 +912,100 @@ def video_preview_status(task_id):
     return jsonify(response)
 
 
+# 流水线各阶段在 Celery worker 中执行，需要的配置随任务一起传过去
+PIPELINE_CONFIG_KEYS = ['VIDEO_MAX_DURATION', 'VOICE_BACKGROUND_SEPARATION_ENDPOINT', 'AUDIO_TRANSCRIBE_ENDPOINT',
+                        'GPU_JOBS_ENDPOINT', 'GPU_JOB_TIMEOUT', 'TTS_CACHE_MAX_MB', 'VOICE_CONNECT_WORKERS',
+                        'PREVIEW_ENCODE_SEGMENTS']
+
+
+def pipeline_job_store():
+    return PipelineJobStore(os.path.join(app.config['OUTPUT_PATH'], "pipeline_jobs"))
+
+
+def artifact_store():
+    return ArtifactStore(os.path.join(app.config['OUTPUT_PATH'], "artifacts"))
+
+
+@app.route('/pipeline', methods=['POST'])
+@pytvzhen_api_request_counter
+@require_video_id_from_post_request
+def pipeline(video_id):
+    """
+    按 Workflow 的开关在服务端依次执行各阶段，立即返回任务 ID，通过 /pipeline_status/<job_id> 查询各阶段状态
+    """
+    output_path = app.config['OUTPUT_PATH']
+
+    data = request.get_json()
+    workflow_params = dict(data.get('workflow', {}))
+    workflow_params['video Id'] = video_id
+    workflow = Workflow(workflow_params)
+
+    stages = plan_stages(workflow)
+    if not stages:
+        return jsonify({"message": log_warning_return_str("No stage enabled in workflow.")}), 400
+
+    force = data.get('force', [])
+    unknown_stages = [stage for stage in force if stage not in STAGE_NAMES]
+    if unknown_stages:
+        return jsonify({"message": log_warning_return_str(f"Unknown pipeline stages: {unknown_stages}")}), 400
+
+    job_store = pipeline_job_store()
+    context = {
+        "video_id": video_id,
+        "output_path": output_path,
+        "jobs_dir": job_store.jobs_dir,
+        "artifacts_dir": artifact_store().root_dir,
+        "workflow": workflow_params,
+        "options": data.get('options', {}),
+        "force": force,
+        "config": {key: app.config.get(key) for key in PIPELINE_CONFIG_KEYS},
+    }
+
+    missing = find_missing_inputs(stages, context)
+    if missing:
+        return jsonify({"message": log_warning_return_str(
+            f"Inputs not found and not produced by any enabled stage: {missing}")}), 404
+
+    job_id = uuid.uuid4().hex
+    job = job_store.create(job_id, video_id, stages)
+    signatures = []
+    for stage in stages:
+        # 流式模式下转写、翻译和配音在同一个任务中重叠执行
+        if context["options"].get('streaming', False) and can_stream(stages) and stage in STREAMING_STAGES:
+            if stage == STREAMING_STAGES[0]:
+                signatures.append(pipeline_streaming_task.si(job_id, STREAMING_STAGES, context))
+            continue
+        signatures.append(pipeline_stage_task.si(job_id, stage, context))
+    chain(*signatures).apply_async()
+
+    return jsonify({
+        "message": log_info_return_str(f"Submitted pipeline job {job_id} for {video_id} with stages {stages}."),
+        "video_id": video_id,
+        "pipeline_job_id": job_id,
+        "stages": job["stages"],
+        'queue_length': get_queue_length('pipeline')
+    }), 202
+
+
+@app.route('/pipeline_status/<job_id>', methods=['GET'])
+@pytvzhen_api_request_counter
+def pipeline_status(job_id):
+    job = pipeline_job_store().get(secure_filename(job_id))
+    if job is None:
+        return jsonify({"message": log_warning_return_str(f"Pipeline job {job_id} not found.")}), 404
+    return jsonify(job), 200
+
+
+@app.route('/artifacts/<video_id>', methods=['GET'])
+@pytvzhen_api_request_counter
+def artifacts(video_id):
+    """
+    流水线为该视频记录的产物：内容哈希、大小、生成阶段与耗时，以及是否就绪、是否因输入改变而过期
+    """
+    video_id = secure_filename(video_id)
+    return jsonify({"video_id": video_id, "artifacts": artifact_store().get_artifacts(video_id)}), 200
+
+
 @app.route('/video_preview/<video_id>', methods=['GET'])
 @pytvzhen_api_request_counter
 def video_preview_serve(video_id):
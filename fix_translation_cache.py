@@ -1,106 +1,99 @@
 #!/usr/bin/env python3
 """
 修复翻译缓存工具
-用于清理缓存并重新翻译有问题的字幕
+翻译缓存按字幕行存储在 translation_cache/segments/ 下，本工具找出某个视频中译文仍是英文的缓存行并删除，
+重新翻译时只有这些行会再次请求翻译服务
 """
 
 import os
-import json
 import sys
-from pathlib import Path
-
-def check_translation_cache(video_id, cache_dir="./output/translation_cache"):
-    """检查翻译缓存文件"""
-    cache_file = os.path.join(cache_dir, f"{video_id}_gpt_gpt_oss_120b.json")
-    
-    if not os.path.exists(cache_file):
-        print(f"❌ 缓存文件不存在: {cache_file}")
-        return False
-    
-    try:
-        with open(cache_file, 'r', encoding='utf-8') as f:
-            translations = json.load(f)
-        
-        print(f"📋 检查翻译缓存: {cache_file}")
-        print(f"   总条目数: {len(translations)}")
-        
-        # 检查是否有未翻译的英文内容
-        english_entries = []
-        for i, translation in enumerate(translations):
-            # 简单的英文检测（包含常见英文单词）
-            english_words = ['the', 'and', 'with', 'for', 'that', 'this', 'you', 'are', 'can', 'will', 'have', 'has', 'had']
-            text_lower = translation.lower()
-            if any(word in text_lower for word in english_words) and len(text_lower.split()) > 3:
-                english_entries.append((i, translation))
-        
-        if english_entries:
-            print(f"⚠️ 发现 {len(english_entries)} 个可能未翻译的条目:")
-            for index, text in english_entries:
-                print(f"   第 {index + 1} 行: {text[:50]}...")
-            return True
-        else:
-            print("✅ 所有条目都已正确翻译")
-            return False
-            
-    except Exception as e:
-        print(f"❌ 读取缓存文件失败: {e}")
-        return False
+import json
+import srt
+from src.service.translation.segment_cache import normalize_segment_text
+
+ENGLISH_WORDS = ['the', 'and', 'with', 'for', 'that', 'this', 'you', 'are', 'can', 'will', 'have', 'has', 'had']
+
+
+def looks_untranslated(translation):
+    """简单的英文检测（包含常见英文单词）"""
+    words = translation.lower().split()
+    return len(words) > 3 and any(word in words for word in ENGLISH_WORDS)
+
+
+def load_source_lines(video_id, output_dir="./output"):
+    """视频合并后的英文字幕中的各行，按缓存键的规则规范化"""
+    srt_path = os.path.join(output_dir, f"{video_id}_en_merged.srt")
+    if not os.path.exists(srt_path):
+        print(f"❌ 英文字幕文件不存在: {srt_path}")
+        return None
+    with open(srt_path, 'r', encoding='utf-8') as f:
+        return {normalize_segment_text(sub.content) for sub in srt.parse(f.read())}
 
-def clear_translation_cache(video_id, cache_dir="./output/translation_cache"):
-    """清理翻译缓存"""
-    cache_file = os.path.join(cache_dir, f"{video_id}_gpt_gpt_oss_120b.json")
-    
-    if os.path.exists(cache_file):
-        try:
-            os.remove(cache_file)
-            print(f"🗑️ 已删除缓存文件: {cache_file}")
-            return True
-        except Exception as e:
-            print(f"❌ 删除缓存文件失败: {e}")
-            return False
-    else:
-        print(f"⚠️ 缓存文件不存在: {cache_file}")
-        return True
 
-def fix_translation(video_id):
+def find_untranslated_segments(source_lines, cache_dir="./output/translation_cache"):
+    """返回原文属于 source_lines 且译文疑似未翻译的缓存文件 [(路径, 原文, 译文)]"""
+    segments_dir = os.path.join(cache_dir, "segments")
+    found = []
+    for dir_path, _, file_names in os.walk(segments_dir):
+        for file_name in file_names:
+            if not file_name.endswith(".json"):
+                continue
+            path = os.path.join(dir_path, file_name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    segment = json.load(f)
+            except Exception as e:
+                print(f"⚠️ 读取缓存文件失败 {path}: {e}")
+                continue
+            if normalize_segment_text(segment["source"]) in source_lines and looks_untranslated(segment["translation"]):
+                found.append((path, segment["source"], segment["translation"]))
+    return found
+
+
+def fix_translation(video_id, output_dir="./output"):
     """修复翻译问题"""
     print(f"🔧 开始修复视频 {video_id} 的翻译问题")
     print("=" * 60)
-    
-    # 1. 检查缓存
-    has_issues = check_translation_cache(video_id)
-    
-    if has_issues:
-        print(f"\n🔄 发现翻译问题，开始修复...")
-        
-        # 2. 清理缓存
-        if clear_translation_cache(video_id):
-            print(f"✅ 缓存清理完成")
-            
-            # 3. 提示用户重新翻译
-            print(f"\n📝 请重新执行翻译操作:")
-            print(f"   1. 访问 Web 界面: http://localhost:10310")
-            print(f"   2. 输入视频 ID: {video_id}")
-            print(f"   3. 选择翻译服务并点击 'Translate to Chinese'")
-            print(f"   4. 系统将重新翻译所有内容")
-            
-            return True
-        else:
-            print(f"❌ 缓存清理失败")
-            return False
-    else:
-        print(f"✅ 翻译缓存正常，无需修复")
+
+    source_lines = load_source_lines(video_id, output_dir)
+    if source_lines is None:
+        return False
+
+    cache_dir = os.path.join(output_dir, "translation_cache")
+    untranslated = find_untranslated_segments(source_lines, cache_dir)
+    print(f"📋 检查翻译缓存: {cache_dir}，字幕共 {len(source_lines)} 行")
+    if not untranslated:
+        print("✅ 翻译缓存正常，无需修复")
         return True
 
+    print(f"⚠️ 发现 {len(untranslated)} 个可能未翻译的缓存行:")
+    for path, source, translation in untranslated:
+        print(f"   {source[:50]} -> {translation[:50]}")
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    print("🗑️ 已删除以上缓存行")
+
+    print("\n📝 请重新执行翻译操作:")
+    print("   1. 访问 Web 界面: http://localhost:10310")
+    print(f"   2. 输入视频 ID: {video_id}")
+    print("   3. 选择翻译服务并点击 'Translate to Chinese'")
+    print("   4. 系统将只重新翻译以上各行，其余行直接使用缓存")
+    return True
+
+
 def main():
     """主函数"""
-    if len(sys.argv) != 2:
-        print("使用方法: python fix_translation_cache.py <video_id>")
-        print("示例: python fix_translation_cache.py Am54LhN2NLk")
+    if len(sys.argv) not in (2, 3):
+        print("使用方法: python fix_translation_cache.py <video_id> [output_dir]")
+        print("示例: python fix_translation_cache.py Am54LhN2NLk ./output")
         sys.exit(1)
-    
+
     video_id = sys.argv[1]
-    fix_translation(video_id)
+    output_dir = sys.argv[2] if len(sys.argv) == 3 else "./output"
+    fix_translation(video_id, output_dir)
+
 
 if __name__ == "__main__":
     main()
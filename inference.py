@@ -5,6 +5,7 @@ import numpy as np
 import soundfile as sf
 import librosa
 import torch
+import srt
 from functools import wraps
 
 from flask import Flask, request, jsonify
@@ -12,9 +13,13 @@ from prometheus_flask_exporter import PrometheusMetrics
 from prometheus_client import Summary, Histogram, Gauge
 
 from workloads.lib.separator import Separator
+from workloads.lib.batch_scheduler import PatchBatchScheduler
+from workloads.lib.stream_separator import StreamingSeparator
+from workloads.lib.job_queue import JobManager, JOB_STATES, JOB_SUCCEEDED, JOB_FAILED
 from workloads.lib import spec_utils, nets
-from workloads.lib.audio_processing.transcribe_audio import transcribe_audio_en
-from workloads.lib.srt import srt_sentense_merge
+from workloads.lib.audio_processing.transcribe_audio import (transcribe_audio_en, iter_transcribed_sentences_en,
+                                                             save_srt_file, preload_whisper_models)
+from workloads.lib.srt import srt_sentense_merge, merge_sentences
 
 # Initialize the Flask app
 app = Flask(__name__)
@@ -30,6 +35,13 @@ AUDIO_FILE_SIZE = Histogram("audio_file_size_bytes", "Size of input audio files"
                             buckets=[1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072, 262144, 524288, 1048576,
                                      2097152, 4194304, 8388608])
 CURRENT_INFERENCE = Gauge("current_inference", "Number of ongoing inferences")
+SEPARATION_QUEUE_DEPTH = Gauge("separation_queue_depth_patches", "Crop patches waiting for a shared separation batch")
+SEPARATION_QUEUE_JOBS = Gauge("separation_queue_jobs", "Separation jobs with patches waiting for a shared batch")
+SEPARATION_BATCH_FILL = Histogram("separation_batch_fill_ratio", "Shared separation batch size over the maximum batch size",
+                                  buckets=[0.125, 0.25, 0.375, 0.5, 0.625, 0.75, 0.875, 1.0])
+SEPARATION_BATCH_JOBS = Histogram("separation_batch_jobs", "Number of separation jobs sharing one batch",
+                                  buckets=[1, 2, 3, 4, 6, 8, 16])
+GPU_JOBS = Gauge("gpu_jobs", "Asynchronous workload jobs by state", ["state"])
 
 # Model setup from https://github.com/tsurumeso/vocal-remover/tree/develop
 MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'workloads/pretrained_models')
@@ -43,6 +55,42 @@ separator = Separator(model, device, batchsize=4,
                       cropsize=256,
                       postprocess=False)
 
+# Crop patches of all in-flight separation requests are batched together on the device.
+SEPARATION_MAX_BATCH_SIZE = int(os.environ.get("SEPARATION_MAX_BATCH_SIZE", 8))
+SEPARATION_BATCH_MAX_WAIT_MS = float(os.environ.get("SEPARATION_BATCH_MAX_WAIT_MS", 20))
+
+
+def observe_separation_batch(batch_size, n_jobs):
+    SEPARATION_BATCH_FILL.observe(batch_size / SEPARATION_MAX_BATCH_SIZE)
+    SEPARATION_BATCH_JOBS.observe(n_jobs)
+
+
+separation_scheduler = PatchBatchScheduler(separator._predict_batch, max_batch_size=SEPARATION_MAX_BATCH_SIZE,
+                                           max_wait=SEPARATION_BATCH_MAX_WAIT_MS / 1000,
+                                           on_batch=observe_separation_batch)
+separator.scheduler = separation_scheduler
+SEPARATION_QUEUE_DEPTH.set_function(separation_scheduler.pending_patches)
+SEPARATION_QUEUE_JOBS.set_function(separation_scheduler.pending_jobs)
+
+# Inputs at least this large are separated block by block so memory does not grow with the video length.
+# 100MB is roughly 10 minutes of 44.1kHz stereo 16-bit PCM.
+STREAMING_SEPARATION_MIN_BYTES = int(os.environ.get("STREAMING_SEPARATION_MIN_BYTES", 100 * 1024 * 1024))
+# Block size of the streaming mode, in model patches (128 STFT frames, about 3 seconds each)
+STREAMING_SEPARATION_BLOCK_SIZE = int(os.environ.get("STREAMING_SEPARATION_BLOCK_SIZE", 32))
+streaming_separator = StreamingSeparator(separator, sr=44100, n_fft=2048, hop_length=1024,
+                                         block_size=STREAMING_SEPARATION_BLOCK_SIZE)
+
+# Asynchronous jobs share the device with synchronous requests; a couple of workers keep the batch scheduler fed.
+GPU_JOB_WORKERS = int(os.environ.get("GPU_JOB_WORKERS", 2))
+gpu_jobs = JobManager(max_workers=GPU_JOB_WORKERS)
+for job_state in JOB_STATES:
+    GPU_JOBS.labels(state=job_state).set_function(lambda job_state=job_state: gpu_jobs.count(job_state))
+
+# Whisper models loaded at startup so the first transcription does not pay the model load, comma separated.
+# /audio-transcribe uses "medium"; set to an empty string to load lazily.
+WHISPER_PRELOAD_MODELS = [name.strip() for name in os.environ.get("WHISPER_PRELOAD_MODELS", "medium").split(",") if name.strip()]
+preload_whisper_models(WHISPER_PRELOAD_MODELS)
+
 # Setup input / output configurations
 INPUT_DIR = "./output"
 OUTPUT_DIR = "./output"
@@ -109,12 +157,11 @@ def require_output_filenames(func):
     return decorated_func
 
 
-@app.route("/audio-sep", methods=["POST"])
-@require_filename_points_to_existing_file
-def audio_separation(file_path):
+def separate_audio_file(file_path, streaming=None):
     """
-    Endpoint to perform audio separation.
-    Accepts an audio file and returns separated sources.
+    Separates file_path into background and vocal stems saved next to it in OUTPUT_DIR.
+    Large files, or streaming=True, are separated in bounded-memory blocks.
+    Returns the response payload, raises on failure.
     """
 
     file_stem_name = Path(file_path).stem
@@ -128,44 +175,51 @@ def audio_separation(file_path):
     start_time = time.time()
     CURRENT_INFERENCE.inc()  # Increment the gauge for ongoing inferences
     try:
-        x_spec, sample_rate = load_spectrogram(file_path)
-        app.logger.info(f"Done loading sound file: {file_path}")
-
-        y_spec, v_spec = separator.separate_tta(x_spec)
-
         background_wave_fn, voice_wave_fn = f"{file_stem_name}_bg.wav", f"{file_stem_name}_no_bg.wav"
         background_wave_path, voice_wave_path = os.path.join(OUTPUT_DIR, background_wave_fn), os.path.join(
             OUTPUT_DIR, voice_wave_fn)
-        wave = spec_utils.spectrogram_to_wave(y_spec)
-        sf.write(background_wave_path, wave.T, int(sample_rate))
-        app.logger.info(f"Done inversed stft for background, saved to: {background_wave_path}")
 
-        wave = spec_utils.spectrogram_to_wave(v_spec)
-        sf.write(voice_wave_path, wave.T, int(sample_rate))
-        app.logger.info(f"Done inversed stft for vocal, saved to: {voice_wave_path}")
+        if streaming is None:
+            streaming = file_size >= STREAMING_SEPARATION_MIN_BYTES
+        if streaming:
+            app.logger.info(f"Separating {file_path} in streaming mode")
+            streaming_separator.separate_tta_to_files(file_path, background_wave_path, voice_wave_path)
+            app.logger.info(f"Done streaming separation, saved to: {background_wave_path} and {voice_wave_path}")
+        else:
+            x_spec, sample_rate = load_spectrogram(file_path)
+            app.logger.info(f"Done loading sound file: {file_path}")
+
+            y_spec, v_spec = separator.separate_tta(x_spec)
+
+            wave = spec_utils.spectrogram_to_wave(y_spec)
+            sf.write(background_wave_path, wave.T, int(sample_rate))
+            app.logger.info(f"Done inversed stft for background, saved to: {background_wave_path}")
+
+            wave = spec_utils.spectrogram_to_wave(v_spec)
+            sf.write(voice_wave_path, wave.T, int(sample_rate))
+            app.logger.info(f"Done inversed stft for vocal, saved to: {voice_wave_path}")
 
         duration = time.time() - start_time
         INFERENCE_DURATION.observe(duration)
-        CURRENT_INFERENCE.dec()  # Decrement the gauge
 
         # Return the paths of the separated sources
-        response = {
+        return {
             "message": "Separation successful.",
             "files": [background_wave_fn, voice_wave_fn],
             "inference_duration_seconds": duration,
             "input_audio_size_bytes": file_size,
         }
-        return jsonify(response), 200
-    except Exception as e:
-        print(f"Error during separation: {e}")
-        CURRENT_INFERENCE.dec()  # Decrement the gauge in case of failure
-        return jsonify({"error": "An error occurred during audio separation."}), 500
+    finally:
+        CURRENT_INFERENCE.dec()  # Decrement the gauge
 
 
-@app.route("/audio-transcribe", methods=["POST"])
-@require_filename_points_to_existing_file
-@require_output_filenames
-def audio_transcribe(file_path, output_filepaths):
+def transcribe_audio_file(file_path, output_filepaths, emit=None):
+    """
+    Transcribes file_path into the English SRT and merged SRT given by output_filepaths.
+    With emit, every merged sentence is passed to it as soon as Whisper has produced it, as a dict of SRT timestamps
+    and content, and both files are written at the end.
+    Returns the response payload, raises on failure.
+    """
     app.logger.info(f"Transcribing file: {file_path}, output paths: {output_filepaths}")
 
     start_time = time.time()
@@ -173,23 +227,134 @@ def audio_transcribe(file_path, output_filepaths):
 
     try:
         en_srt_path, en_srt_merged_path = output_filepaths
-        transcribe_audio_en(app.logger, path=file_path, modelName="medium", language="en",
-                            srtFilePathAndName=en_srt_path)
-        srt_sentense_merge(app.logger, en_srt_path, en_srt_merged_path)
+        if emit is None:
+            transcribe_audio_en(app.logger, path=file_path, modelName="medium", language="en",
+                                srtFilePathAndName=en_srt_path)
+            srt_sentense_merge(app.logger, en_srt_path, en_srt_merged_path)
+        else:
+            subs, merged = [], []
+
+            def transcribed_sentences():
+                for sub in iter_transcribed_sentences_en(app.logger, path=file_path, modelName="medium", language="en"):
+                    subs.append(sub)
+                    yield sub
+
+            for sentence in merge_sentences(app.logger, transcribed_sentences()):
+                merged.append(sentence)
+                emit({"start": srt.timedelta_to_srt_timestamp(sentence.start),
+                      "end": srt.timedelta_to_srt_timestamp(sentence.end),
+                      "content": sentence.content})
+
+            # 与非流式转写写出相同的两个字幕文件
+            save_srt_file(subs, en_srt_path)
+            if merged:
+                save_srt_file(merged, en_srt_merged_path)
 
         duration = time.time() - start_time
         TRANSCRIBE_DURATION.observe(duration)
-        CURRENT_INFERENCE.dec()  # Decrement the gauge
-        response = {
+        return {
             "message": "Transcribe successful.",
             "transcribe_duration_seconds": duration,
         }
-        return jsonify(response), 200
+    finally:
+        CURRENT_INFERENCE.dec()  # Decrement the gauge
+
+
+@app.route("/audio-sep", methods=["POST"])
+@require_filename_points_to_existing_file
+def audio_separation(file_path):
+    """
+    Endpoint to perform audio separation.
+    Accepts an audio file and returns separated sources.
+    Large files, or requests with "streaming": true, are separated in bounded-memory blocks.
+    """
+    try:
+        return jsonify(separate_audio_file(file_path, request.get_json().get("streaming"))), 200
+    except Exception as e:
+        print(f"Error during separation: {e}")
+        return jsonify({"error": "An error occurred during audio separation."}), 500
+
+
+@app.route("/audio-transcribe", methods=["POST"])
+@require_filename_points_to_existing_file
+@require_output_filenames
+def audio_transcribe(file_path, output_filepaths):
+    try:
+        return jsonify(transcribe_audio_file(file_path, output_filepaths)), 200
     except Exception as e:
         print(f"Error during separation: {e}")
-        CURRENT_INFERENCE.dec()  # Decrement the gauge in case of failure
         return jsonify({"error": "An error occurred during audio transcribe."}), 500
 
 
+@app.route("/jobs/audio-sep", methods=["POST"])
+@require_filename_points_to_existing_file
+def submit_audio_separation_job(file_path):
+    """
+    Queues an audio separation and returns its job id at once.
+    Poll /jobs/<job_id> for the state and /jobs/<job_id>/result for the separated files.
+    """
+    job_id = gpu_jobs.submit("audio-sep", separate_audio_file, file_path, request.get_json().get("streaming"))
+    app.logger.info(f"Queued separation job {job_id} for {file_path}")
+    return jsonify({"message": "Separation job accepted.", "job_id": job_id}), 202
+
+
+@app.route("/jobs/audio-transcribe", methods=["POST"])
+@require_filename_points_to_existing_file
+@require_output_filenames
+def submit_audio_transcribe_job(file_path, output_filepaths):
+    """
+    Queues a transcription and returns its job id at once.
+    With "streaming": true, the merged sentences are readable from /jobs/<job_id>/partial while it is running.
+    """
+    if request.get_json().get("streaming", False):
+        job_id = gpu_jobs.submit_streaming("audio-transcribe", transcribe_audio_file, file_path, output_filepaths)
+    else:
+        job_id = gpu_jobs.submit("audio-transcribe", transcribe_audio_file, file_path, output_filepaths)
+    app.logger.info(f"Queued transcribe job {job_id} for {file_path}")
+    return jsonify({"message": "Transcribe job accepted.", "job_id": job_id}), 202
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = gpu_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job not found: {job_id}"}), 404
+
+    job.pop("result")
+    job.pop("partial", None)
+    return jsonify(job), 200
+
+
+@app.route("/jobs/<job_id>/partial", methods=["GET"])
+def job_partial(job_id):
+    """
+    Returns the items a streaming job has produced from index ?start= on, with the job state.
+    Pass the returned "next" as start of the following poll.
+    """
+    partial = gpu_jobs.get_partial(job_id, request.args.get("start", 0, type=int))
+    if partial is None:
+        return jsonify({"error": f"Job not found: {job_id}"}), 404
+    if partial["state"] == JOB_FAILED:
+        return jsonify(dict(partial, error=f"Job {job_id} failed: {partial['error']}")), 500
+    return jsonify(partial), 200
+
+
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id):
+    """
+    Returns the result payload of a finished job: 200 on success, 202 while it is still queued or running,
+    500 with the error if it failed.
+    """
+    job = gpu_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job not found: {job_id}"}), 404
+
+    if job["state"] == JOB_SUCCEEDED:
+        return jsonify(job["result"]), 200
+    if job["state"] == JOB_FAILED:
+        return jsonify({"error": f"Job {job_id} failed: {job['error']}"}), 500
+    return jsonify({"message": f"Job {job_id} is {job['state']}.", "state": job["state"]}), 202
+
+
 if __name__ == '__main__':
     app.run(host="0.0.0.0", port=8199)
@@ -3,18 +3,24 @@ import numpy as np
 import sys
 from unittest.mock import patch, MagicMock
 
-# Mock the heavy dependencies before importing inference
-sys.modules['soundfile'] = MagicMock()
-sys.modules['librosa'] = MagicMock()
-sys.modules['torch'] = MagicMock()
-sys.modules['workloads.lib.separator'] = MagicMock()
-sys.modules['workloads.lib.spec_utils'] = MagicMock()
-sys.modules['workloads.lib.nets'] = MagicMock()
-sys.modules['workloads.lib.audio_processing.transcribe_audio'] = MagicMock()
-sys.modules['workloads.lib.srt'] = MagicMock()
+# Mock the heavy dependencies while importing inference
+# 只在导入 inference 时替换这些模块，之后恢复，同一会话中的其它测试模块仍导入真实模块
+MOCKED_MODULES = ['soundfile', 'librosa', 'torch', 'workloads.lib.separator', 'workloads.lib.stream_separator',
+                  'workloads.lib.spec_utils', 'workloads.lib.nets', 'workloads.lib.audio_processing.transcribe_audio',
+                  'workloads.lib.srt']
+_original_modules = {name: sys.modules.get(name) for name in MOCKED_MODULES}
+sys.modules.update({name: MagicMock() for name in MOCKED_MODULES})
+# scipy 用 issubclass 判断数组是否为 torch.Tensor，需要它是一个类
+sys.modules['torch'].Tensor = type('Tensor', (), {})
 
 from inference import app  # noqa: E402
 
+for _name, _module in _original_modules.items():
+    if _module is None:
+        sys.modules.pop(_name, None)
+    else:
+        sys.modules[_name] = _module
+
 
 @pytest.fixture
 def client():
@@ -28,7 +34,7 @@ def client():
 @patch("inference.os.path.getsize", return_value=1024)  # Mock file size
 @patch("inference.load_spectrogram", return_value=("mock_spectrogram", 44100))
 @patch("inference.separator.separate_tta", return_value=("mock_bg_spec", "mock_v_spec"))
-@patch("workloads.lib.spec_utils.spectrogram_to_wave", return_value=np.array([[0.1, 0.2], [0.3, 0.4]]))
+@patch("inference.spec_utils.spectrogram_to_wave", return_value=np.array([[0.1, 0.2], [0.3, 0.4]]))
 @patch("inference.sf.write")  # Mock sound file write function
 def test_audio_separation_success(mock_sf_write, mock_spec_to_wave, mock_separate, mock_load_spec, mock_getsize,
                                   mock_exists, client):
@@ -42,6 +48,19 @@ def test_audio_separation_success(mock_sf_write, mock_spec_to_wave, mock_separat
     assert "input_audio_size_bytes" in data and data["input_audio_size_bytes"] == 1024
 
 
+@patch("inference.os.path.exists", return_value=True)
+@patch("inference.os.path.getsize", return_value=1024)
+@patch("inference.load_spectrogram")
+@patch("inference.streaming_separator.separate_tta_to_files", return_value=44100)
+def test_audio_separation_streaming(mock_streaming, mock_load_spec, mock_getsize, mock_exists, client):
+    """Test that streaming separation writes both stems without loading the whole spectrogram."""
+    response = client.post("/audio-sep", json={"file_name": "audio.wav", "streaming": True})
+    assert response.status_code == 200
+    assert response.get_json()["files"] == ["audio_bg.wav", "audio_no_bg.wav"]
+    mock_streaming.assert_called_once_with("./output/audio.wav", "./output/audio_bg.wav", "./output/audio_no_bg.wav")
+    mock_load_spec.assert_not_called()
+
+
 def test_audio_separation_missing_file_path(client):
     """Test when 'file_path' is missing in the request."""
     response = client.post("/audio-sep", json={})
@@ -76,3 +95,40 @@ def test_health_check(client):
     assert response.status_code == 200
     data = response.get_json()
     assert "message" in data and data["message"] == "Speech Separation API is running."
+
+
+@patch("inference.os.path.exists", return_value=True)
+@patch("inference.gpu_jobs.submit", return_value="job-1")
+def test_submit_audio_separation_job(mock_submit, mock_exists, client):
+    """Test that separation jobs are accepted without waiting for the separation."""
+    response = client.post("/jobs/audio-sep", json={"file_name": "audio.wav"})
+    assert response.status_code == 202
+    assert response.get_json()["job_id"] == "job-1"
+    mock_submit.assert_called_once()
+
+
+@patch("inference.gpu_jobs.get", return_value={"job_id": "job-1", "state": "running", "result": None, "error": None})
+def test_job_status_and_pending_result(mock_get, client):
+    """Test job status reporting while the job is running."""
+    response = client.get("/jobs/job-1")
+    assert response.status_code == 200
+    assert response.get_json()["state"] == "running"
+    assert "result" not in response.get_json()
+
+    response = client.get("/jobs/job-1/result")
+    assert response.status_code == 202
+
+
+@patch("inference.gpu_jobs.get", return_value={"job_id": "job-1", "state": "succeeded", "error": None,
+                                               "result": {"files": ["audio_bg.wav", "audio_no_bg.wav"]}})
+def test_job_result_succeeded(mock_get, client):
+    """Test that a finished job returns its result payload."""
+    response = client.get("/jobs/job-1/result")
+    assert response.status_code == 200
+    assert response.get_json()["files"] == ["audio_bg.wav", "audio_no_bg.wav"]
+
+
+def test_job_status_unknown_job(client):
+    """Test unknown job ids."""
+    assert client.get("/jobs/missing").status_code == 404
+    assert client.get("/jobs/missing/result").status_code == 404
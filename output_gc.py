@@ -0,0 +1,7 @@
+# 按时间和磁盘配额清理 OUTPUT_PATH 和 celery_results，配置见 configs/gc.json
+# python output_gc.py                    后台持续运行，并在 metrics_server_port 导出 Prometheus 指标
+# python output_gc.py --once --dry-run   只输出将被清理的产物报告，不删除
+from src.service.storage.garbage_collector import main
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+from .job_store import PipelineJobStore
+from .artifact_store import ArtifactStore
+from .stages import PIPELINE_STAGES, STAGE_NAMES, PipelineStageError, plan_stages, find_missing_inputs, run_stage
+
+__all__ = [
+    "PipelineJobStore",
+    "ArtifactStore",
+    "PIPELINE_STAGES",
+    "STAGE_NAMES",
+    "PipelineStageError",
+    "plan_stages",
+    "find_missing_inputs",
+    "run_stage",
+]
@@ -0,0 +1,262 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from src.utils.hash_util import file_digest
+
+
+def _params_digest(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _object_digests(snapshot):
+    if "files" in snapshot:
+        return [file_snapshot["digest"] for file_snapshot in snapshot["files"].values()]
+    return [snapshot["digest"]]
+
+
+class ArtifactStore:
+    """
+    Content-addressed store of pipeline artifacts with one manifest per video.
+
+    manifests/<video_id>.json 记录每个产物（文件或目录）的内容哈希、大小、修改时间，以及生成它的阶段、输入哈希、参数和耗时：
+    - 产物是否就绪只需查 manifest 并 stat 一次，不必重新读文件；
+    - 输入的内容变了（而不只是修改时间变了）下游才需要重做，重做后输出内容没变时，更下游的产物仍然有效；
+    - 产物内容存入 objects/，并按 (阶段, 输入哈希, 参数) 在 stages/ 建索引，输入相同的另一个视频（如重复上传的视频）
+      直接取用已有的产物，不必重做。
+
+    objects/ 中的对象在记录时与产物硬链接，不额外占用空间。产物之后被原地改写时对象也随之改变，所以取用前会重新校验哈希，
+    不一致的对象被丢弃；取用时复制到输出路径，两个视频的文件不会链接到一起。
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.objects_dir = os.path.join(root_dir, "objects")
+        self.manifests_dir = os.path.join(root_dir, "manifests")
+        self.stages_dir = os.path.join(root_dir, "stages")
+        self.lock = threading.Lock()
+        for directory in (self.objects_dir, self.manifests_dir, self.stages_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @staticmethod
+    def _write_json(path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _manifest_path(self, video_id):
+        return os.path.join(self.manifests_dir, f"{video_id}.json")
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _stage_index_path(self, stage, input_digests, params_digest):
+        key = hashlib.sha256(json.dumps([stage, input_digests, params_digest]).encode("utf-8")).hexdigest()
+        return os.path.join(self.stages_dir, f"{key}.json")
+
+    def get_manifest(self, video_id):
+        return self._read_json(self._manifest_path(video_id)) or {"video_id": video_id, "artifacts": {}}
+
+    @staticmethod
+    def _snapshot(path):
+        """产物当前的内容哈希、大小和修改时间；目录的哈希由其中各文件的相对路径和哈希得出"""
+        if not os.path.isdir(path):
+            stat = os.stat(path)
+            return {"digest": file_digest(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+        files = {}
+        for dir_path, _, file_names in os.walk(path):
+            for file_name in file_names:
+                file_path = os.path.join(dir_path, file_name)
+                files[os.path.relpath(file_path, path)] = ArtifactStore._snapshot(file_path)
+        digest = hashlib.sha256()
+        for relative_path in sorted(files):
+            digest.update(f"{relative_path}\0{files[relative_path]['digest']}\n".encode("utf-8"))
+        return {"digest": digest.hexdigest(), "size": sum(snapshot["size"] for snapshot in files.values()),
+                "files": files}
+
+    @staticmethod
+    def _unchanged(path, snapshot):
+        """只比较大小和修改时间，判断产物在记录之后是否被改动过"""
+        if "files" not in snapshot:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                return False
+            return stat.st_size == snapshot["size"] and stat.st_mtime_ns == snapshot["mtime_ns"]
+
+        if not os.path.isdir(path):
+            return False
+        relative_paths = {os.path.relpath(os.path.join(dir_path, file_name), path)
+                          for dir_path, _, file_names in os.walk(path) for file_name in file_names}
+        return relative_paths == set(snapshot["files"]) and all(
+            ArtifactStore._unchanged(os.path.join(path, relative_path), file_snapshot)
+            for relative_path, file_snapshot in snapshot["files"].items())
+
+    def _current_digest(self, artifacts, path):
+        """已记录且未改动的产物直接用 manifest 中的哈希，否则读文件计算；不存在时返回 None"""
+        entry = artifacts.get(os.path.basename(path))
+        if entry is not None and entry["path"] == path and self._unchanged(path, entry):
+            return entry["digest"]
+        if not os.path.exists(path):
+            return None
+        return self._snapshot(path)["digest"]
+
+    def _store_objects(self, path, snapshot):
+        items = snapshot["files"].items() if "files" in snapshot else [(None, snapshot)]
+        for relative_path, file_snapshot in items:
+            object_path = self._object_path(file_snapshot["digest"])
+            if os.path.exists(object_path):
+                continue
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            source_path = path if relative_path is None else os.path.join(path, relative_path)
+            tmp_path = f"{object_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                os.link(source_path, tmp_path)
+            except OSError:
+                shutil.copyfile(source_path, tmp_path)
+            os.replace(tmp_path, object_path)
+
+    def _verify_objects(self, snapshot):
+        for digest in _object_digests(snapshot):
+            object_path = self._object_path(digest)
+            if not os.path.exists(object_path):
+                return False
+            if file_digest(object_path) != digest:
+                # 对应的产物被原地改写过，对象已不是记录时的内容
+                os.remove(object_path)
+                return False
+        return True
+
+    def _materialize(self, path, snapshot):
+        """把对象复制到输出路径，先写临时文件再 os.replace"""
+        if "files" not in snapshot:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            shutil.copyfile(self._object_path(snapshot["digest"]), tmp_path)
+            os.replace(tmp_path, path)
+            return
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        for relative_path, file_snapshot in snapshot["files"].items():
+            file_path = os.path.join(path, relative_path)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            shutil.copyfile(self._object_path(file_snapshot["digest"]), file_path)
+
+    def _record(self, video_id, stage, outputs, inputs, params, started_at, duration, shared_from=None):
+        manifest = self.get_manifest(video_id)
+        artifacts = manifest["artifacts"]
+        input_digests = {os.path.basename(path): {"path": path, "digest": self._current_digest(artifacts, path)}
+                         for path in inputs}
+        params_digest = _params_digest(params)
+
+        snapshots = []
+        for path in outputs:
+            snapshot = self._snapshot(path)
+            self._store_objects(path, snapshot)
+            snapshots.append(snapshot)
+            artifacts[os.path.basename(path)] = dict(
+                snapshot, path=path, stage=stage, inputs=input_digests, params=params, params_digest=params_digest,
+                started_at=started_at, duration=duration, recorded_at=time.time(), shared_from=shared_from)
+        self._write_json(self._manifest_path(video_id), manifest)
+
+        ordered_digests = [input_digests[os.path.basename(path)]["digest"] for path in inputs]
+        if None not in ordered_digests and shared_from is None:
+            index = {"stage": stage, "video_id": video_id, "duration": duration,
+                     "outputs": [{key: value for key, value in snapshot.items() if key != "mtime_ns"}
+                                 for snapshot in snapshots]}
+            self._write_json(self._stage_index_path(stage, ordered_digests, params_digest), index)
+
+    def record(self, video_id, stage, outputs, inputs, params, started_at, duration):
+        """阶段成功后记录它的输出，并把输出内容存入 objects/"""
+        with self.lock:
+            self._record(video_id, stage, outputs, inputs, params, started_at, duration)
+
+    def is_recorded(self, video_id, outputs):
+        """输出都在 manifest 中且记录之后没有被改动"""
+        artifacts = self.get_manifest(video_id)["artifacts"]
+        for path in outputs:
+            entry = artifacts.get(os.path.basename(path))
+            if entry is None or entry["path"] != path or not self._unchanged(path, entry):
+                return False
+        return True
+
+    def is_current(self, video_id, outputs, inputs, params):
+        """输出已记录、未改动，且生成它们的输入内容和参数与现在相同"""
+        if not self.is_recorded(video_id, outputs):
+            return False
+        artifacts = self.get_manifest(video_id)["artifacts"]
+        params_digest = _params_digest(params)
+        current = {os.path.basename(path): {"path": path, "digest": self._current_digest(artifacts, path)}
+                   for path in inputs}
+        return all(artifacts[os.path.basename(path)]["params_digest"] == params_digest and
+                   artifacts[os.path.basename(path)]["inputs"] == current for path in outputs)
+
+    def _find_shared(self, video_id, stage, outputs, inputs, params):
+        artifacts = self.get_manifest(video_id)["artifacts"]
+        input_digests = [self._current_digest(artifacts, path) for path in inputs]
+        if None in input_digests:
+            return None
+        index = self._read_json(self._stage_index_path(stage, input_digests, _params_digest(params)))
+        if index is None or len(index["outputs"]) != len(outputs):
+            return None
+        return index
+
+    def can_restore(self, video_id, stage, outputs, inputs, params):
+        """相同阶段以相同的输入内容和参数运行过（可以是别的视频），见 restore"""
+        return self._find_shared(video_id, stage, outputs, inputs, params) is not None
+
+    def restore(self, video_id, stage, outputs, inputs, params):
+        """
+        相同阶段以相同的输入内容和参数运行过时（可以是别的视频），把当时的输出复制到 outputs
+
+        Returns:
+            是否已取用，False 时需要执行该阶段
+        """
+        with self.lock:
+            index = self._find_shared(video_id, stage, outputs, inputs, params)
+            if index is None or not all(self._verify_objects(snapshot) for snapshot in index["outputs"]):
+                return False
+
+            for path, snapshot in zip(outputs, index["outputs"]):
+                self._materialize(path, snapshot)
+            self._record(video_id, stage, outputs, inputs, params, time.time(), 0, shared_from=index["video_id"])
+            return True
+
+    def get_artifacts(self, video_id):
+        """
+        manifest 中各产物的概况
+
+        ready 表示产物仍与记录一致；stale 表示生成它的输入内容已经改变或不存在，产物需要重新生成。
+        """
+        artifacts = self.get_manifest(video_id)["artifacts"]
+        result = {}
+        for name, entry in artifacts.items():
+            result[name] = {
+                "stage": entry["stage"],
+                "digest": entry["digest"],
+                "size": entry["size"],
+                "duration": entry["duration"],
+                "recorded_at": entry["recorded_at"],
+                "shared_from": entry["shared_from"],
+                "ready": self._unchanged(entry["path"], entry),
+                "stale": any(self._current_digest(artifacts, recorded["path"]) != recorded["digest"]
+                             for recorded in entry["inputs"].values()),
+            }
+        return result
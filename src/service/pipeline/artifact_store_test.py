@@ -0,0 +1,72 @@
+import os
+import time
+import tempfile
+import unittest
+from src.service.pipeline.artifact_store import ArtifactStore
+
+
+def write(path, content, mtime=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+class TestArtifactStore(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_path = self.temp_dir.name
+        self.store = ArtifactStore(os.path.join(self.output_path, "artifacts"))
+        self.en = os.path.join(self.output_path, "abc_en_merged.srt")
+        self.zh = os.path.join(self.output_path, "abc_zh_merged.srt")
+        write(self.en, "hello")
+        write(self.zh, "你好")
+        self.store.record("abc", "translate", [self.zh], [self.en], {"tool": "gpt"}, time.time(), 1.5)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_only_content_changes_invalidate_outputs(self):
+        self.assertTrue(self.store.is_current("abc", [self.zh], [self.en], {"tool": "gpt"}))
+        self.assertFalse(self.store.is_current("abc", [self.zh], [self.en], {"tool": "deepl"}))
+
+        write(self.en, "hello", mtime=time.time() + 100)
+        self.assertTrue(self.store.is_current("abc", [self.zh], [self.en], {"tool": "gpt"}))
+
+        write(self.en, "hello world")
+        self.assertFalse(self.store.is_current("abc", [self.zh], [self.en], {"tool": "gpt"}))
+        artifact = self.store.get_artifacts("abc")["abc_zh_merged.srt"]
+        self.assertEqual((artifact["ready"], artifact["stale"], artifact["duration"]), (True, True, 1.5))
+
+        write(self.zh, "你好世界")
+        self.assertFalse(self.store.is_recorded("abc", [self.zh]))
+
+    def test_other_video_with_same_inputs_restores_outputs(self):
+        tts_dir = os.path.join(self.output_path, "abc_zh_source")
+        write(os.path.join(tts_dir, "1.wav"), "voice")
+        write(os.path.join(tts_dir, "voiceMap.srt"), "1.wav")
+        self.store.record("abc", "tts", [tts_dir], [self.zh], {"tts": "edge"}, time.time(), 3)
+
+        other_zh = os.path.join(self.output_path, "xyz_zh_merged.srt")
+        other_tts_dir = os.path.join(self.output_path, "xyz_zh_source")
+        write(other_zh, "你好")
+        self.assertFalse(self.store.restore("xyz", "tts", [other_tts_dir], [other_zh], {"tts": "openai"}))
+        self.assertTrue(self.store.restore("xyz", "tts", [other_tts_dir], [other_zh], {"tts": "edge"}))
+        self.assertEqual(sorted(os.listdir(other_tts_dir)), ["1.wav", "voiceMap.srt"])
+        self.assertEqual(self.store.get_artifacts("xyz")["xyz_zh_source"]["shared_from"], "abc")
+        self.assertTrue(self.store.is_current("xyz", [other_tts_dir], [other_zh], {"tts": "edge"}))
+
+    def test_rewritten_object_is_not_restored(self):
+        # 对象与产物硬链接，产物被原地改写后对象内容不再与哈希一致
+        write(self.zh, "被改写")
+        other_en = os.path.join(self.output_path, "xyz_en_merged.srt")
+        other_zh = os.path.join(self.output_path, "xyz_zh_merged.srt")
+        write(other_en, "hello")
+        self.assertFalse(self.store.restore("xyz", "translate", [other_zh], [other_en], {"tool": "gpt"}))
+        self.assertFalse(os.path.exists(other_zh))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import tempfile
+import threading
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+STAGE_PENDING = "pending"
+STAGE_RUNNING = "running"
+STAGE_SUCCEEDED = "succeeded"
+STAGE_SKIPPED = "skipped"
+STAGE_FAILED = "failed"
+STAGE_CANCELLED = "cancelled"
+
+
+class PipelineJobStore:
+    """
+    Keeps the state of end-to-end pipeline jobs as one JSON file per job.
+
+    The Flask app creates the job and the Celery workers running its stages update it, so the state lives on the
+    shared output volume rather than in either process. Writes go through a temporary file and os.replace, readers
+    never see a half written job.
+    """
+
+    def __init__(self, jobs_dir):
+        self.jobs_dir = jobs_dir
+        self.lock = threading.Lock()
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def _get_path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _write(self, job):
+        fd, tmp_path = tempfile.mkstemp(dir=self.jobs_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(job, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self._get_path(job["job_id"]))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def create(self, job_id, video_id, stages):
+        job = {
+            "job_id": job_id,
+            "video_id": video_id,
+            "state": JOB_QUEUED,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "stages": [{"name": stage, "state": STAGE_PENDING, "started_at": None, "finished_at": None,
+                        "duration": None, "message": None} for stage in stages],
+        }
+        with self.lock:
+            self._write(job)
+        return job
+
+    def get(self, job_id):
+        try:
+            with open(self._get_path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def update_stage(self, job_id, stage_name, state, message=None):
+        """更新一个阶段的状态，同时推导出整个任务的状态"""
+        with self.lock:
+            job = self.get(job_id)
+            if job is None:
+                return None
+
+            now = time.time()
+            for stage in job["stages"]:
+                if stage["name"] != stage_name:
+                    continue
+                stage["state"] = state
+                stage["message"] = message
+                if state == STAGE_RUNNING:
+                    stage["started_at"] = now
+                else:
+                    stage["finished_at"] = now
+                    if stage["started_at"] is not None:
+                        stage["duration"] = now - stage["started_at"]
+
+            if job["started_at"] is None:
+                job["started_at"] = now
+            if state == STAGE_FAILED:
+                # 后续阶段不会再执行
+                for stage in job["stages"]:
+                    if stage["state"] == STAGE_PENDING:
+                        stage["state"] = STAGE_CANCELLED
+                job["state"] = JOB_FAILED
+                job["finished_at"] = now
+            elif all(stage["state"] in (STAGE_SUCCEEDED, STAGE_SKIPPED) for stage in job["stages"]):
+                job["state"] = JOB_SUCCEEDED
+                job["finished_at"] = now
+            else:
+                job["state"] = JOB_RUNNING
+            self._write(job)
+            return job
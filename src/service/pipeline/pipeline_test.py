@@ -0,0 +1,112 @@
+import os
+import time
+import tempfile
+import unittest
+from unittest.mock import patch
+from src.data_models.workflow import Workflow
+from src.service.pipeline import stages
+from src.service.pipeline.job_store import PipelineJobStore
+from src.service.pipeline.stages import plan_stages, find_missing_inputs, run_stage, PipelineStageError
+
+
+def touch(path, mtime):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(path)
+    os.utime(path, (mtime, mtime))
+
+
+class TestPipelineStages(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_path = self.temp_dir.name
+        self.context = {
+            "video_id": "abc",
+            "output_path": self.output_path,
+            "workflow": {"video Id": "abc", "srt merge translate": True, "srt to voice srouce": True,
+                         "voice connect": True, "TTS": "edge"},
+            "options": {},
+            "force": [],
+        }
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_plan_follows_workflow_switches_in_order(self):
+        workflow = Workflow({"video zh preview": True, "audio transcribe": True, "download video": True})
+        self.assertEqual(plan_stages(workflow), ["download", "transcribe", "video_preview"])
+
+    def test_missing_inputs_account_for_earlier_stages(self):
+        planned = ["translate", "tts", "voice_connect"]
+        self.assertEqual(find_missing_inputs(planned, self.context),
+                         [("translate", os.path.join(self.output_path, "abc_en_merged.srt"))])
+        touch(os.path.join(self.output_path, "abc_en_merged.srt"), time.time())
+        self.assertEqual(find_missing_inputs(planned, self.context), [])
+
+    def test_stage_is_skipped_only_when_outputs_are_newer(self):
+        srt_en_merged = os.path.join(self.output_path, "abc_en_merged.srt")
+        srt_zh_merged = os.path.join(self.output_path, "abc_zh_merged.srt")
+        touch(srt_en_merged, 1000)
+        touch(srt_zh_merged, 2000)
+        with patch.dict(stages.STAGE_RUNNERS, {"translate": lambda context: "translated"}):
+            self.assertEqual(run_stage("translate", self.context)[0], "skipped")
+            self.assertEqual(run_stage("translate", dict(self.context, force=["translate"])),
+                             ("succeeded", "translated"))
+            touch(srt_en_merged, 3000)
+            self.assertEqual(run_stage("translate", self.context), ("succeeded", "translated"))
+
+    def test_stage_outputs_are_shared_across_videos(self):
+        def translate(context):
+            translated.append(context["video_id"])
+            touch(os.path.join(context["output_path"], f"{context['video_id']}_zh_merged.srt"), time.time())
+
+        translated = []
+        context = dict(self.context, artifacts_dir=os.path.join(self.output_path, "artifacts"))
+        other_context = dict(context, video_id="xyz")
+        for video_id in ["abc", "xyz"]:
+            with open(os.path.join(self.output_path, f"{video_id}_en_merged.srt"), "w") as f:
+                f.write("same subtitles")
+        with patch.dict(stages.STAGE_RUNNERS, {"translate": translate}):
+            self.assertEqual(run_stage("translate", context)[0], "succeeded")
+            self.assertEqual(run_stage("translate", context)[0], "skipped")
+            self.assertEqual(run_stage("translate", other_context)[0], "skipped")
+            self.assertEqual(run_stage("translate", dict(other_context, force=["translate"]))[0], "succeeded")
+        self.assertEqual(translated, ["abc", "xyz"])
+
+    def test_missing_input_fails_the_stage(self):
+        with self.assertRaises(PipelineStageError):
+            run_stage("voice_connect", self.context)
+
+
+class TestPipelineJobStore(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.job_store = PipelineJobStore(self.temp_dir.name)
+        self.job_store.create("job", "abc", ["translate", "tts", "voice_connect"])
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_job_state_follows_stages(self):
+        self.job_store.update_stage("job", "translate", "running")
+        self.assertEqual(self.job_store.get("job")["state"], "running")
+        self.job_store.update_stage("job", "translate", "skipped")
+        self.job_store.update_stage("job", "tts", "running")
+        self.job_store.update_stage("job", "tts", "succeeded")
+        self.job_store.update_stage("job", "voice_connect", "running")
+        job = self.job_store.update_stage("job", "voice_connect", "succeeded")
+        self.assertEqual(job["state"], "succeeded")
+        self.assertIsNotNone(job["stages"][1]["duration"])
+
+    def test_failure_cancels_remaining_stages(self):
+        self.job_store.update_stage("job", "translate", "running")
+        job = self.job_store.update_stage("job", "translate", "failed", "boom")
+        self.assertEqual(job["state"], "failed")
+        self.assertEqual([stage["state"] for stage in job["stages"]], ["failed", "cancelled", "cancelled"])
+        self.assertIsNone(self.job_store.get("missing"))
+
+
+if __name__ == '__main__':
+    unittest.main()
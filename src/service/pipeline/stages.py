@@ -0,0 +1,404 @@
+import os
+import json
+import time
+import logging
+from src.data_models.workflow import Workflow
+from src.service.pipeline.job_store import STAGE_SUCCEEDED, STAGE_SKIPPED
+from src.service.pipeline.artifact_store import ArtifactStore
+from src.utils.hash_util import file_digest
+
+logger = logging.getLogger(__name__)
+
+# 流水线各阶段按顺序执行，后一个阶段使用前一个阶段的产物；第二列为 Workflow 中对应的开关
+PIPELINE_STAGES = [
+    ("download", lambda workflow: workflow.download_video or workflow.download_fhd_video),
+    ("extract_audio", lambda workflow: workflow.extract_audio),
+    ("remove_audio_bg", lambda workflow: workflow.audio_remove),
+    ("transcribe", lambda workflow: workflow.audio_transcribe),
+    ("translate", lambda workflow: workflow.srt_merge_translate),
+    ("tts", lambda workflow: workflow.srt_to_voice_source),
+    ("voice_connect", lambda workflow: workflow.voice_connect),
+    ("video_preview", lambda workflow: workflow.video_zh_preview),
+]
+STAGE_NAMES = [name for name, _ in PIPELINE_STAGES]
+
+
+class PipelineStageError(Exception):
+    """Raised when a pipeline stage cannot produce its outputs."""
+    pass
+
+
+def plan_stages(workflow):
+    """返回 workflow 中开启的阶段，按执行顺序排列"""
+    return [name for name, enabled in PIPELINE_STAGES if enabled(workflow)]
+
+
+def get_workflow(context):
+    return Workflow(context.get("workflow", {}))
+
+
+def get_paths(context):
+    output_path, video_id = context["output_path"], context["video_id"]
+    return {
+        "video": os.path.join(output_path, f"{video_id}.mp4"),
+        "video_fhd": os.path.join(output_path, f"{video_id}_fhd.mp4"),
+        "audio": os.path.join(output_path, f"{video_id}.wav"),
+        "audio_no_bg": os.path.join(output_path, f"{video_id}_no_bg.wav"),
+        "audio_bg": os.path.join(output_path, f"{video_id}_bg.wav"),
+        "srt_en": os.path.join(output_path, f"{video_id}_en.srt"),
+        "srt_en_merged": os.path.join(output_path, f"{video_id}_en_merged.srt"),
+        "srt_zh_merged": os.path.join(output_path, f"{video_id}_zh_merged.srt"),
+        "tts_dir": os.path.join(output_path, f"{video_id}_zh_source"),
+        "voice_map": os.path.join(output_path, f"{video_id}_zh_source", "voiceMap.srt"),
+        "voice": os.path.join(output_path, f"{video_id}_zh.wav"),
+        "voice_connect_log": os.path.join(output_path, f"{video_id}_connect_warning.log"),
+        "preview": os.path.join(output_path, f"{video_id}_preview.mp4"),
+    }
+
+
+def _preview_video_source(context):
+    """与 /video_preview 相同，优先使用 1080p 视频"""
+    paths = get_paths(context)
+    if os.path.exists(paths["video_fhd"]) or get_workflow(context).download_fhd_video:
+        return paths["video_fhd"]
+    return paths["video"]
+
+
+def stage_inputs(stage, context):
+    paths = get_paths(context)
+    if stage == "download":
+        return []
+    if stage == "extract_audio":
+        return [paths["video"]]
+    if stage == "remove_audio_bg":
+        return [paths["audio"]]
+    if stage == "transcribe":
+        return [paths["audio_no_bg"]]
+    if stage == "translate":
+        return [paths["srt_en_merged"]]
+    if stage == "tts":
+        return [paths["srt_zh_merged"]]
+    if stage == "voice_connect":
+        return [paths["voice_map"]]
+    if stage == "video_preview":
+        inputs = [_preview_video_source(context), paths["voice"], paths["audio_bg"]]
+        if context.get("options", {}).get("hardcode_subtitles", False):
+            inputs.append(paths["srt_zh_merged"])
+        return inputs
+    raise ValueError(f"Unknown pipeline stage: {stage}")
+
+
+def stage_outputs(stage, context):
+    paths = get_paths(context)
+    if stage == "download":
+        workflow = get_workflow(context)
+        outputs = [paths["video"]] if workflow.download_video else []
+        if workflow.download_fhd_video:
+            outputs.append(paths["video_fhd"])
+        return outputs
+    if stage == "extract_audio":
+        return [paths["audio"]]
+    if stage == "remove_audio_bg":
+        return [paths["audio_no_bg"], paths["audio_bg"]]
+    if stage == "transcribe":
+        return [paths["srt_en"], paths["srt_en_merged"]]
+    if stage == "translate":
+        return [paths["srt_zh_merged"]]
+    if stage == "tts":
+        return [paths["voice_map"]]
+    if stage == "voice_connect":
+        return [paths["voice"]]
+    if stage == "video_preview":
+        return [paths["preview"]]
+    raise ValueError(f"Unknown pipeline stage: {stage}")
+
+
+def find_missing_inputs(stages, context):
+    """返回既不存在、也不会由前面的阶段生成的输入文件，提交任务前检查，避免跑到一半才失败"""
+    produced = set()
+    missing = []
+    for stage in stages:
+        for path in stage_inputs(stage, context):
+            if path not in produced and not os.path.exists(path):
+                missing.append((stage, path))
+        produced.update(stage_outputs(stage, context))
+    return missing
+
+
+def stage_artifacts(stage, context):
+    """阶段记录到产物仓库的输出，配音阶段的产物是整个 _zh_source 目录"""
+    if stage == "tts":
+        return [get_paths(context)["tts_dir"]]
+    return stage_outputs(stage, context)
+
+
+def stage_artifact_inputs(stage, context):
+    """与 stage_artifacts 对应的输入，配音连接读取的是整个 _zh_source 目录而不只是 voiceMap.srt"""
+    paths = get_paths(context)
+    return [paths["tts_dir"] if path == paths["voice_map"] else path for path in stage_inputs(stage, context)]
+
+
+def stage_params(stage, context):
+    """除输入文件外影响阶段输出的参数，参数变了输出需要重新生成"""
+    workflow, options = get_workflow(context), context.get("options", {})
+    if stage == "download":
+        return {"video_id": context["video_id"], "download_video": workflow.download_video,
+                "download_fhd_video": workflow.download_fhd_video}
+    if stage == "translate":
+        return {"tool": workflow.srt_merge_translate_tool, "model_name": options.get("model_name")}
+    if stage == "tts":
+        params = {"tts": workflow.TTS, "tts_param": workflow.TTS_param}
+        if workflow.TTS in ("xtts_v2", "cosyvoice2"):
+            # 参考音频默认是视频人声，按内容而不是路径区分；还不存在时执行阶段会报错
+            try:
+                params["reference_audio"] = file_digest(_tts_client_kwargs(workflow, context)["reference_audio_path"])
+            except PipelineStageError:
+                params["reference_audio"] = None
+        return params
+    if stage == "video_preview":
+        return {"hardcode_subtitles": options.get("hardcode_subtitles", False),
+                "max_chars_per_line": options.get("max_chars_per_line", 30)}
+    return {}
+
+
+def get_artifact_store(context):
+    """context 中没有 artifacts_dir 时不使用产物仓库，按修改时间判断阶段是否需要执行"""
+    artifacts_dir = context.get("artifacts_dir")
+    return ArtifactStore(artifacts_dir) if artifacts_dir else None
+
+
+def record_stage_artifacts(stage, context, started_at, duration):
+    artifact_store = get_artifact_store(context)
+    if artifact_store is not None:
+        artifact_store.record(context["video_id"], stage, stage_artifacts(stage, context),
+                              stage_artifact_inputs(stage, context), stage_params(stage, context),
+                              started_at, duration)
+
+
+def is_stage_up_to_date(stage, context):
+    """
+    输出都存在且是最新时，阶段可以跳过
+
+    输出由流水线记录在产物仓库中且之后没有被改动时，比较生成它们的输入内容和参数；
+    否则（如由单独的接口生成或上传的文件）沿用修改时间的判断：输出不早于输入即为最新。
+    """
+    outputs = stage_outputs(stage, context)
+    if not outputs or not all(os.path.exists(path) for path in outputs):
+        return False
+    artifact_store = get_artifact_store(context)
+    if artifact_store is not None and artifact_store.is_recorded(context["video_id"], stage_artifacts(stage, context)):
+        return artifact_store.is_current(context["video_id"], stage_artifacts(stage, context),
+                                         stage_artifact_inputs(stage, context), stage_params(stage, context))
+    if stage == "download":
+        from src.utils.video_validator import validate_video_file
+        return all(validate_video_file(path)[0] for path in outputs)
+
+    inputs = [path for path in stage_inputs(stage, context) if os.path.exists(path)]
+    if not inputs:
+        return True
+    return min(os.path.getmtime(path) for path in outputs) >= max(os.path.getmtime(path) for path in inputs)
+
+
+def can_skip_stage(stage, context):
+    """阶段的输出已是最新，或可以从产物仓库取用"""
+    if stage in context.get("force", []):
+        return False
+    if is_stage_up_to_date(stage, context):
+        return True
+    artifact_store = get_artifact_store(context)
+    return artifact_store is not None and artifact_store.can_restore(
+        context["video_id"], stage, stage_artifacts(stage, context), stage_artifact_inputs(stage, context),
+        stage_params(stage, context))
+
+
+# 各阶段依赖的服务在执行时才导入，提交任务和查询状态时不必加载 moviepy、pytubefix 和各 TTS 厂商的库
+def _gpu_workload(context):
+    from src.workload_client import EasyVideoTransWorkloadClient
+    config = context.get("config", {})
+    return EasyVideoTransWorkloadClient(
+        audio_separation_endpoint=config["VOICE_BACKGROUND_SEPARATION_ENDPOINT"],
+        audio_transcribe_endpoint=config["AUDIO_TRANSCRIBE_ENDPOINT"],
+        jobs_endpoint=config.get("GPU_JOBS_ENDPOINT"),
+        job_timeout=config.get("GPU_JOB_TIMEOUT"),
+    )
+
+
+def _run_download(context):
+    from pytubefix import YouTube
+    from src.utils.video_validator import validate_video_file
+
+    workflow, paths = get_workflow(context), get_paths(context)
+    video_id = context["video_id"]
+    max_duration = context.get("config", {}).get("VIDEO_MAX_DURATION")
+    yt = YouTube(f'https://www.youtube.com/watch?v={video_id}', proxies=None)
+    if max_duration is not None and yt.length > max_duration:
+        raise PipelineStageError(f"Video duration {yt.length}s is longer than {max_duration}s.")
+
+    downloads = []
+    if workflow.download_video:
+        downloads.append((paths["video"], yt.streams.filter(progressive=True, file_extension='mp4')
+                          .order_by('resolution').asc()))
+    if workflow.download_fhd_video:
+        downloads.append((paths["video_fhd"], yt.streams.filter(progressive=False, file_extension='mp4')
+                          .order_by('resolution').desc()))
+    for video_path, streams in downloads:
+        if os.path.exists(video_path) and validate_video_file(video_path)[0]:
+            continue
+        streams.first().download(output_path=context["output_path"], filename=os.path.basename(video_path))
+        is_valid, error_msg = validate_video_file(video_path)
+        if not is_valid:
+            raise PipelineStageError(f"Downloaded video file {video_path} is invalid: {error_msg}")
+    return f"Download video {video_id} successfully."
+
+
+def _run_extract_audio(context):
+    from moviepy.editor import VideoFileClip
+
+    paths = get_paths(context)
+    video = VideoFileClip(paths["video"])
+    try:
+        video.audio.write_audiofile(paths["audio"])
+    finally:
+        video.close()
+    return f"Extracted audio {paths['audio']} successfully."
+
+
+def _run_remove_audio_bg(context):
+    paths = get_paths(context)
+    bg_fn, no_bg_fn = _gpu_workload(context).separate_audio(os.path.basename(paths["audio"]))
+    return f"Remove background music as {no_bg_fn} and {bg_fn} successfully."
+
+
+def _run_transcribe(context):
+    paths = get_paths(context)
+    output_filenames = [os.path.basename(paths["srt_en"]), os.path.basename(paths["srt_en_merged"])]
+    _gpu_workload(context).transcribe_audio(os.path.basename(paths["audio_no_bg"]), output_filenames)
+    return f"Transcribed SRT as {output_filenames[0]} and {output_filenames[1]} successfully."
+
+
+def create_translator(context):
+    from src.service.translation import get_translator
+
+    workflow, options = get_workflow(context), context.get("options", {})
+    return get_translator(workflow.srt_merge_translate_tool, workflow.srt_merge_translate_key, proxies=None,
+                          base_url=options.get("base_url"), model_name=options.get("model_name"),
+                          cache_dir=os.path.join(context["output_path"], "translation_cache"))
+
+
+def _run_translate(context):
+    workflow, paths = get_workflow(context), get_paths(context)
+    if not create_translator(context).translate_srt(source_file_name_and_path=paths["srt_en_merged"],
+                                                    output_file_name_and_path=paths["srt_zh_merged"]):
+        raise PipelineStageError(f"{workflow.srt_merge_translate_tool} translate failed.")
+    return f"Using {workflow.srt_merge_translate_tool} translate to translate SRT successfully."
+
+
+def _tts_client_kwargs(workflow, context):
+    """
+    把 Workflow 的 TTS param 转成 get_tts_client 的参数
+
+    edge / fallback 的 TTS param 为角色名；其它厂商为 JSON 对象，键与 get_tts_client 的参数相同，
+    xtts_v2 和 cosyvoice2 未指定参考音频时使用视频人声。
+    """
+    params = workflow.TTS_param
+    if isinstance(params, str):
+        try:
+            params = json.loads(params) if params else {}
+        except json.JSONDecodeError:
+            params = {"character": params}
+    if not isinstance(params, dict):
+        params = {"character": str(params)}
+
+    kwargs = dict(params)
+    if workflow.TTS in ("xtts_v2", "cosyvoice2"):
+        kwargs.setdefault("reference_audio_path", get_paths(context)["audio_no_bg"])
+        if not os.path.exists(kwargs["reference_audio_path"]):
+            raise PipelineStageError(f"Reference audio file not found: {kwargs['reference_audio_path']}")
+    if workflow.TTS == "xtts_v2":
+        kwargs.setdefault("latent_cache_dir", os.path.join(context["output_path"], "xtts_speaker_latents"))
+    return kwargs
+
+
+def create_tts_client(context):
+    from src.service.tts import get_tts_client
+    from src.service.tts.segment_cache import get_tts_segment_cache
+
+    workflow, config = get_workflow(context), context.get("config", {})
+    kwargs = _tts_client_kwargs(workflow, context)
+    tts_client = get_tts_client(workflow.TTS, kwargs.pop("character", None), **kwargs)
+    tts_client.segment_cache = get_tts_segment_cache(os.path.join(context["output_path"], "tts_cache"),
+                                                     config.get("TTS_CACHE_MAX_MB", 2048) * 1024 * 1024)
+    return tts_client
+
+
+def _run_tts(context):
+    from src.service.tts.edge_tts import prepare_tts_output_dir
+
+    workflow, paths = get_workflow(context), get_paths(context)
+    # 与 /tts 相同，只有上次 Edge TTS 合成中途失败时续传剩余部分，其它情况删除旧的配音目录
+    prepare_tts_output_dir(paths["tts_dir"], workflow.TTS)
+
+    create_tts_client(context).srt_to_voice(paths["srt_zh_merged"], paths["tts_dir"])
+    return f"TTS success using {workflow.TTS}."
+
+
+def _run_voice_connect(context):
+    from src.service.video_synthesis.voice_connect import connect_voice
+
+    paths = get_paths(context)
+    if not connect_voice(logger, paths["tts_dir"], paths["voice"], paths["voice_connect_log"],
+                         workers=context.get("config", {}).get("VOICE_CONNECT_WORKERS", 0)):
+        raise PipelineStageError("Voice connect failed.")
+    return f"Voice connect {paths['voice']} successfully."
+
+
+def _run_video_preview(context):
+    from src.service.video_synthesis.video_preview import zhVideoPreview
+
+    paths, options, config = get_paths(context), context.get("options", {}), context.get("config", {})
+    ret = zhVideoPreview(None, _preview_video_source(context), paths["voice"], paths["audio_bg"],
+                         paths["srt_zh_merged"], paths["preview"],
+                         options.get("hardcode_subtitles", False), options.get("max_chars_per_line", 30),
+                         int(options.get("encode_segments", config.get("PREVIEW_ENCODE_SEGMENTS", 1))))
+    if ret is False:
+        raise PipelineStageError("Video preview failed.")
+    return f"Video preview {paths['preview']} successfully rendered."
+
+
+STAGE_RUNNERS = {
+    "download": _run_download,
+    "extract_audio": _run_extract_audio,
+    "remove_audio_bg": _run_remove_audio_bg,
+    "transcribe": _run_transcribe,
+    "translate": _run_translate,
+    "tts": _run_tts,
+    "voice_connect": _run_voice_connect,
+    "video_preview": _run_video_preview,
+}
+
+
+def run_stage(stage, context):
+    """
+    执行一个阶段，输出已是最新时跳过（force 中列出的阶段总是重新执行）
+
+    输入内容和参数相同的运行（可以是别的视频）的输出仍在产物仓库中时，直接取用而不执行。
+
+    Returns:
+        (state, message)，state 为 succeeded 或 skipped；阶段失败时抛出异常
+    """
+    if stage not in context.get("force", []):
+        if is_stage_up_to_date(stage, context):
+            return STAGE_SKIPPED, f"Outputs of {stage} are up to date, skipped."
+        artifact_store = get_artifact_store(context)
+        if artifact_store is not None and artifact_store.restore(
+                context["video_id"], stage, stage_artifacts(stage, context), stage_artifact_inputs(stage, context),
+                stage_params(stage, context)):
+            return STAGE_SKIPPED, f"Outputs of {stage} restored from the artifact store, skipped."
+
+    missing = [path for path in stage_inputs(stage, context) if not os.path.exists(path)]
+    if missing:
+        raise PipelineStageError(f"Inputs of {stage} not found: {', '.join(missing)}")
+    started_at = time.time()
+    message = STAGE_RUNNERS[stage](context)
+    record_stage_artifacts(stage, context, started_at, time.time() - started_at)
+    return STAGE_SUCCEEDED, message
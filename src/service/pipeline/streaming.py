@@ -0,0 +1,236 @@
+import os
+import time
+import queue
+import shutil
+import tempfile
+import threading
+import srt
+from src.service.pipeline.job_store import STAGE_RUNNING, STAGE_SUCCEEDED, STAGE_FAILED, STAGE_CANCELLED
+from src.service.pipeline.stages import (PipelineStageError, get_paths, get_workflow, stage_inputs, create_translator,
+                                         create_tts_client, record_stage_artifacts, _gpu_workload)
+
+# 流式模式中重叠执行的阶段，转写出的句子依次流过翻译和配音
+STREAMING_STAGES = ["transcribe", "translate", "tts"]
+# 阶段之间队列的长度上限（句），下游处理不过来时上游阻塞，内存占用有上限
+STREAMING_QUEUE_SIZE = int(os.environ.get("PIPELINE_STREAMING_QUEUE_SIZE", "32"))
+# 每次最多一起翻译 / 合成的句数，已就绪的句子会合并处理，但不会为了凑满一批而等待
+STREAMING_TRANSLATE_BATCH = 20
+STREAMING_TTS_BATCH = 8
+
+_END = object()
+
+
+class _PipelineStopped(Exception):
+    """Raised in a streaming stage when another stage has failed."""
+    pass
+
+
+class _StageQueue:
+    """阶段之间的有界队列；任一阶段出错时 stop_event 被置位，阻塞在队列上的其它阶段随即退出"""
+
+    def __init__(self, maxsize, stop_event):
+        self.queue = queue.Queue(maxsize)
+        self.stop_event = stop_event
+        self.closed = False
+
+    def put(self, item):
+        while True:
+            if self.stop_event.is_set():
+                raise _PipelineStopped()
+            try:
+                self.queue.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                pass
+
+    def close(self):
+        self.put(_END)
+
+    def get_batch(self, max_items):
+        """阻塞到至少有一项，再取出已经就绪的项，最多 max_items 项；队列关闭且取完后返回空列表"""
+        batch = []
+        while not batch and not self.closed:
+            if self.stop_event.is_set():
+                raise _PipelineStopped()
+            try:
+                item = self.queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if item is _END:
+                self.closed = True
+            else:
+                batch.append(item)
+        while batch and len(batch) < max_items and not self.closed:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _END:
+                self.closed = True
+            else:
+                batch.append(item)
+        return batch
+
+
+def can_stream(stages):
+    """转写、翻译、配音三个阶段都开启时才能流式执行"""
+    return all(stage in stages for stage in STREAMING_STAGES)
+
+
+def _synthesize_chunk(tts_client, translated, chunk_dir, tts_dir, first_index):
+    """
+    把一批译文写成一个小字幕文件交给 TTS 客户端合成，合成出的 wav 按全局序号移到 tts_dir
+
+    Returns:
+        [(start, end, wav 文件名)]，与 voiceMap.srt 中的条目一一对应
+    """
+    chunk_srt_path = chunk_dir + ".srt"
+    subs = [srt.Subtitle(index, sub.start, sub.end, text) for index, (sub, text) in enumerate(translated, start=1)]
+    with open(chunk_srt_path, "w", encoding="utf-8") as f:
+        f.write(srt.compose(subs))
+    tts_client.srt_to_voice(chunk_srt_path, chunk_dir)
+
+    with open(os.path.join(chunk_dir, "voiceMap.srt"), "r", encoding="utf-8") as f:
+        chunk_voice_map = list(srt.parse(f.read()))
+    entries = []
+    for offset, sub in enumerate(chunk_voice_map):
+        file_name = f"{first_index + offset}.wav"
+        os.replace(os.path.join(chunk_dir, sub.content), os.path.join(tts_dir, file_name))
+        entries.append((sub.start, sub.end, file_name))
+    shutil.rmtree(chunk_dir, ignore_errors=True)
+    os.remove(chunk_srt_path)
+    return entries
+
+
+def run_streaming_stages(context, on_stage_state):
+    """
+    重叠执行转写、翻译和配音：GPU 后端每转写出一句就交给翻译，译好的句子再交给 TTS 客户端，
+    三者之间用有界队列相连。最终写出的 _en.srt、_en_merged.srt、_zh_merged.srt 和 _zh_source 目录与逐阶段执行相同。
+
+    Args:
+        on_stage_state: 回调 (stage, state, message)，各阶段开始、结束或失败时调用
+
+    Returns:
+        {"sentences": 句数, "time_to_first_audio": 第一句配音完成的耗时, "duration": 总耗时}
+    """
+    paths = get_paths(context)
+    workflow = get_workflow(context)
+    missing = [path for path in stage_inputs("transcribe", context) if not os.path.exists(path)]
+    if missing:
+        raise PipelineStageError(f"Inputs of transcribe not found: {', '.join(missing)}")
+
+    started_at, start_time = time.time(), time.monotonic()
+    first_done = {}
+    counts = {}
+    stop_event = threading.Event()
+    errors = []
+    sentences = _StageQueue(STREAMING_QUEUE_SIZE, stop_event)
+    translations = _StageQueue(STREAMING_QUEUE_SIZE, stop_event)
+
+    def mark_first(stage):
+        first_done.setdefault(stage, time.monotonic() - start_time)
+
+    def finish(stage, count):
+        counts[stage] = count
+        message = (f"{stage} {count} sentences in {time.monotonic() - start_time:.2f}s, "
+                   f"first sentence after {first_done.get(stage, 0):.2f}s")
+        on_stage_state(stage, STAGE_SUCCEEDED, message)
+
+    def run_guarded(stage, fn):
+        try:
+            fn()
+        except _PipelineStopped:
+            pass
+        except Exception as e:
+            errors.append((stage, e))
+            stop_event.set()
+
+    def transcribe():
+        output_filenames = [os.path.basename(paths["srt_en"]), os.path.basename(paths["srt_en_merged"])]
+        count = 0
+        for item in _gpu_workload(context).iter_transcribed_sentences(os.path.basename(paths["audio_no_bg"]),
+                                                                      output_filenames):
+            count += 1
+            mark_first("transcribe")
+            sentences.put(srt.Subtitle(count, srt.srt_timestamp_to_timedelta(item["start"]),
+                                       srt.srt_timestamp_to_timedelta(item["end"]), item["content"]))
+        sentences.close()
+        finish("transcribe", count)
+
+    def translate():
+        translator = create_translator(context)
+        count = 0
+        while True:
+            batch = sentences.get_batch(STREAMING_TRANSLATE_BATCH)
+            if not batch:
+                break
+            for sub, text in zip(batch, translator.translate_texts([sub.content for sub in batch])):
+                translations.put((sub, text))
+            count += len(batch)
+            mark_first("translate")
+        translations.close()
+        finish("translate", count)
+
+    def tts():
+        tts_client = create_tts_client(context)
+        if os.path.exists(paths["tts_dir"]):
+            shutil.rmtree(paths["tts_dir"])
+        os.makedirs(paths["tts_dir"])
+        work_dir = tempfile.mkdtemp(prefix="streaming_tts_", dir=context["output_path"])
+        translated_subs, voice_map = [], []
+        try:
+            while True:
+                batch = translations.get_batch(STREAMING_TTS_BATCH)
+                if not batch:
+                    break
+                translated_subs.extend(srt.Subtitle(sub.index, sub.start, sub.end, text) for sub, text in batch)
+                # 与逐阶段执行相同，先经过一次 srt 的整理，去掉译文为空等会被 srt.compose 丢弃的句子
+                batch = [(sub, sub.content) for sub in srt.parse(srt.compose(
+                    [srt.Subtitle(sub.index, sub.start, sub.end, text) for sub, text in batch]))]
+                if batch:
+                    chunk_dir = os.path.join(work_dir, f"chunk_{len(voice_map) + 1}")
+                    voice_map.extend(_synthesize_chunk(tts_client, batch, chunk_dir, paths["tts_dir"],
+                                                       len(voice_map) + 1))
+                    mark_first("tts")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        zh_srt_content = srt.compose(translated_subs)
+        with open(paths["srt_zh_merged"], "w", encoding="utf-8") as f:
+            f.write(zh_srt_content)
+        voice_map_subs = [srt.Subtitle(index, start, end, file_name)
+                          for index, (start, end, file_name) in enumerate(voice_map, start=1)]
+        with open(paths["voice_map"], "w", encoding="utf-8") as f:
+            f.write(srt.compose(voice_map_subs))
+        with open(os.path.join(paths["tts_dir"], "sub.srt"), "w", encoding="utf-8") as f:
+            f.write(zh_srt_content)
+        finish("tts", len(voice_map))
+
+    for stage in STREAMING_STAGES:
+        on_stage_state(stage, STAGE_RUNNING, None)
+    print(f"Streaming transcribe, translate with {workflow.srt_merge_translate_tool} and TTS with {workflow.TTS} "
+          f"for {context['video_id']}")
+    threads = [threading.Thread(target=run_guarded, args=(stage, fn), name=f"pipeline-{stage}", daemon=True)
+               for stage, fn in [("transcribe", transcribe), ("translate", translate)]]
+    for thread in threads:
+        thread.start()
+    run_guarded("tts", tts)
+    for thread in threads:
+        # 出错后转写线程可能还在等 GPU 后端的下一句，不必等它退出，它下次入队时就会停下
+        thread.join(timeout=None if not stop_event.is_set() else 1)
+
+    if errors:
+        failed_stage, exception = errors[0]
+        for stage in STREAMING_STAGES:
+            if stage not in counts and stage not in [error_stage for error_stage, _ in errors]:
+                on_stage_state(stage, STAGE_CANCELLED, f"Stopped because {failed_stage} failed.")
+        on_stage_state(failed_stage, STAGE_FAILED, f"{type(exception).__name__}: {exception}")
+        raise PipelineStageError(f"Streaming stage {failed_stage} failed: {exception}") from exception
+
+    duration = time.monotonic() - start_time
+    # 三个阶段重叠执行，各自的耗时都记为整个流式执行的耗时
+    for stage in STREAMING_STAGES:
+        record_stage_artifacts(stage, context, started_at, duration)
+    return {"sentences": counts.get("tts", 0),
+            "time_to_first_audio": first_done.get("tts"),
+            "duration": duration}
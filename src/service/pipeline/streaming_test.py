@@ -0,0 +1,138 @@
+import os
+import datetime
+import tempfile
+import unittest
+import srt
+from unittest.mock import patch
+from src.service.pipeline import streaming
+from src.service.pipeline.stages import run_stage
+from src.service.pipeline.streaming import run_streaming_stages
+
+EN_SENTENCES = ["Hello there.", "How are you?", "", "Fine, thanks!", "Bye."]
+
+
+class UpperTranslator:
+    """与 Translator 相同的 translate_texts / translate_srt 接口"""
+
+    def translate_texts(self, texts):
+        # 译文为空的句子会被 srt.compose 丢弃，不会配音
+        return ["" if text == "..." else text.upper() for text in texts]
+
+    def translate_srt(self, source_file_name_and_path, output_file_name_and_path):
+        with open(source_file_name_and_path, "r", encoding="utf-8") as f:
+            subs = list(srt.parse(f.read()))
+        for sub, text in zip(subs, self.translate_texts([sub.content for sub in subs])):
+            sub.content = text
+        with open(output_file_name_and_path, "w", encoding="utf-8") as f:
+            f.write(srt.compose(subs))
+        return True
+
+
+class FileTTSClient:
+    """和真实的 TTS 客户端一样写出 1.wav, 2.wav ... 和 voiceMap.srt"""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+
+    def srt_to_voice(self, srt_file_path, output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        with open(srt_file_path, "r", encoding="utf-8") as f:
+            subs = list(srt.parse(f.read()))
+        for index, sub in enumerate(subs, start=1):
+            if sub.content == self.fail_on:
+                raise RuntimeError("synthesis failed")
+            with open(os.path.join(output_dir, f"{index}.wav"), "w", encoding="utf-8") as f:
+                f.write(sub.content)
+            sub.content = f"{index}.wav"
+        with open(os.path.join(output_dir, "voiceMap.srt"), "w", encoding="utf-8") as f:
+            f.write(srt.compose(subs))
+        return True
+
+
+class FakeWorkload:
+    def __init__(self, output_path):
+        self.output_path = output_path
+
+    def transcribe_audio(self, audio_filename, output_filenames):
+        list(self.iter_transcribed_sentences(audio_filename, output_filenames))
+
+    def iter_transcribed_sentences(self, audio_filename, output_filenames):
+        subs = [srt.Subtitle(index, datetime.timedelta(seconds=index * 2), datetime.timedelta(seconds=index * 2 + 1.5),
+                             content or "...") for index, content in enumerate(EN_SENTENCES, start=1)]
+        for sub in subs:
+            yield {"start": srt.timedelta_to_srt_timestamp(sub.start), "end": srt.timedelta_to_srt_timestamp(sub.end),
+                   "content": sub.content}
+        for file_name in output_filenames:
+            with open(os.path.join(self.output_path, file_name), "w", encoding="utf-8") as f:
+                f.write(srt.compose(subs))
+
+
+class TestStreamingStages(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.states = []
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def make_context(self, name):
+        output_path = os.path.join(self.temp_dir.name, name)
+        os.makedirs(output_path)
+        with open(os.path.join(output_path, "abc_no_bg.wav"), "wb") as f:
+            f.write(b"RIFF")
+        return {"video_id": "abc", "output_path": output_path, "options": {}, "force": [],
+                "workflow": {"audio transcribe": True, "srt merge translate": True, "srt to voice srouce": True}}
+
+    def read_outputs(self, context):
+        output_path = context["output_path"]
+        tts_dir = os.path.join(output_path, "abc_zh_source")
+        outputs = {name: open(os.path.join(tts_dir, name), encoding="utf-8").read() for name in os.listdir(tts_dir)}
+        outputs["zh"] = open(os.path.join(output_path, "abc_zh_merged.srt"), encoding="utf-8").read()
+        return outputs
+
+    @patch.object(streaming, "STREAMING_TTS_BATCH", 2)
+    @patch.object(streaming, "STREAMING_TRANSLATE_BATCH", 3)
+    def test_streaming_writes_same_artifacts_as_sequential_stages(self):
+        streaming_context = self.make_context("streaming")
+        sequential_context = self.make_context("sequential")
+        with patch.object(streaming, "_gpu_workload", lambda context: FakeWorkload(context["output_path"])), \
+                patch("src.service.pipeline.stages._gpu_workload", lambda context: FakeWorkload(context["output_path"])), \
+                patch("src.service.pipeline.stages.create_translator",
+                      lambda context: UpperTranslator()), \
+                patch.object(streaming, "create_translator",
+                             lambda context: UpperTranslator()), \
+                patch("src.service.pipeline.stages.create_tts_client", lambda context: FileTTSClient()), \
+                patch.object(streaming, "create_tts_client", lambda context: FileTTSClient()):
+            stats = run_streaming_stages(streaming_context, lambda *state: self.states.append(state))
+            for stage in ["transcribe", "translate"]:
+                run_stage(stage, sequential_context)
+            os.makedirs(os.path.join(sequential_context["output_path"], "abc_zh_source"))
+            FileTTSClient().srt_to_voice(os.path.join(sequential_context["output_path"], "abc_zh_merged.srt"),
+                                         os.path.join(sequential_context["output_path"], "abc_zh_source"))
+
+        streamed, sequential = self.read_outputs(streaming_context), self.read_outputs(sequential_context)
+        streamed.pop("sub.srt")
+        self.assertEqual(streamed, sequential)
+        self.assertEqual(stats["sentences"], len(EN_SENTENCES) - 1)
+        self.assertIsNotNone(stats["time_to_first_audio"])
+        self.assertEqual(sorted(stage for stage, state, _ in self.states if state == "succeeded"),
+                         ["transcribe", "translate", "tts"])
+        self.assertFalse([name for name in os.listdir(streaming_context["output_path"]) if name.startswith("streaming_tts_")])
+
+    def test_failed_stage_stops_the_others(self):
+        context = self.make_context("failing")
+        with patch.object(streaming, "_gpu_workload", lambda context: FakeWorkload(context["output_path"])), \
+                patch.object(streaming, "create_translator",
+                             lambda context: UpperTranslator()), \
+                patch.object(streaming, "create_tts_client", lambda context: FileTTSClient(fail_on="HELLO THERE.")):
+            with self.assertRaises(streaming.PipelineStageError):
+                run_streaming_stages(context, lambda *state: self.states.append(state))
+
+        final_states = {stage: state for stage, state, _ in self.states}
+        self.assertEqual(final_states["tts"], "failed")
+        self.assertTrue(all(final_states[stage] in ("succeeded", "cancelled") for stage in ["transcribe", "translate"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
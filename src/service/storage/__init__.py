@@ -0,0 +1,7 @@
+from .garbage_collector import OutputGarbageCollector, DEFAULT_CLASS_POLICIES, classify_output_file
+
+__all__ = [
+    "OutputGarbageCollector",
+    "DEFAULT_CLASS_POLICIES",
+    "classify_output_file",
+]
@@ -0,0 +1,354 @@
+import os
+import json
+import time
+import shutil
+import argparse
+from prometheus_client import Counter, Gauge, start_http_server
+from src.service.pipeline.job_store import JOB_QUEUED, JOB_RUNNING
+
+GC_DISK_USAGE = Gauge(
+    'output_gc_disk_usage_bytes', 'Disk usage of OUTPUT_PATH and celery_results by artifact class, hard links '
+    'counted in each class', ['artifact_class'])
+GC_DISK_USAGE_TOTAL = Gauge(
+    'output_gc_disk_usage_total_bytes', 'Disk usage of OUTPUT_PATH and celery_results, hard links counted once')
+GC_QUOTA = Gauge('output_gc_quota_bytes', 'Disk quota of OUTPUT_PATH and celery_results')
+GC_FILESYSTEM_FREE = Gauge('output_gc_filesystem_free_bytes', 'Free space on the filesystem holding OUTPUT_PATH')
+GC_RECLAIMED = Gauge(
+    'output_gc_last_run_reclaimed_bytes', 'Bytes reclaimed by the last garbage collection run', ['artifact_class'])
+GC_RECLAIMED_TOTAL = Counter(
+    'output_gc_reclaimed_bytes_total', 'Total bytes reclaimed by garbage collection', ['artifact_class'])
+GC_EVICTED_TOTAL = Counter(
+    'output_gc_evicted_total', 'Total number of artifacts evicted by garbage collection', ['artifact_class', 'reason'])
+GC_LAST_RUN = Gauge('output_gc_last_run_timestamp_seconds', 'Unix time of the last garbage collection run')
+
+# 各类产物的淘汰策略：
+# max_age_hours 为最近一次使用后最长保留的时间，None 表示不按时间淘汰；
+# quota_priority 为超出配额时的淘汰顺序，数字小的类别先按 LRU 淘汰，None 表示不因配额淘汰。
+# 字幕、参考音频和无法识别的文件体积小或由用户上传，不会被清理；其它产物都可以由流水线重新生成。
+DEFAULT_CLASS_POLICIES = {
+    "zip": {"max_age_hours": 24, "quota_priority": 0},
+    "celery_results": {"max_age_hours": 24, "quota_priority": 0},
+    "preview_audio_cache": {"max_age_hours": 72, "quota_priority": 1},
+    "artifact_objects": {"max_age_hours": 336, "quota_priority": 1},
+    "audio": {"max_age_hours": 168, "quota_priority": 2},
+    "tts_dir": {"max_age_hours": 168, "quota_priority": 2},
+    "preview": {"max_age_hours": 168, "quota_priority": 3},
+    "tts_cache": {"max_age_hours": None, "quota_priority": 3},
+    "video": {"max_age_hours": 336, "quota_priority": 4},
+    "translation_cache": {"max_age_hours": None, "quota_priority": 5},
+    "xtts_speaker_latents": {"max_age_hours": None, "quota_priority": 5},
+    "pipeline_jobs": {"max_age_hours": 720, "quota_priority": None},
+    "subtitles": {"max_age_hours": None, "quota_priority": None},
+    "reference_audio": {"max_age_hours": None, "quota_priority": None},
+    "other": {"max_age_hours": None, "quota_priority": None},
+}
+
+# 输出目录下的缓存和记录目录，其中每个文件单独按最近使用时间淘汰
+_DIRECTORY_CLASSES = {
+    "translation_cache": "translation_cache",
+    "tts_cache": "tts_cache",
+    "preview_audio_cache": "preview_audio_cache",
+    "xtts_speaker_latents": "xtts_speaker_latents",
+    "reference_audio": "reference_audio",
+    "pipeline_jobs": "pipeline_jobs",
+    os.path.join("artifacts", "objects"): "artifact_objects",
+    os.path.join("artifacts", "stages"): "artifact_objects",
+}
+
+
+def classify_output_file(name):
+    """输出目录顶层文件的产物类别"""
+    if name.endswith(".zip"):
+        return "zip"
+    if name.endswith("_preview.mp4"):
+        return "preview"
+    if name.endswith(".mp4") or name.endswith("_thumbnail.png"):
+        return "video"
+    if name.endswith(".wav"):
+        return "audio"
+    if name.endswith(".srt") or name.endswith(".log"):
+        return "subtitles"
+    return "other"
+
+
+def _file_stats(path):
+    """条目中各文件的 stat；条目为目录时包含其中所有文件"""
+    if not os.path.isdir(path):
+        return [os.stat(path)]
+    stats = []
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                stats.append(os.stat(os.path.join(dir_path, file_name)))
+            except FileNotFoundError:
+                pass
+    return stats
+
+
+class OutputGarbageCollector:
+    """
+    Keeps OUTPUT_PATH and the Celery file result backend within a disk quota.
+
+    每次 collect 先淘汰超过各类别最长保留时间的产物，仍超出配额时再按类别优先级和最近使用时间（atime 与 mtime 中较晚者）
+    淘汰，直到用量降到配额的 90%。最近 min_idle_seconds 内用过的产物，以及排队或执行中的流水线任务所属视频的产物不会被淘汰。
+    产物仓库的对象与输出文件硬链接，用量按 inode 计算，同一 inode 的所有链接都删除后才计入回收的空间。
+    """
+
+    def __init__(self, output_path, celery_results_path=None, quota_bytes=None, min_idle_seconds=1800,
+                 active_job_timeout_seconds=86400, class_policies=None):
+        self.output_path = output_path
+        self.celery_results_path = celery_results_path
+        self.quota_bytes = quota_bytes
+        self.min_idle_seconds = min_idle_seconds
+        self.active_job_timeout_seconds = active_job_timeout_seconds
+        self.class_policies = {name: dict(policy) for name, policy in DEFAULT_CLASS_POLICIES.items()}
+        for name, policy in (class_policies or {}).items():
+            self.class_policies.setdefault(name, dict(DEFAULT_CLASS_POLICIES["other"])).update(policy)
+
+    def _entry(self, path, artifact_class, video_name=None):
+        stats = _file_stats(path)
+        # 目录本身的修改时间也算在内，刚创建、还没有写入文件的目录不会被当作很久没用过
+        last_used = max([max(stat.st_atime, stat.st_mtime) for stat in stats] + [os.stat(path).st_mtime])
+        return {
+            "path": path,
+            "artifact_class": artifact_class,
+            "video_name": video_name,
+            "is_dir": os.path.isdir(path),
+            "size": sum(stat.st_size for stat in stats),
+            "last_used": last_used,
+            "inodes": [((stat.st_dev, stat.st_ino), stat.st_size, stat.st_nlink) for stat in stats],
+        }
+
+    def _file_entries(self, directory, artifact_class):
+        entries = []
+        for dir_path, _, file_names in os.walk(directory):
+            for file_name in file_names:
+                try:
+                    entries.append(self._entry(os.path.join(dir_path, file_name), artifact_class))
+                except FileNotFoundError:
+                    pass
+        return entries
+
+    def scan(self):
+        """列出可以单独淘汰的条目：顶层文件、各视频的 _zh_source 目录、缓存目录中的文件和 Celery 结果文件"""
+        entries = []
+        if os.path.isdir(self.output_path):
+            for name in sorted(os.listdir(self.output_path)):
+                path = os.path.join(self.output_path, name)
+                try:
+                    if not os.path.isdir(path):
+                        entries.append(self._entry(path, classify_output_file(name), name))
+                    elif name.endswith("_zh_source"):
+                        entries.append(self._entry(path, "tts_dir", name))
+                    elif name == "artifacts":
+                        for sub_dir in os.listdir(path):
+                            relative_dir = os.path.join(name, sub_dir)
+                            entries.extend(self._file_entries(os.path.join(self.output_path, relative_dir),
+                                                              _DIRECTORY_CLASSES.get(relative_dir, "other")))
+                    else:
+                        entries.extend(self._file_entries(path, _DIRECTORY_CLASSES.get(name, "other")))
+                except FileNotFoundError:
+                    continue
+        if self.celery_results_path and os.path.isdir(self.celery_results_path):
+            entries.extend(self._file_entries(self.celery_results_path, "celery_results"))
+        return entries
+
+    def active_pipeline_jobs(self, now):
+        """
+        排队或执行中的流水线任务 {job_id: video_id}
+
+        超过 active_job_timeout_seconds 仍未结束的任务视为 worker 已中断，不再保护它的产物。
+        """
+        jobs_dir = os.path.join(self.output_path, "pipeline_jobs")
+        active = {}
+        if not os.path.isdir(jobs_dir):
+            return active
+        for name in os.listdir(jobs_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(jobs_dir, name), "r", encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            if job.get("state") in (JOB_QUEUED, JOB_RUNNING) and \
+                    now - job.get("submitted_at", 0) < self.active_job_timeout_seconds:
+                active[job["job_id"]] = job["video_id"]
+        return active
+
+    def _is_protected(self, entry, active_jobs, now):
+        if now - entry["last_used"] < self.min_idle_seconds:
+            return True
+        if entry["artifact_class"] == "pipeline_jobs":
+            return os.path.splitext(os.path.basename(entry["path"]))[0] in active_jobs
+        video_name = entry["video_name"]
+        # 视频 ID 可能含有下划线，前缀匹配宁可多保护一些
+        return video_name is not None and any(
+            video_name == video_id or video_name.startswith(f"{video_id}_") or video_name.startswith(f"{video_id}.")
+            for video_id in active_jobs.values())
+
+    def _remove(self, entry):
+        try:
+            if entry["is_dir"]:
+                shutil.rmtree(entry["path"])
+            else:
+                os.remove(entry["path"])
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Warning: Failed to remove {entry['path']}: {e}")
+            return False
+        return True
+
+    def collect(self, dry_run=False, now=None):
+        """
+        执行一次清理
+
+        Args:
+            dry_run: 只计算并报告将被淘汰的条目，不删除文件，也不计入回收指标
+
+        Returns:
+            报告：清理前后的用量、配额、各类别的用量与回收量，以及每个被淘汰条目的路径、类别、大小和原因（age / quota）
+        """
+        now = time.time() if now is None else now
+        entries = self.scan()
+        active_jobs = self.active_pipeline_jobs(now)
+
+        # 按 inode 计算用量，链接数在删除时递减，降到 0 时才真正释放空间
+        links, inode_sizes, class_usage = {}, {}, {}
+        for entry in entries:
+            class_usage[entry["artifact_class"]] = class_usage.get(entry["artifact_class"], 0) + entry["size"]
+            for key, size, nlink in entry["inodes"]:
+                links.setdefault(key, nlink)
+                inode_sizes[key] = size
+        usage = sum(inode_sizes.values())
+        usage_before, class_usage_before = usage, dict(class_usage)
+
+        evicted, reclaimed = [], {}
+
+        def evict(entry, reason):
+            nonlocal usage
+            if not dry_run and not self._remove(entry):
+                return
+            freed = 0
+            for key, size, _ in entry["inodes"]:
+                links[key] -= 1
+                if links[key] == 0:
+                    freed += size
+            usage -= freed
+            artifact_class = entry["artifact_class"]
+            reclaimed[artifact_class] = reclaimed.get(artifact_class, 0) + freed
+            class_usage[artifact_class] -= entry["size"]
+            evicted.append({"path": entry["path"], "artifact_class": artifact_class, "size": entry["size"],
+                            "reclaimed": freed, "reason": reason})
+            if not dry_run:
+                GC_EVICTED_TOTAL.labels(artifact_class=artifact_class, reason=reason).inc()
+
+        candidates = [entry for entry in entries if not self._is_protected(entry, active_jobs, now)]
+        remaining = []
+        for entry in candidates:
+            max_age_hours = self.class_policies[entry["artifact_class"]]["max_age_hours"]
+            if max_age_hours is not None and now - entry["last_used"] > max_age_hours * 3600:
+                evict(entry, "age")
+            else:
+                remaining.append(entry)
+
+        if self.quota_bytes is not None and usage > self.quota_bytes:
+            remaining = [entry for entry in remaining
+                         if self.class_policies[entry["artifact_class"]]["quota_priority"] is not None]
+            remaining.sort(key=lambda entry: (self.class_policies[entry["artifact_class"]]["quota_priority"],
+                                              entry["last_used"]))
+            for entry in remaining:
+                if usage <= self.quota_bytes * 0.9:
+                    break
+                evict(entry, "quota")
+
+        report = {
+            "dry_run": dry_run,
+            "usage_bytes_before": usage_before,
+            "usage_bytes": usage,
+            "quota_bytes": self.quota_bytes,
+            "reclaimed_bytes": usage_before - usage,
+            "protected_jobs": active_jobs,
+            "classes": {artifact_class: {"usage_bytes_before": class_usage_before.get(artifact_class, 0),
+                                         "usage_bytes": class_usage.get(artifact_class, 0),
+                                         "reclaimed_bytes": reclaimed.get(artifact_class, 0)}
+                        for artifact_class in sorted(set(class_usage) | set(self.class_policies))},
+            "evicted": evicted,
+        }
+        self._export_metrics(report)
+        return report
+
+    def _export_metrics(self, report):
+        GC_DISK_USAGE_TOTAL.set(report["usage_bytes"] if not report["dry_run"] else report["usage_bytes_before"])
+        if self.quota_bytes is not None:
+            GC_QUOTA.set(self.quota_bytes)
+        if os.path.isdir(self.output_path):
+            GC_FILESYSTEM_FREE.set(shutil.disk_usage(self.output_path).free)
+        for artifact_class, stats in report["classes"].items():
+            if report["dry_run"]:
+                GC_DISK_USAGE.labels(artifact_class=artifact_class).set(stats["usage_bytes_before"])
+                continue
+            GC_DISK_USAGE.labels(artifact_class=artifact_class).set(stats["usage_bytes"])
+            GC_RECLAIMED.labels(artifact_class=artifact_class).set(stats["reclaimed_bytes"])
+            GC_RECLAIMED_TOTAL.labels(artifact_class=artifact_class).inc(stats["reclaimed_bytes"])
+        if not report["dry_run"]:
+            GC_LAST_RUN.set(time.time())
+
+
+def load_gc_config(config_path="./configs/gc.json", app_config_path="./configs/easyvideotrans.json"):
+    with open(config_path, 'r') as config_file:
+        config = json.load(config_file)
+    with open(app_config_path, 'r') as config_file:
+        config.setdefault('output_path', json.load(config_file)['OUTPUT_PATH'])
+
+    # 与 Celery worker 一样，结果目录可以由 CELERY_RESULT_BACKEND 指定
+    result_backend = os.getenv('CELERY_RESULT_BACKEND', '')
+    if result_backend.startswith('file://'):
+        config['celery_results_path'] = result_backend[len('file://'):]
+    config['quota_mb'] = int(os.getenv('GC_QUOTA_MB', config['quota_mb']))
+    config['interval_seconds'] = int(os.getenv('GC_INTERVAL_SECONDS', config['interval_seconds']))
+    config['metrics_server_port'] = int(os.getenv('GC_METRICS_SERVER_PORT', config['metrics_server_port']))
+    return config
+
+
+def create_garbage_collector(config):
+    return OutputGarbageCollector(
+        config['output_path'],
+        celery_results_path=config.get('celery_results_path'),
+        quota_bytes=config['quota_mb'] * 1024 * 1024 if config.get('quota_mb') else None,
+        min_idle_seconds=config.get('min_idle_minutes', 30) * 60,
+        active_job_timeout_seconds=config.get('active_job_timeout_hours', 24) * 3600,
+        class_policies=config.get('classes'),
+    )
+
+
+def format_size(size):
+    return f"{size / 1024 / 1024:.1f}MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evict old artifacts from OUTPUT_PATH and celery_results "
+                                                 "by age and disk quota.")
+    parser.add_argument("--config", default="./configs/gc.json", help="GC configuration file")
+    parser.add_argument("--dry-run", action="store_true", help="只报告将被淘汰的产物，不删除")
+    parser.add_argument("--once", action="store_true", help="执行一次并输出 JSON 报告后退出")
+    args = parser.parse_args()
+
+    config = load_gc_config(args.config)
+    collector = create_garbage_collector(config)
+    if args.once:
+        print(json.dumps(collector.collect(dry_run=args.dry_run), ensure_ascii=False, indent=2))
+        return
+
+    print(f"Output GC metrics server running on port: {config['metrics_server_port']}")
+    start_http_server(port=config['metrics_server_port'])
+    while True:
+        try:
+            report = collector.collect(dry_run=args.dry_run)
+            print(f"{'[dry run] ' if args.dry_run else ''}Output GC evicted {len(report['evicted'])} artifacts, "
+                  f"reclaimed {format_size(report['reclaimed_bytes'])}, usage {format_size(report['usage_bytes'])} "
+                  f"of quota {format_size(collector.quota_bytes or 0)}.")
+        except Exception as e:
+            print(f"Output GC failed: {e}")
+        time.sleep(config['interval_seconds'])
@@ -0,0 +1,81 @@
+import os
+import json
+import tempfile
+import unittest
+from src.service.storage.garbage_collector import OutputGarbageCollector
+
+NOW = 1_000_000_000
+HOUR = 3600
+
+
+class TestOutputGarbageCollector(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_path = os.path.join(self.temp_dir.name, "output")
+        self.celery_results_path = os.path.join(self.temp_dir.name, "celery_results")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, relative_path, size, hours_ago, root=None):
+        path = os.path.join(root or self.output_path, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        os.utime(path, (NOW - hours_ago * HOUR, NOW - hours_ago * HOUR))
+        return path
+
+    def remaining(self):
+        return sorted(os.path.relpath(os.path.join(dir_path, name), self.temp_dir.name)
+                      for dir_path, _, names in os.walk(self.temp_dir.name) for name in names)
+
+    def test_age_eviction_skips_recent_and_active_job_artifacts(self):
+        self.write("old_no_bg.wav", 10, hours_ago=200)
+        self.write("old_zh_source.zip", 10, hours_ago=30)
+        self.write("old_en_merged.srt", 10, hours_ago=5000)
+        self.write("new_no_bg.wav", 10, hours_ago=0.1)
+        self.write("busy_no_bg.wav", 10, hours_ago=200)
+        self.write("tts_cache/ab/ab.wav", 10, hours_ago=5000)
+        self.write("celery-task-meta-1", 10, hours_ago=30, root=self.celery_results_path)
+        jobs_dir = os.path.join(self.output_path, "pipeline_jobs")
+        os.makedirs(jobs_dir)
+        with open(os.path.join(jobs_dir, "job.json"), "w") as f:
+            json.dump({"job_id": "job", "video_id": "busy", "state": "running", "submitted_at": NOW - HOUR}, f)
+        os.utime(os.path.join(jobs_dir, "job.json"), (NOW - HOUR, NOW - HOUR))
+
+        collector = OutputGarbageCollector(self.output_path, self.celery_results_path)
+        report = collector.collect(dry_run=True, now=NOW)
+        self.assertEqual(sorted(os.path.basename(item["path"]) for item in report["evicted"]),
+                         ["celery-task-meta-1", "old_no_bg.wav", "old_zh_source.zip"])
+        self.assertEqual(len(self.remaining()), 8)
+
+        report = collector.collect(now=NOW)
+        self.assertEqual(report["reclaimed_bytes"], 30)
+        self.assertEqual(report["classes"]["audio"]["reclaimed_bytes"], 10)
+        self.assertEqual(self.remaining(), [
+            os.path.join("output", "busy_no_bg.wav"), os.path.join("output", "new_no_bg.wav"),
+            os.path.join("output", "old_en_merged.srt"), os.path.join("output", "pipeline_jobs", "job.json"),
+            os.path.join("output", "tts_cache", "ab", "ab.wav")])
+
+    def test_quota_evicts_by_class_priority_then_lru(self):
+        self.write("a.mp4", 100, hours_ago=10)
+        self.write("a_no_bg.wav", 100, hours_ago=5)
+        self.write("b_no_bg.wav", 100, hours_ago=2)
+        self.write("b_zh_source/1.wav", 100, hours_ago=1)
+        self.write("tts_cache/cd/cd.wav", 100, hours_ago=20)
+        # 产物仓库的对象与输出文件硬链接，只删除其中一个不释放空间
+        os.makedirs(os.path.join(self.output_path, "artifacts", "objects", "ef"))
+        os.link(os.path.join(self.output_path, "a.mp4"), os.path.join(self.output_path, "artifacts", "objects", "ef", "ef"))
+
+        collector = OutputGarbageCollector(self.output_path, quota_bytes=400)
+        report = collector.collect(now=NOW)
+        self.assertEqual(report["usage_bytes_before"], 500)
+        self.assertEqual([(os.path.basename(item["path"]), item["reclaimed"]) for item in report["evicted"]],
+                         [("ef", 0), ("a_no_bg.wav", 100), ("b_no_bg.wav", 100)])
+        self.assertEqual(report["usage_bytes"], 300)
+        self.assertTrue(os.path.exists(os.path.join(self.output_path, "b_zh_source", "1.wav")))
+
+
+if __name__ == '__main__':
+    unittest.main()
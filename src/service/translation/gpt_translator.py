@@ -1,17 +1,34 @@
-import requests
+import asyncio
 import json
-import concurrent.futures
+import hashlib
+import re
 import time
-import tenacity
 from .translator import Translator
+from .llm_http import AsyncLLMClient
 
 DEFAULT_URL = "https://api.openai.com/v1/"
 GHATGPT_TERMS_FILE = "../../../configs/gpt_terms.json"
+# 批量翻译时每个请求中字幕行的 token 预算，0 表示逐行翻译
+DEFAULT_BATCH_TOKEN_BUDGET = 1000
+DEFAULT_MAX_BATCH_LINES = 40
+# 翻译请求的最大并发数，实际并发数在此范围内根据限流和延迟自适应调整
+DEFAULT_MAX_CONCURRENCY = 30
+# 行号、换行等格式带来的额外 token
+BATCH_LINE_TOKEN_OVERHEAD = 4
+NUMBERED_LINE_PATTERN = re.compile(r"^(\d+)\s*[.、):：]\s*(.*)$")
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数，英文约每 4 个字符一个 token"""
+    return len(text) // 4 + 1
 
 
 class GPTTranslator(Translator):
-    def __init__(self, api_key, model_name="gpt-3.5-turbo-0125", base_url=None, proxies=None, terms_file=GHATGPT_TERMS_FILE, cache_dir="./translation_cache"):
+    def __init__(self, api_key, model_name="gpt-3.5-turbo-0125", base_url=None, proxies=None, terms_file=GHATGPT_TERMS_FILE,
+                 cache_dir="./translation_cache", batch_token_budget=DEFAULT_BATCH_TOKEN_BUDGET, max_batch_lines=DEFAULT_MAX_BATCH_LINES):
         super().__init__(cache_dir)
+        self.batch_token_budget = batch_token_budget
+        self.max_batch_lines = max_batch_lines
         self.api_key = api_key
         self.base_url = base_url if base_url else DEFAULT_URL
         self.model_name = model_name
@@ -22,6 +39,13 @@ class GPTTranslator(Translator):
     def get_translator_name(self):
         return f"gpt_{self.model_name.replace(':', '_').replace('-', '_')}"
 
+    def get_model_name(self):
+        return self.model_name
+
+    def get_glossary_version(self):
+        terms_json = json.dumps(self.terms, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(terms_json.encode("utf-8")).hexdigest()[:16]
+
     def load_terms(self, terms_file):
         try:
             with open(terms_file, 'r', encoding='utf-8') as f:
@@ -30,24 +54,23 @@ class GPTTranslator(Translator):
             print(f"Warning: Terms file {terms_file} not found, using empty terms dictionary")
             self.terms = {}
 
-    @tenacity.retry(wait=tenacity.wait_exponential(multiplier=1, min=3, max=6),
-                    stop=tenacity.stop_after_attempt(3),
-                    reraise=True)
-    def request_llm(self, system_text="",
-                    assistant_text='',
-                    user_text="",
-                    max_tokens=1200):
+    def _get_headers(self):
         headers = {
             "Content-Type": "application/json",
         }
-        
+
         # 只有在使用OpenAI官方API时才添加Authorization头
         if self.base_url == DEFAULT_URL or "openai.com" in self.base_url:
             headers["Authorization"] = f"Bearer {self.api_key}"
         elif self.api_key and self.api_key != "":  # 本地部署可能需要API密钥
             headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def _get_api_url(self):
+        return self.base_url.rstrip('/') + "/chat/completions"
 
-        payload = {
+    def _build_payload(self, system_text, assistant_text, user_text, max_tokens):
+        return {
             "model": self.model_name,
             "messages": [
                 {
@@ -65,26 +88,21 @@ class GPTTranslator(Translator):
             ],
             "max_tokens": max_tokens
         }
-        
-        # 确保URL以/结尾
-        api_url = self.base_url.rstrip('/') + "/chat/completions"
-        
-        # 移除调试打印，只保留进度信息
-        
-        response = requests.post(api_url, headers=headers, json=payload, proxies=self.proxies, timeout=60)
-        
-        # 检查响应状态
-        if response.status_code != 200:
-            raise Exception(f"API request failed: {response.status_code} - {response.text}")
-        
-        try:
-            return response.json()
-        except json.JSONDecodeError as e:
-            raise Exception(f"Invalid JSON response: {e}")
 
-    def process_text(self, text, max_tokens):
-        st = time.time()
-        
+    @staticmethod
+    def _extract_text_result(results):
+        # 处理Ollama API响应格式
+        if 'choices' in results and len(results['choices']) > 0:
+            return results['choices'][0]['message']['content']
+        elif 'response' in results:
+            # Ollama API格式
+            return results['response']
+        # 如果都不匹配，尝试其他可能的格式
+        if isinstance(results, dict) and 'message' in results:
+            return results['message'].get('content', '')
+        return str(results)
+
+    def _build_text_prompt(self, text):
         system_text = ("You are a professional subtitle translator that translates English subtitles to idiomatic "
                        "Chinese subtitles.")
         assistant_text = f"Here are some key terms and their translations:\n{json.dumps(self.terms, ensure_ascii=False)}"
@@ -100,156 +118,165 @@ class GPTTranslator(Translator):
         translated text
         ```
         """
+        return system_text, assistant_text, user_text
 
-        results = self.request_llm(system_text=system_text,
-                                   assistant_text=assistant_text,
-                                   user_text=user_text,
-                                   max_tokens=max_tokens)
-        et = time.time()
-        
-        # 处理Ollama API响应格式
-        if 'choices' in results and len(results['choices']) > 0:
-            text_result = results['choices'][0]['message']['content']
-        elif 'response' in results:
-            # Ollama API格式
-            text_result = results['response']
-        else:
-            # 如果都不匹配，尝试其他可能的格式
-            if isinstance(results, dict) and 'message' in results:
-                text_result = results['message'].get('content', '')
-            else:
-                text_result = str(results)
-        
+    def _build_batch_prompt(self, texts):
+        system_text = ("You are a professional subtitle translator that translates English subtitles to idiomatic "
+                       "Chinese subtitles.")
+        assistant_text = f"Here are some key terms and their translations:\n{json.dumps(self.terms, ensure_ascii=False)}"
+        numbered_text = "\n".join(f"{number}. {' '.join(text.split())}" for number, text in enumerate(texts, start=1))
+        user_text = f"""You are a professional video subtitle translator.
+        You need to translate the numbered subtitle lines below and correct obvious word errors based on the context.
+        Additionally, you need to consider some translation rules for terminology provided above.
+        Translate every line separately, do not merge or split lines, and keep each line's number.
+        Below are the {len(texts)} subtitle lines that need to be translated:\n\n
+        ```
+        {numbered_text}
+        ```
+        your output format should be exactly {len(texts)} lines:
+        ```
+        1. translated text
+        2. translated text
+        ```
+        """
+        return system_text, assistant_text, user_text
+
+    @staticmethod
+    def _parse_text_result(text_result):
         # 处理markdown格式
         if '```' in text_result:
             text_result = text_result.split('```')[1]
             text_result = text_result.strip().replace("\n", "").replace("translated text", "").replace("```", "")
-        
-        # 处理本地部署可能没有usage信息的情况
-        usage = results.get('usage', {})
-        model = results.get('model', self.model_name)
-        
-        # 移除统计信息打印，只保留进度信息
-        
-        result_dict = {"text_result": text_result,
-                       "model": model,
-                       "usage": usage,
-                       "all_usage": usage.get('prompt_tokens', 0) + usage.get('completion_tokens', 0) * 3 if usage else 0,
-                       'time': et - st}
-        return result_dict
-
-    def translate_en_to_zh(self, texts, max_tokens=1200, max_workers=30, timeout=300):
+        return text_result
+
+    def _split_into_batches(self, texts):
+        """按 token 预算把字幕行打包，返回每批的行索引列表"""
+        batches = []
+        batch = []
+        batch_tokens = 0
+        for index, text in enumerate(texts):
+            tokens = estimate_tokens(text) + BATCH_LINE_TOKEN_OVERHEAD
+            if batch and (batch_tokens + tokens > self.batch_token_budget or len(batch) >= self.max_batch_lines):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append(index)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    @staticmethod
+    def _parse_numbered_lines(text_result, expected_count):
+        """解析 "编号. 译文" 格式的输出，编号不完整或重复时返回 None"""
+        if '```' in text_result:
+            text_result = text_result.split('```')[1]
+        lines = {}
+        current = None
+        for line in text_result.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            match = NUMBERED_LINE_PATTERN.match(line)
+            if match:
+                current = int(match.group(1))
+                if current in lines:
+                    return None
+                lines[current] = match.group(2).strip()
+            elif current is not None:
+                # 模型把一行译文拆成了多行
+                lines[current] += line
+        if sorted(lines) != list(range(1, expected_count + 1)):
+            return None
+        return [lines[number] for number in range(1, expected_count + 1)]
+
+    async def _translate_batch(self, client, texts, max_tokens):
+        """
+        在一次请求中翻译多行字幕，系统提示和术语表只发送一次。
+
+        输出行数与输入不一致时把批次一分为二并行重试，单行时使用逐行翻译的提示。
+        """
+        if len(texts) == 1:
+            payload = self._build_payload(*self._build_text_prompt(texts[0]), max_tokens)
+            results = await client.chat(payload)
+            return [self._parse_text_result(self._extract_text_result(results))]
+
+        max_batch_tokens = max_tokens + 3 * sum(estimate_tokens(text) for text in texts)
+        payload = self._build_payload(*self._build_batch_prompt(texts), max_batch_tokens)
+        results = await client.chat(payload, cost=len(texts))
+
+        lines = self._parse_numbered_lines(self._extract_text_result(results), len(texts))
+        if lines is None:
+            middle = len(texts) // 2
+            print(f"⚠️ 批量翻译返回的行数与 {len(texts)} 行输入不一致，拆分为 {middle} 行和 {len(texts) - middle} 行重试")
+            first, second = await asyncio.gather(self._translate_batch(client, texts[:middle], max_tokens),
+                                                 self._translate_batch(client, texts[middle:], max_tokens))
+            return first + second
+        return lines
+
+    def translate_en_to_zh(self, texts, max_tokens=1200, max_workers=DEFAULT_MAX_CONCURRENCY, timeout=300, max_retries=3):
         """
         翻译英文文本到中文
         
         Args:
             texts: 要翻译的文本列表
             max_tokens: 最大token数
-            max_workers: 最大并发工作线程数
+            max_workers: 最大并发请求数，实际并发数根据限流和延迟自适应调整
             timeout: 超时时间（秒），默认5分钟
+            max_retries: 失败行的最大重试轮数
         """
-        print(f"🚀 开始翻译 {len(texts)} 个文本片段，最大并发数: {max_workers}，超时时间: {timeout}秒")
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # 提交所有任务
-            futures = {executor.submit(self.process_text, text, max_tokens): i for i, text in enumerate(texts)}
-            results = [None] * len(texts)  # 预分配结果列表
-            completed_count = 0
-            failed_indices = []  # 记录失败的索引
-            
-            # 处理完成的任务，带超时
-            try:
-                for future in concurrent.futures.as_completed(futures, timeout=timeout):
-                    try:
-                        result = future.result()
-                        index = futures[future]
-                        results[index] = result
-                        completed_count += 1
-                        
-                        # 打印进度
-                        remaining = len(texts) - completed_count
-                        print(f"✅ 完成 {completed_count}/{len(texts)} 个翻译请求，还剩 {remaining} 个请求")
-                        
-                        if remaining == 0:
-                            print("🎉 所有翻译请求已完成！")
-                        
-                    except Exception as e:
-                        index = futures[future]
-                        print(f"❌ 第 {index + 1} 个翻译请求失败: {e}")
-                        # 记录失败的索引，稍后重试
-                        failed_indices.append(index)
-                        completed_count += 1
-                        
-            except concurrent.futures.TimeoutError:
-                print(f"⏰ 翻译超时！已完成 {completed_count}/{len(texts)} 个请求")
-                # 取消未完成的任务
-                for future in futures:
-                    if not future.done():
-                        future.cancel()
-                        print(f"❌ 取消未完成的翻译请求")
-                
-                # 记录未完成的任务索引
-                for future, index in futures.items():
-                    if results[index] is None:
-                        failed_indices.append(index)
-                        print(f"⚠️ 第 {index + 1} 个请求因超时而失败")
-            
-            # 处理失败的翻译请求，尝试重试
-            if failed_indices:
-                print(f"🔄 开始重试 {len(failed_indices)} 个失败的翻译请求...")
-                retry_results = self._retry_failed_translations(texts, failed_indices, max_tokens)
-                
-                # 更新失败的结果
-                for i, failed_index in enumerate(failed_indices):
-                    if retry_results[i]:
-                        results[failed_index] = retry_results[i]
-                        print(f"✅ 第 {failed_index + 1} 个请求重试成功")
-                    else:
-                        # 重试3次都失败了，直接使用原文
-                        original_text = texts[failed_index]
-                        results[failed_index] = {
-                            "text_result": original_text,
-                            "model": self.model_name,
-                            "usage": {},
-                            "all_usage": 0,
-                            "time": 0
-                        }
-                        print(f"❌ 第 {failed_index + 1} 个请求重试3次后仍失败，使用原文")
-        
-        return [result['text_result'] for result in results]
+        return asyncio.run(self._translate_en_to_zh_async(texts, max_tokens, max_workers, timeout, max_retries))
 
-    def _retry_failed_translations(self, texts, failed_indices, max_tokens, max_retries=3):
-        """
-        重试失败的翻译请求
-        
-        Args:
-            texts: 原始文本列表
-            failed_indices: 失败的索引列表
-            max_tokens: 最大token数
-            max_retries: 最大重试次数
-            
-        Returns:
-            list: 重试结果列表
-        """
-        retry_results = [None] * len(failed_indices)
-        
-        for retry_attempt in range(max_retries):
-            print(f"🔄 第 {retry_attempt + 1} 次重试...")
-            
-            for i, failed_index in enumerate(failed_indices):
-                if retry_results[i] is None:  # 只重试尚未成功的
-                    try:
-                        # 增加延迟避免频率限制
-                        import time
-                        time.sleep(1)
-                        
-                        result = self.process_text(texts[failed_index], max_tokens)
-                        retry_results[i] = result
-                        print(f"✅ 重试成功: 第 {failed_index + 1} 个请求")
-                        
-                    except Exception as e:
-                        print(f"❌ 重试失败: 第 {failed_index + 1} 个请求 - {e}")
-                        if retry_attempt == max_retries - 1:  # 最后一次重试
-                            retry_results[i] = None
-        
-        return retry_results
+    async def _translate_en_to_zh_async(self, texts, max_tokens, max_workers, timeout, max_retries):
+        if self.batch_token_budget > 0:
+            units = self._split_into_batches(texts)
+        else:
+            units = [[index] for index in range(len(texts))]
+        print(f"🚀 开始翻译 {len(texts)} 个文本片段，共 {len(units)} 个请求，最大并发数: {max_workers}，超时时间: {timeout}秒")
+
+        # 官方 API 可以承受较高并发，本地部署（如 Ollama）从低并发开始逐步增加
+        is_openai = self.base_url == DEFAULT_URL or "openai.com" in self.base_url
+        client = AsyncLLMClient(self._get_api_url(), self._get_headers(), proxies=self.proxies,
+                                initial_concurrency=min(8 if is_openai else 2, max_workers), max_concurrency=max_workers)
+        results = [None] * len(texts)
+        completed = [0]
+
+        async def translate_unit(unit):
+            lines = await self._translate_batch(client, [texts[index] for index in unit], max_tokens)
+            for index, line in zip(unit, lines):
+                results[index] = line
+            completed[0] += len(unit)
+            print(f"✅ 完成 {completed[0]}/{len(texts)} 个文本片段的翻译")
+
+        deadline = time.monotonic() + timeout
+        async with client:
+            for attempt in range(max_retries + 1):
+                tasks = {asyncio.ensure_future(translate_unit(unit)): unit for unit in units}
+                done, not_done = await asyncio.wait(tasks, timeout=max(0.0, deadline - time.monotonic()))
+                for task in not_done:
+                    task.cancel()
+                await asyncio.gather(*not_done, return_exceptions=True)
+
+                failed_indices = []
+                for task, unit in tasks.items():
+                    if task in done and task.exception() is not None:
+                        print(f"❌ 第 {unit[0] + 1}-{unit[-1] + 1} 行的翻译请求失败: {task.exception()}")
+                    if task in not_done or task.exception() is not None:
+                        failed_indices.extend(unit)
+
+                if not failed_indices:
+                    print("🎉 所有翻译请求已完成！")
+                    break
+                if not_done:
+                    print(f"⏰ 翻译超时！已完成 {completed[0]}/{len(texts)} 个文本片段")
+                    break
+                if attempt < max_retries:
+                    # 失败的行逐行并行重试
+                    print(f"🔄 第 {attempt + 1} 次重试 {len(failed_indices)} 个失败的文本片段...")
+                    units = [[index] for index in failed_indices]
+
+        for index, result in enumerate(results):
+            if result is None:
+                print(f"❌ 第 {index + 1} 个文本片段翻译失败，使用原文")
+                results[index] = texts[index]
+        return results
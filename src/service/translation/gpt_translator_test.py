@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.service.translation import gpt_translator
+from src.service.translation.gpt_translator import GPTTranslator, estimate_tokens, BATCH_LINE_TOKEN_OVERHEAD
+from src.service.translation.llm_http import LLMRequestError
+
+
+class FakeLLMClient:
+    """按提示中代码块里的字幕行生成回复，reply(lines) 返回 None 时请求失败"""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.requests = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def chat(self, payload, cost=1):
+        block = payload["messages"][2]["content"].split("```")[1]
+        lines = [line.strip() for line in block.strip().splitlines()]
+        self.requests.append(lines)
+        content = self.reply(lines)
+        if content is None:
+            raise LLMRequestError(500, "server error", retryable=True)
+        return {"choices": [{"message": {"content": content}}]}
+
+
+def numbered(lines):
+    return "\n".join(f"{number}. 译{line.split('. ', 1)[1]}" for number, line in enumerate(lines, start=1))
+
+
+class TestGPTTranslator(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.translator = GPTTranslator(api_key="key", terms_file=os.path.join(self.temp_dir.name, "terms.json"),
+                                        cache_dir=os.path.join(self.temp_dir.name, "cache"))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def translate(self, texts, reply, max_retries=3):
+        client = FakeLLMClient(reply)
+        with patch.object(gpt_translator, "AsyncLLMClient", lambda *args, **kwargs: client):
+            results = self.translator.translate_en_to_zh(texts, max_retries=max_retries)
+        return results, client.requests
+
+    def test_batches_respect_token_budget_and_line_limit(self):
+        line = "x" * 36
+        line_tokens = estimate_tokens(line) + BATCH_LINE_TOKEN_OVERHEAD
+        self.translator.batch_token_budget = 2 * line_tokens
+        self.assertEqual(self.translator._split_into_batches([line] * 5), [[0, 1], [2, 3], [4]])
+
+        # 超过预算的单行单独成批
+        self.assertEqual(self.translator._split_into_batches([line, "y" * 400, line]), [[0], [1], [2]])
+
+        self.translator.batch_token_budget = 1000
+        self.translator.max_batch_lines = 3
+        self.assertEqual(self.translator._split_into_batches([line] * 7), [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_parse_numbered_lines(self):
+        parse = GPTTranslator._parse_numbered_lines
+        self.assertEqual(parse("```\n1. 你好\n2、世界\n```", 2), ["你好", "世界"])
+        # 模型把一行译文拆成多行时接回到该行
+        self.assertEqual(parse("1. 你好\n，朋友\n2. 世界", 2), ["你好，朋友", "世界"])
+        # 缺行
+        self.assertIsNone(parse("1. 你好\n3. 再见", 3))
+        # 两行合并成一行
+        self.assertIsNone(parse("1. 你好世界\n2. 再见", 3))
+        # 多出的行
+        self.assertIsNone(parse("1. 你好\n2. 世界\n3. 再见", 2))
+        # 重新编号
+        self.assertIsNone(parse("0. 你好\n1. 世界", 2))
+        self.assertIsNone(parse("1. 你好\n1. 世界", 2))
+
+    def test_mismatched_batch_is_split_in_half(self):
+        def reply(lines):
+            if len(lines) == 4:
+                # 合并了两行
+                return "1. 译a\n2. 译b译c\n3. 译d"
+            if len(lines) == 1:
+                return f"```\n译{lines[0]}\n```"
+            return numbered(lines)
+
+        results, requests = self.translate(["a", "b", "c", "d"], reply)
+        self.assertEqual(results, ["译a", "译b", "译c", "译d"])
+        self.assertEqual(requests, [["1. a", "2. b", "3. c", "4. d"], ["1. a", "2. b"], ["1. c", "2. d"]])
+
+    def test_failed_lines_fall_back_to_per_line_retry(self):
+        self.translator.max_batch_lines = 2
+
+        def reply(lines):
+            if lines == ["1. c", "2. d"]:
+                return None
+            if lines == ["d"]:
+                return None
+            if len(lines) == 1:
+                return f"```\n译{lines[0]}\n```"
+            return numbered(lines)
+
+        results, requests = self.translate(["a", "b", "c", "d"], reply, max_retries=2)
+        # 失败批次中的行逐行重试，一直失败的行使用原文
+        self.assertEqual(results, ["译a", "译b", "译c", "d"])
+        self.assertEqual(sorted(map(tuple, requests)),
+                         [("1. a", "2. b"), ("1. c", "2. d"), ("c",), ("d",), ("d",)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import random
+import time
+
+import aiohttp
+
+# 可重试的 HTTP 状态码：限流和服务端错误
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMRequestError(Exception):
+    """Raised when a chat completion request fails."""
+
+    def __init__(self, status_code, message, retryable=False):
+        self.status_code = status_code
+        self.message = message
+        self.retryable = retryable
+        super().__init__(f"API request failed: {status_code} - {message}")
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit for requests to one LLM endpoint.
+
+    The limit grows by one every limit successful requests and is halved on 429/5xx responses or timeouts. It also
+    shrinks a little when the latency per unit of work grows well above the best latency seen, which is how a local
+    Ollama server that queues requests shows it is saturated.
+    """
+
+    def __init__(self, initial_limit=8, min_limit=1, max_limit=30, latency_tolerance=2.5):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self.latency_tolerance = latency_tolerance
+        self.min_latency = None
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    async def on_success(self, latency, cost=1):
+        unit_latency = latency / max(cost, 1)
+        async with self.condition:
+            if self.min_latency is None or unit_latency < self.min_latency:
+                self.min_latency = unit_latency
+            if unit_latency > self.latency_tolerance * self.min_latency:
+                self.limit = max(self.min_limit, self.limit * 0.9)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    async def on_overload(self):
+        async with self.condition:
+            self.limit = max(self.min_limit, self.limit / 2)
+
+
+class AsyncLLMClient:
+    """
+    Chat completion client for OpenAI compatible endpoints (OpenAI, Ollama, vLLM ...).
+
+    One aiohttp session keeps connections alive across requests, the number of requests in flight follows
+    AdaptiveConcurrencyLimiter, and retryable failures are retried with exponential backoff and jitter, honouring
+    Retry-After headers.
+    """
+
+    def __init__(self, api_url, headers, proxies=None, initial_concurrency=8, max_concurrency=30,
+                 request_timeout=60, max_attempts=3):
+        self.api_url = api_url
+        self.headers = headers
+        self.proxy = (proxies or {}).get("https") or (proxies or {}).get("http")
+        self.limiter = AdaptiveConcurrencyLimiter(initial_limit=initial_concurrency, max_limit=max_concurrency)
+        self.request_timeout = request_timeout
+        self.max_attempts = max_attempts
+        self.max_concurrency = max_concurrency
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(connector=connector, headers=self.headers,
+                                             timeout=aiohttp.ClientTimeout(total=self.request_timeout))
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+
+    async def _post(self, payload):
+        async with self.session.post(self.api_url, json=payload, proxy=self.proxy) as response:
+            text = await response.text()
+            if response.status != 200:
+                error = LLMRequestError(response.status, text, retryable=response.status in RETRYABLE_STATUS_CODES)
+                error.retry_after = response.headers.get("Retry-After")
+                raise error
+            try:
+                return json.loads(text)
+            except json.JSONDecodeError as e:
+                raise LLMRequestError(response.status, f"Invalid JSON response: {e}", retryable=True)
+
+    async def chat(self, payload, cost=1):
+        """发送一次 chat completion 请求，cost 为请求包含的字幕行数，用于按行比较延迟"""
+        delay = 1.0
+        for attempt in range(1, self.max_attempts + 1):
+            await self.limiter.acquire()
+            start_time = time.monotonic()
+            try:
+                result = await self._post(payload)
+                await self.limiter.on_success(time.monotonic() - start_time, cost)
+                return result
+            except (LLMRequestError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                retryable = not isinstance(e, LLMRequestError) or e.retryable
+                if retryable:
+                    await self.limiter.on_overload()
+                if not retryable or attempt == self.max_attempts:
+                    raise
+                retry_after = getattr(e, "retry_after", None)
+                wait = float(retry_after) if retry_after and retry_after.isdigit() else delay
+            finally:
+                await self.limiter.release()
+
+            await asyncio.sleep(wait + random.uniform(0, wait / 2))
+            delay = min(delay * 2, 30)
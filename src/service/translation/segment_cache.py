@@ -0,0 +1,56 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import unicodedata
+
+
+def normalize_segment_text(text):
+    """统一 Unicode 形式并合并空白，使仅有空白差异的字幕行命中同一缓存"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+class TranslationSegmentCache:
+    """
+    Content-addressed cache of translated subtitle lines.
+
+    Every line is stored under a hash of (normalized source text, vendor, model, glossary version), so an edited
+    line misses the cache on its own and identical lines are shared between videos.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = os.path.join(cache_dir, "segments")
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def segment_key(text, vendor, model="", glossary_version=""):
+        key_source = json.dumps([normalize_segment_text(text), vendor, model, glossary_version], ensure_ascii=False)
+        return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+    def _get_path(self, key):
+        # 按哈希前两位分目录，避免单个目录下文件过多
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        path = self._get_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)["translation"]
+        except Exception as e:
+            print(f"Warning: Failed to load cached segment from {path}: {e}")
+            return None
+
+    def put(self, key, source_text, translation):
+        path = self._get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            # 先写临时文件再替换，并发翻译同一行时不会读到写了一半的文件
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"source": source_text, "translation": translation}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Warning: Failed to save cached segment to {path}: {e}")
@@ -1,101 +1,87 @@
 from abc import ABC, abstractmethod
 import srt
 import os
-import json
-import hashlib
-import shutil
+from prometheus_client import Counter, Gauge
+
+from .segment_cache import TranslationSegmentCache
+
+TRANSLATION_CACHE_LOOKUPS = Counter("translation_cache_lookups_total", "Subtitle lines looked up in the translation cache",
+                                    ["vendor", "result"])
+TRANSLATION_CACHE_HIT_RATIO = Gauge("translation_cache_hit_ratio", "Translation cache hit ratio of the last translated SRT",
+                                    ["vendor"])
 
 
 class Translator(ABC):
     def __init__(self, cache_dir="./translation_cache"):
         self.cache_dir = cache_dir
         os.makedirs(cache_dir, exist_ok=True)
+        self.segment_cache = TranslationSegmentCache(cache_dir)
     
     @abstractmethod
     def translate_en_to_zh(self, texts: list) -> list:
         pass
     
-    def _extract_video_id(self, file_path):
-        """从文件路径中提取video_id"""
-        filename = os.path.basename(file_path)
-        # 支持多种文件名格式
-        if '_en_merged.srt' in filename:
-            return filename.replace('_en_merged.srt', '')
-        elif '_en.srt' in filename:
-            return filename.replace('_en.srt', '')
-        elif '_merged.srt' in filename:
-            return filename.replace('_merged.srt', '')
-        else:
-            # 如果没有匹配的模式，使用文件名（不含扩展名）
-            return os.path.splitext(filename)[0]
-    
-    def _get_cache_key(self, source_file_path, translator_name):
-        """生成缓存键，基于video_id和翻译器名称"""
-        video_id = self._extract_video_id(source_file_path)
-        return f"{video_id}_{translator_name}"
-    
-    def _get_cache_path(self, cache_key):
-        """获取缓存文件路径"""
-        return os.path.join(self.cache_dir, f"{cache_key}.json")
-    
-    def _load_cached_translation(self, cache_key):
-        """从缓存加载翻译结果"""
-        cache_path = self._get_cache_path(cache_key)
-        if os.path.exists(cache_path):
-            try:
-                with open(cache_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"Warning: Failed to load cache from {cache_path}: {e}")
-        return None
-    
-    def _save_cached_translation(self, cache_key, translated_content_list):
-        """保存翻译结果到缓存"""
-        cache_path = self._get_cache_path(cache_key)
-        try:
-            with open(cache_path, 'w', encoding='utf-8') as f:
-                json.dump(translated_content_list, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Warning: Failed to save cache to {cache_path}: {e}")
-    
     def get_translator_name(self):
         """获取翻译器名称，子类可以重写此方法"""
         return self.__class__.__name__.lower()
 
-    def translate_srt(self, source_file_name_and_path, output_file_name_and_path):
+    def get_model_name(self):
+        """获取模型名称，参与缓存键计算，子类可以重写此方法"""
+        return ""
+
+    def get_glossary_version(self):
+        """获取术语表版本，术语表变化后旧的翻译不再命中缓存"""
+        return ""
+
+    def translate_texts(self, source_list):
+        """逐行翻译，已缓存的行直接复用，只把未命中的行（去重后）交给翻译服务"""
         translator_name = self.get_translator_name()
-        
-        # 生成缓存键
-        cache_key = self._get_cache_key(source_file_name_and_path, translator_name)
-        
-        # 尝试从缓存加载翻译结果
-        cached_translation = self._load_cached_translation(cache_key)
-        
-        if cached_translation is not None:
-            print(f"Using cached translation for {translator_name} (video_id: {self._extract_video_id(source_file_name_and_path)})")
-            content_list = cached_translation
-        else:
-            print(f"Translating with {translator_name} (no cache found)")
-            # 执行翻译
-            content_list = self._perform_translation(source_file_name_and_path)
-            # 保存翻译结果到缓存
-            self._save_cached_translation(cache_key, content_list)
-        
+        model_name = self.get_model_name()
+        glossary_version = self.get_glossary_version()
+
+        keys = [self.segment_cache.segment_key(text, translator_name, model_name, glossary_version) for text in source_list]
+
+        translations = {}
+        miss_texts = {}
+        for key, text in zip(keys, source_list):
+            if key in translations or key in miss_texts:
+                continue
+            cached = self.segment_cache.get(key)
+            if cached is not None:
+                translations[key] = cached
+            else:
+                miss_texts[key] = text
+
+        hits = len(source_list) - sum(1 for key in keys if key in miss_texts)
+        TRANSLATION_CACHE_LOOKUPS.labels(vendor=translator_name, result="hit").inc(hits)
+        TRANSLATION_CACHE_LOOKUPS.labels(vendor=translator_name, result="miss").inc(len(source_list) - hits)
+        if source_list:
+            TRANSLATION_CACHE_HIT_RATIO.labels(vendor=translator_name).set(hits / len(source_list))
+        print(f"Translation cache for {translator_name}: {hits}/{len(source_list)} lines hit, "
+              f"translating {len(miss_texts)} unique lines")
+
+        if miss_texts:
+            miss_translations = self.translate_en_to_zh(list(miss_texts.values()))
+            if len(miss_translations) != len(miss_texts):
+                raise ValueError(f"{translator_name} returned {len(miss_translations)} lines for {len(miss_texts)} source lines.")
+
+            for (key, text), translation in zip(miss_texts.items(), miss_translations):
+                translations[key] = translation
+                # 翻译失败时会退回原文，这类结果不写入缓存，下次重新翻译
+                if translation.strip() and translation.strip() != text.strip():
+                    self.segment_cache.put(key, text, translation)
+
+        return [translations[key] for key in keys]
+
+    def translate_srt(self, source_file_name_and_path, output_file_name_and_path):
+        srt_content = open(source_file_name_and_path, "r", encoding="utf-8").read()
+        source_list = [subTitle.content for subTitle in srt.parse(srt_content)]
+        content_list = self.translate_texts(source_list)
+
         # 生成最终的字幕文件
         self._generate_output_file(source_file_name_and_path, output_file_name_and_path, content_list)
         return True
-    
-    def _perform_translation(self, source_file_name_and_path):
-        """执行翻译操作"""
-        srt_content = open(source_file_name_and_path, "r", encoding="utf-8").read()
-        sub_generator = srt.parse(srt_content)
-        sub_title_list = list(sub_generator)
-        content_list = [subTitle.content for subTitle in sub_title_list]
-        
-        # 执行翻译
-        content_list = self.translate_en_to_zh(content_list)
-        return content_list
-    
+
     def _generate_output_file(self, source_file_name_and_path, output_file_name_and_path, content_list):
         """生成输出文件"""
         # 重新读取源文件以获取原始字幕结构
@@ -51,7 +51,9 @@ __all__ = [
     "EdgeTTSClient",
     "FallbackTTSClient",
     "OpenAITTSClient",
-    "TTSClient"
+    "TTSClient",
+    "get_tts_client",
+    "preload_tts_models",
 ]
 
 if XTTS_AVAILABLE:
@@ -62,6 +64,28 @@ if COSYVOICE2_AVAILABLE:
     __all__.append("CosyVoice2Client")
 
 
+def preload_tts_models(model_specs):
+    """
+    启动时把模型加载到进程级模型池，之后的 /tts 请求直接借用
+
+    Args:
+        model_specs: 模型列表，如 [{"vendor": "xtts_v2", "model_name": "..."},
+                     {"vendor": "cosyvoice2", "model_path": "pretrained_models/CosyVoice2-0.5B", "fp16": false}]
+    """
+    for spec in model_specs:
+        spec = dict(spec)
+        vendor = spec.pop('vendor', None)
+        try:
+            if vendor == 'xtts_v2' and XTTS_AVAILABLE:
+                XTTSv2Client.preload_model(**spec)
+            elif vendor == 'cosyvoice2' and COSYVOICE2_AVAILABLE:
+                CosyVoice2Client.preload_model(**spec)
+            else:
+                print(f"Warning: Cannot preload TTS model for vendor '{vendor}'")
+        except Exception as e:
+            print(f"Warning: Failed to preload TTS model for vendor '{vendor}': {e}")
+
+
 def get_tts_client(tts_vendor, character=None, **kwargs) -> TTSClient:
     """
     获取 TTS 客户端
@@ -73,9 +97,12 @@ def get_tts_client(tts_vendor, character=None, **kwargs) -> TTSClient:
             - voice: 语音类型（用于 OpenAI TTS）
             - model: 模型名称（用于 OpenAI TTS）
             - instructions: 指令（用于 OpenAI TTS）
+            - response_format: 返回格式 'pcm' 或 'wav'（用于 OpenAI TTS）
             - reference_audio_path: 参考音频路径（用于 XTTS v2 和 CosyVoice2）
             - language: 目标语言（用于 XTTS v2）
             - model_name: 模型名称（用于 XTTS v2 和 CosyVoice2）
+            - latent_cache_dir: 参考音频说话人特征缓存目录（用于 XTTS v2）
+            - use_worker: 是否使用常驻合成进程（用于 XTTS v2 兼容模式）
             - speaker_name: 说话人名称（用于 CosyVoice2）
             - mode: 生成模式（用于 CosyVoice2）
             - instruction: 指令（用于 CosyVoice2）
@@ -88,7 +115,8 @@ def get_tts_client(tts_vendor, character=None, **kwargs) -> TTSClient:
         voice = character or kwargs.get('voice', 'alloy')
         model = kwargs.get('model', 'tts-1')
         instructions = kwargs.get('instructions', None)
-        return OpenAITTSClient(voice=voice, model=model, instructions=instructions)
+        response_format = kwargs.get('response_format', 'pcm')
+        return OpenAITTSClient(voice=voice, model=model, instructions=instructions, response_format=response_format)
     elif tts_vendor == 'fallback':
         return FallbackTTSClient(character=character)
     elif tts_vendor == 'xtts_v2':
@@ -101,15 +129,17 @@ def get_tts_client(tts_vendor, character=None, **kwargs) -> TTSClient:
             return XTTSv2Client(
                 model_name=model_name,
                 reference_audio_path=reference_audio_path,
-                language=language
+                language=language,
+                latent_cache_dir=kwargs.get('latent_cache_dir', './xtts_speaker_latents')
             )
         # 降级使用兼容版本
         elif XTTS_COMPATIBLE_AVAILABLE:
-            print("Using XTTS v2 compatible mode (command line interface)")
+            print("Using XTTS v2 compatible mode (worker process)")
             return XTTSv2CompatibleClient(
                 model_name=model_name,
                 reference_audio_path=reference_audio_path,
-                language=language
+                language=language,
+                use_worker=kwargs.get('use_worker', True)
             )
         else:
             if sys.version_info < (3, 10):
@@ -2,11 +2,15 @@ import os
 import copy
 import srt
 import sys
+import hashlib
 import torch
 import torchaudio
 from pathlib import Path
+from contextlib import contextmanager
 from pydub import AudioSegment
 from src.service.tts.tts_client import TTSClient
+from src.service.tts.model_pool import tts_model_pool
+from src.utils.hash_util import file_digest
 
 # 添加 CosyVoice 路径到 Python 路径
 cosyvoice_path = "/home/shuzuan/prj/easy-video/CosyVoice"
@@ -49,24 +53,61 @@ class CosyVoice2Client(TTSClient):
         self.instruction = instruction
         self.cosyvoice = None
         self.prompt_speech = None
+        self.zero_shot_speaker_id = ""
+        self.model_flags = (load_jit, load_trt, load_vllm, fp16)
         self._load_model(load_jit, load_trt, load_vllm, fp16)
-        self._load_reference_audio()
     
+    def get_cache_params(self):
+        options = f"{self.mode}|{self.instruction}" if self.mode == "instruct" else self.mode
+        return "cosyvoice2", self.speaker_name, self.model_path, self.reference_audio_path, options
+
+    @staticmethod
+    def _model_key(model_path, load_jit, load_trt, load_vllm, fp16):
+        return "cosyvoice2", os.path.join(cosyvoice_path, model_path), load_jit, load_trt, load_vllm, fp16
+
+    @staticmethod
+    def _create_model(model_path, load_jit, load_trt, load_vllm, fp16):
+        from cosyvoice.cli.cosyvoice import CosyVoice2
+        # 使用绝对路径
+        full_model_path = os.path.join(cosyvoice_path, model_path)
+        cosyvoice = CosyVoice2(full_model_path, load_jit=load_jit,
+                               load_trt=load_trt, load_vllm=load_vllm, fp16=fp16)
+        print(f"CosyVoice2 model loaded: {full_model_path}")
+        return cosyvoice
+
+    @classmethod
+    def preload_model(cls, model_path="pretrained_models/CosyVoice2-0.5B", load_jit=False, load_trt=False,
+                      load_vllm=False, fp16=False):
+        """把模型加载到进程级模型池中，之后的请求直接借用"""
+        flags = (load_jit, load_trt, load_vllm, fp16)
+        tts_model_pool.preload(cls._model_key(model_path, *flags), lambda: cls._create_model(model_path, *flags))
+
     def _load_model(self, load_jit, load_trt, load_vllm, fp16):
-        """加载 CosyVoice2 模型"""
+        """确保 CosyVoice2 模型已在模型池中，合成时再借用"""
         try:
-            from cosyvoice.cli.cosyvoice import CosyVoice2
-            # 使用绝对路径
-            full_model_path = os.path.join(cosyvoice_path, self.model_path)
-            self.cosyvoice = CosyVoice2(full_model_path, load_jit=load_jit, 
-                                      load_trt=load_trt, load_vllm=load_vllm, fp16=fp16)
-            print(f"CosyVoice2 model loaded: {full_model_path}")
+            self.preload_model(self.model_path, load_jit, load_trt, load_vllm, fp16)
         except Exception as e:
             print(f"Failed to load CosyVoice2 model: {e}")
             raise
+
+    @contextmanager
+    def _borrow_model(self):
+        """从模型池借用模型，借用期间 self.cosyvoice 指向该模型"""
+        if self.cosyvoice is not None:
+            yield self.cosyvoice
+            return
+        key = self._model_key(self.model_path, *self.model_flags)
+        with tts_model_pool.borrow(key, lambda: self._create_model(self.model_path, *self.model_flags)) as cosyvoice:
+            self.cosyvoice = cosyvoice
+            try:
+                yield cosyvoice
+            finally:
+                self.cosyvoice = None
     
     def _load_reference_audio(self):
-        """加载参考音频并裁剪到30秒"""
+        """加载参考音频并裁剪到30秒，只在需要提取提示特征时调用"""
+        if self.prompt_speech is not None:
+            return
         if self.reference_audio_path and os.path.exists(self.reference_audio_path):
             try:
                 from cosyvoice.utils.file_utils import load_wav
@@ -89,6 +130,41 @@ class CosyVoice2Client(TTSClient):
             except Exception as e:
                 print(f"Failed to load reference audio: {e}")
                 self.prompt_speech = None
+
+    def _get_zero_shot_speaker_id(self):
+        """参考音频注册为零样本说话人时的 ID，由音频内容哈希和提示文本决定"""
+        prompt_hash = hashlib.sha256(self.speaker_name.encode("utf-8")).hexdigest()[:8]
+        return f"ref_{file_digest(self.reference_audio_path)[:16]}_{prompt_hash}"
+
+    def _ensure_zero_shot_speaker(self):
+        """
+        确保参考音频已注册为零样本说话人，需在借用模型期间调用。
+
+        说话人特征通过 save_spkinfo 保存在模型目录的 spk2info.pt 中，模型加载时会自动读回，
+        之后的片段和任务直接使用已注册的说话人，不再重复提取提示特征。注册失败时返回空字符串。
+        """
+        if not self.reference_audio_path or not os.path.exists(self.reference_audio_path):
+            return ""
+        speaker_id = self._get_zero_shot_speaker_id()
+        if speaker_id in self.cosyvoice.list_available_spks():
+            return speaker_id
+
+        self._load_reference_audio()
+        if self.prompt_speech is None:
+            return ""
+        try:
+            if not self.cosyvoice.add_zero_shot_spk(self.speaker_name, self.prompt_speech, speaker_id):
+                print(f"Failed to register zero-shot speaker: {speaker_id}")
+                return ""
+        except Exception as e:
+            print(f"Error registering zero-shot speaker: {e}")
+            return ""
+        try:
+            self.cosyvoice.save_spkinfo()
+        except Exception as e:
+            print(f"Warning: Failed to save speaker info, speaker {speaker_id} is kept in memory only: {e}")
+        print(f"Registered zero-shot speaker {speaker_id} for reference audio: {self.reference_audio_path}")
+        return speaker_id
     
     def _generate_single_audio_zero_shot(self, text, output_path):
         """
@@ -99,12 +175,13 @@ class CosyVoice2Client(TTSClient):
             output_path: 输出音频文件路径
         """
         try:
-            if self.prompt_speech is None:
+            if not self.zero_shot_speaker_id and self.prompt_speech is None:
                 raise ValueError("Reference audio is required for zero-shot mode")
             
-            # 使用零样本模式生成语音
+            # 使用零样本模式生成语音，已注册的说话人直接使用保存的提示特征
             for i, result in enumerate(self.cosyvoice.inference_zero_shot(
-                text, self.speaker_name, self.prompt_speech, stream=False)):
+                text, self.speaker_name, self.prompt_speech,
+                zero_shot_spk_id=self.zero_shot_speaker_id, stream=False)):
                 torchaudio.save(output_path, result['tts_speech'], 
                               self.cosyvoice.sample_rate)
                 return True
@@ -185,32 +262,45 @@ class CosyVoice2Client(TTSClient):
         
         print(f"Processing {len(sub_title_list)} subtitle entries with CosyVoice2 ({self.mode} mode)...")
         
-        for index, sub_title in enumerate(sub_title_list, start=1):
-            file_name = f"{index}.wav"
-            output_path = os.path.join(output_dir, file_name)
-            file_names.append(file_name)
-            
-            # 根据模式生成音频
-            success = False
-            if self.mode == "zero_shot":
-                success = self._generate_single_audio_zero_shot(sub_title.content, output_path)
-            elif self.mode == "cross_lingual":
-                success = self._generate_single_audio_cross_lingual(sub_title.content, output_path)
-            elif self.mode == "instruct":
-                success = self._generate_single_audio_instruct(sub_title.content, self.instruction, output_path)
+        with self._borrow_model():
+            if self.mode in ("cross_lingual", "instruct"):
+                # 跨语种和指令模式会改写提示特征，仍按参考音频提取
+                self._load_reference_audio()
             else:
-                print(f"Unknown mode: {self.mode}, using zero_shot")
-                success = self._generate_single_audio_zero_shot(sub_title.content, output_path)
+                self.zero_shot_speaker_id = self._ensure_zero_shot_speaker()
+                if not self.zero_shot_speaker_id:
+                    self._load_reference_audio()
+            for index, sub_title in enumerate(sub_title_list, start=1):
+                file_name = f"{index}.wav"
+                output_path = os.path.join(output_dir, file_name)
+                file_names.append(file_name)
+
+                if self._restore_cached_segment(sub_title.content, output_path):
+                    success_count += 1
+                    continue
+
+                # 根据模式生成音频
+                success = False
+                if self.mode == "zero_shot":
+                    success = self._generate_single_audio_zero_shot(sub_title.content, output_path)
+                elif self.mode == "cross_lingual":
+                    success = self._generate_single_audio_cross_lingual(sub_title.content, output_path)
+                elif self.mode == "instruct":
+                    success = self._generate_single_audio_instruct(sub_title.content, self.instruction, output_path)
+                else:
+                    print(f"Unknown mode: {self.mode}, using zero_shot")
+                    success = self._generate_single_audio_zero_shot(sub_title.content, output_path)
             
-            if success:
-                success_count += 1
-            else:
-                # 如果生成失败，创建静音文件
-                duration_seconds = max(1, len(sub_title.content) / 2.5)
-                silence = AudioSegment.silent(duration=int(duration_seconds * 1000))
-                silence.export(output_path, format="wav")
-                print(f"Created silence placeholder for failed generation: {file_name}")
-        
+                if success:
+                    self._cache_segment(sub_title.content, output_path)
+                    success_count += 1
+                else:
+                    # 如果生成失败，创建静音文件
+                    duration_seconds = max(1, len(sub_title.content) / 2.5)
+                    silence = AudioSegment.silent(duration=int(duration_seconds * 1000))
+                    silence.export(output_path, format="wav")
+                    print(f"Created silence placeholder for failed generation: {file_name}")
+
         # 创建语音映射文件
         voice_map_srt = copy.deepcopy(sub_title_list)
         for i, sub_title in enumerate(voice_map_srt):
@@ -239,7 +329,8 @@ class CosyVoice2Client(TTSClient):
             speaker_id: 说话人ID
         """
         try:
-            success = self.cosyvoice.add_zero_shot_spk(speaker_name, prompt_speech, speaker_id)
+            with self._borrow_model():
+                success = self.cosyvoice.add_zero_shot_spk(speaker_name, prompt_speech, speaker_id)
             if success:
                 print(f"Added zero-shot speaker: {speaker_id}")
                 return True
@@ -253,7 +344,8 @@ class CosyVoice2Client(TTSClient):
     def save_speaker_info(self):
         """保存说话人信息"""
         try:
-            self.cosyvoice.save_spkinfo()
+            with self._borrow_model():
+                self.cosyvoice.save_spkinfo()
             print("Speaker info saved")
         except Exception as e:
             print(f"Error saving speaker info: {e}")
@@ -261,7 +353,8 @@ class CosyVoice2Client(TTSClient):
     def list_available_speakers(self):
         """列出可用的说话人"""
         try:
-            return self.cosyvoice.list_available_spks()
+            with self._borrow_model():
+                return self.cosyvoice.list_available_spks()
         except Exception as e:
             print(f"Error listing speakers: {e}")
             return []
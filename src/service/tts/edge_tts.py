@@ -1,16 +1,86 @@
 import os
 import copy
+import json
+import time
+import random
+import hashlib
 import asyncio
+import shutil
+import threading
 import srt
 import edge_tts
-import tenacity
 from pydub import AudioSegment
+from prometheus_client import Counter, Histogram
 from src.service.tts.tts_client import TTSClient
 
+EDGE_TTS_SEGMENT_LATENCY = Histogram("edge_tts_segment_latency_seconds", "Time to synthesize one subtitle with Edge TTS",
+                                     buckets=[0.25, 0.5, 1, 2, 4, 8, 16, 32])
+EDGE_TTS_SEGMENT_RETRIES = Counter("edge_tts_segment_retries_total", "Edge TTS segment attempts that failed and were retried")
+
+# 同时进行的 Edge TTS 请求数上限，所有请求共用，过高会触发 403 限流
+EDGE_TTS_MAX_CONCURRENCY = int(os.environ.get("EDGE_TTS_MAX_CONCURRENCY", 8))
+EDGE_TTS_MAX_ATTEMPTS = 5
+# 记录已完成片段的文件，上次合成中途失败时据此续传
+EDGE_TTS_PROGRESS_FILE = ".edge_tts_progress.json"
+
+
+class _EdgeTTSLoop:
+    """
+    后台线程中常驻的事件循环，所有 EdgeTTSClient 共用，避免每次合成都新建事件循环。
+
+    信号量在该循环中创建，限制全进程同时进行的 Edge TTS 请求数。
+    """
+
+    def __init__(self, max_concurrency):
+        self.loop = asyncio.new_event_loop()
+        self.semaphore = None
+        self.max_concurrency = max_concurrency
+        thread = threading.Thread(target=self._run, name="edge-tts-loop", daemon=True)
+        thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.loop.run_forever()
+
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+
+_edge_tts_loop = None
+_edge_tts_loop_lock = threading.Lock()
+
+
+def _get_edge_tts_loop():
+    global _edge_tts_loop
+    with _edge_tts_loop_lock:
+        if _edge_tts_loop is None:
+            _edge_tts_loop = _EdgeTTSLoop(EDGE_TTS_MAX_CONCURRENCY)
+        return _edge_tts_loop
+
+
+def prepare_tts_output_dir(output_dir, tts_vendor, resume=True):
+    """
+    合成前清理上次的配音目录，只有 Edge TTS 按续传记录复用上次中途失败时已完成的片段。
+
+    其它供应商会原地覆盖 N.wav 而不更新续传记录，之后的 Edge TTS 会把这些片段当成自己的输出，所以一律删除整个目录。
+
+    Returns:
+        是否保留了上次的片段
+    """
+    can_resume = resume and tts_vendor == "edge" and os.path.exists(os.path.join(output_dir, EDGE_TTS_PROGRESS_FILE))
+    if os.path.exists(output_dir) and not can_resume:
+        shutil.rmtree(output_dir)
+    return can_resume
+
 
 class EdgeTTSClient(TTSClient):
-    def __init__(self, character="zh-CN-XiaoyiNeural"):
+    def __init__(self, character="zh-CN-XiaoyiNeural", max_attempts=EDGE_TTS_MAX_ATTEMPTS):
         self.character = character
+        self.max_attempts = max_attempts
+
+    def get_cache_params(self):
+        return "edge", self.character, "", None, ""
 
     async def _convert_srt_to_voice_edge(self, text, path):
         print(f"Converting text to voice: {text} , path: {path} , character: {self.character}")
@@ -18,26 +88,68 @@ class EdgeTTSClient(TTSClient):
         await communicate.save(path)
 
     @staticmethod
-    def _run_convert_srt_to_voice_edge_coroutines(coroutines):
-        asyncio.set_event_loop(asyncio.SelectorEventLoop())
-        loop = asyncio.get_event_loop()
-        try:
-            loop.run_until_complete(asyncio.gather(*coroutines))
-            print("convert srt to mp3 voice using edge successfully")
-        except Exception as e:
-            print(f"convert srt to mp3 voice using edge exception: {e}")
-            # 检查是否是403错误，如果是则立即抛出异常
-            if "403" in str(e) or "Invalid response status" in str(e):
-                raise Exception(f"Edge TTS failed with 403 error: {e}")
-        finally:
-            pending = asyncio.all_tasks(loop)
-            for task in pending:
-                task.cancel()
-            print(f"convert srt to mp3 voice using edge cancel remaining pending tasks: {len(pending)}")
-            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-            loop.close()
-
-            return len(pending)
+    def _mp3_to_wav(mp3_path, wav_path):
+        sound = AudioSegment.from_mp3(mp3_path)
+        sound.export(wav_path, format="wav")
+        os.remove(mp3_path)
+
+    async def _synthesize_segment(self, semaphore, text, mp3_path, wav_path):
+        """合成单个片段，失败时指数退避重试，403 限流时等待更久"""
+        delay = 1.0
+        for attempt in range(1, self.max_attempts + 1):
+            async with semaphore:
+                start_time = time.time()
+                try:
+                    await self._convert_srt_to_voice_edge(text, mp3_path)
+                    EDGE_TTS_SEGMENT_LATENCY.observe(time.time() - start_time)
+                    break
+                except Exception as e:
+                    if attempt == self.max_attempts:
+                        raise
+                    EDGE_TTS_SEGMENT_RETRIES.inc()
+                    throttled = "403" in str(e) or "Invalid response status" in str(e)
+                    wait = delay * (4 if throttled else 1)
+                    print(f"Edge TTS attempt {attempt} for {wav_path} failed, retrying in {wait:.1f}s: {e}")
+            await asyncio.sleep(wait + random.uniform(0, wait / 2))
+            delay = min(delay * 2, 30)
+
+        # MP3 转 WAV 调用 ffmpeg，放到线程池中和其他片段的合成并行
+        await asyncio.get_running_loop().run_in_executor(None, self._mp3_to_wav, mp3_path, wav_path)
+        await asyncio.get_running_loop().run_in_executor(None, self._cache_segment, text, wav_path)
+
+    async def _synthesize_segments(self, segments, progress, progress_path):
+        semaphore = _get_edge_tts_loop().semaphore
+
+        async def synthesize(index, text, mp3_path, wav_path):
+            await self._synthesize_segment(semaphore, text, mp3_path, wav_path)
+            progress["segments"][str(index)] = self._text_hash(text)
+            self._save_progress(progress_path, progress)
+
+        results = await asyncio.gather(*(synthesize(*segment) for segment in segments), return_exceptions=True)
+        return [(segment, result) for segment, result in zip(segments, results) if isinstance(result, Exception)]
+
+    @staticmethod
+    def _text_hash(text):
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _load_progress(self, progress_path):
+        progress = {"character": self.character, "segments": {}}
+        if os.path.exists(progress_path):
+            try:
+                with open(progress_path, "r", encoding="utf-8") as file:
+                    saved = json.load(file)
+                if saved.get("character") == self.character:
+                    progress = saved
+            except Exception as e:
+                print(f"Warning: Failed to load Edge TTS progress from {progress_path}: {e}")
+        return progress
+
+    @staticmethod
+    def _save_progress(progress_path, progress):
+        tmp_path = progress_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(progress, file)
+        os.replace(tmp_path, progress_path)
 
     def srt_to_voice(self, srt_file_path, output_dir):
         if not os.path.exists(output_dir):
@@ -48,31 +160,39 @@ class EdgeTTSClient(TTSClient):
 
         sub_generator = srt.parse(srt_content)
         sub_title_list = list(sub_generator)
-        file_mp3_names = []
         file_names = []
 
-        coroutines = []
+        # 上次中途失败时，文本和角色都未变的片段直接复用
+        progress_path = os.path.join(output_dir, EDGE_TTS_PROGRESS_FILE)
+        progress = self._load_progress(progress_path)
+        segments = []
         for index, sub_title in enumerate(sub_title_list, start=1):
-            file_mp3_name = f"{index}.mp3"
             file_name = f"{index}.wav"
-            output_mp3_path = os.path.join(output_dir, file_mp3_name)
-            file_mp3_names.append(file_mp3_name)
             file_names.append(file_name)
-            coroutines.append(self._convert_srt_to_voice_edge(sub_title.content, output_mp3_path))
-
-        # 执行TTS转换，如果失败则抛出异常
-        failed_tasks = EdgeTTSClient._run_convert_srt_to_voice_edge_coroutines(coroutines)
-        
-        # 如果有失败的任务，抛出异常
-        if failed_tasks > 0:
-            raise Exception(f"Edge TTS failed for {failed_tasks} tasks")
-
-        for mp3_file_name, wav_file_name in zip(file_mp3_names, file_names):
-            mp3_path = os.path.join(output_dir, mp3_file_name)
-            wav_path = os.path.join(output_dir, wav_file_name)
-            sound = AudioSegment.from_mp3(mp3_path)
-            sound.export(wav_path, format="wav")
-            os.remove(mp3_path)
+            output_path = os.path.join(output_dir, file_name)
+            if (progress["segments"].get(str(index)) == self._text_hash(sub_title.content) and
+                    os.path.exists(output_path)):
+                continue
+            progress["segments"].pop(str(index), None)
+            if self._restore_cached_segment(sub_title.content, output_path):
+                continue
+            segments.append((index, sub_title.content, os.path.join(output_dir, f"{index}.mp3"), output_path))
+
+        if len(segments) < len(sub_title_list):
+            print(f"Edge TTS: {len(sub_title_list) - len(segments)} segments restored from previous run or cache")
+
+        # 执行TTS转换，单个片段失败不影响其他片段，全部结束后再报告失败
+        failures = _get_edge_tts_loop().run(self._synthesize_segments(segments, progress, progress_path))
+        if failures:
+            for (index, _, _, _), exception in failures:
+                print(f"Edge TTS failed for segment {index}: {exception}")
+            if any("403" in str(e) or "Invalid response status" in str(e) for _, e in failures):
+                raise Exception(f"Edge TTS failed with 403 error for {len(failures)} tasks: {failures[0][1]}")
+            raise Exception(f"Edge TTS failed for {len(failures)} tasks")
+
+        # 全部完成，不再需要续传记录
+        if os.path.exists(progress_path):
+            os.remove(progress_path)
 
         print("Converted to wav successfully")
         voice_map_srt = copy.deepcopy(sub_title_list)
@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+
+from src.service.tts.edge_tts import EDGE_TTS_PROGRESS_FILE, prepare_tts_output_dir
+
+
+class TestPrepareTTSOutputDir(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.tts_dir = os.path.join(self.temp_dir.name, "abc_zh_source")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_interrupted_run(self):
+        """上次 Edge TTS 中途失败留下的目录"""
+        os.makedirs(self.tts_dir, exist_ok=True)
+        for name in ("1.wav", EDGE_TTS_PROGRESS_FILE):
+            with open(os.path.join(self.tts_dir, name), "w") as f:
+                f.write("x")
+
+    def test_only_edge_resumes(self):
+        for vendor in ("openai", "xtts_v2", "cosyvoice2"):
+            self.write_interrupted_run()
+            self.assertFalse(prepare_tts_output_dir(self.tts_dir, vendor))
+            self.assertFalse(os.path.exists(self.tts_dir), vendor)
+
+        self.write_interrupted_run()
+        self.assertFalse(prepare_tts_output_dir(self.tts_dir, "edge", resume=False))
+        self.assertFalse(os.path.exists(self.tts_dir))
+
+        self.write_interrupted_run()
+        self.assertTrue(prepare_tts_output_dir(self.tts_dir, "edge"))
+        self.assertTrue(os.path.exists(os.path.join(self.tts_dir, "1.wav")))
+
+    def test_directory_without_progress_file_is_removed(self):
+        self.write_interrupted_run()
+        os.remove(os.path.join(self.tts_dir, EDGE_TTS_PROGRESS_FILE))
+        self.assertFalse(prepare_tts_output_dir(self.tts_dir, "edge"))
+        self.assertFalse(os.path.exists(self.tts_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,6 +18,9 @@ class FallbackTTSClient(TTSClient):
             self._try_edge_tts_alternative,
         ]
     
+    def get_cache_params(self):
+        return "fallback", self.character, "", None, ""
+
     def _try_edge_tts_alternative(self, text, output_path):
         """
         尝试使用edge-tts的替代方法
@@ -90,6 +93,10 @@ class FallbackTTSClient(TTSClient):
             wav_path = os.path.join(output_dir, file_name)
             file_names.append(file_name)
 
+            if self._restore_cached_segment(sub_title.content, wav_path):
+                successful_count += 1
+                continue
+
             print(f"Processing segment {index}/{len(sub_title_list)}: {sub_title.content[:50]}...")
             
             # 生成MP3文件
@@ -100,6 +107,7 @@ class FallbackTTSClient(TTSClient):
                         sound = AudioSegment.from_mp3(mp3_path)
                         sound.export(wav_path, format="wav")
                         os.remove(mp3_path)
+                        self._cache_segment(sub_title.content, wav_path)
                         successful_count += 1
                         print(f"Successfully processed segment {index}")
                     else:
@@ -0,0 +1,146 @@
+import gc
+import time
+import threading
+import collections
+from contextlib import contextmanager
+
+from prometheus_client import Gauge, Histogram
+
+TTS_MODEL_LOAD_SECONDS = Histogram("tts_model_load_seconds", "Time spent loading a TTS model", ["engine"],
+                                   buckets=[1, 2, 5, 10, 20, 30, 60, 120, 300])
+TTS_MODEL_BORROW_WAIT_SECONDS = Histogram("tts_model_borrow_wait_seconds",
+                                          "Time a TTS request waited for a pooled model, including loading", ["engine"],
+                                          buckets=[0.01, 0.1, 1, 5, 10, 30, 60, 120, 300, 600])
+TTS_MODEL_POOL_MODELS = Gauge("tts_model_pool_models", "TTS models kept warm in the pool")
+TTS_MODEL_POOL_IN_USE = Gauge("tts_model_pool_in_use", "Pooled TTS models currently borrowed by a request")
+TTS_MODEL_POOL_BYTES = Gauge("tts_model_pool_bytes", "Estimated memory held by pooled TTS models")
+
+# 无法测量显存时对单个模型大小的估计
+DEFAULT_MODEL_BYTES = 2 * 1024 ** 3
+
+
+def _cuda_memory_allocated():
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return torch.cuda.memory_allocated()
+    except ImportError:
+        pass
+    return None
+
+
+class _PooledModel:
+    def __init__(self, model, size):
+        self.model = model
+        self.size = size
+        self.lock = threading.Lock()
+        # 借用中和等待借用的请求数，大于 0 时不会被淘汰
+        self.users = 0
+        self.last_used = time.time()
+
+
+class TTSModelPool:
+    """
+    Process-wide pool of loaded TTS models keyed by (engine, model path, precision flags ...).
+
+    Requests borrow a model exclusively for the duration of a synthesis and give it back afterwards, so the multi-GB
+    weights are loaded once per process instead of once per request. When the estimated memory of the pooled models
+    exceeds memory_budget_bytes, idle models are evicted least recently used first.
+    """
+
+    def __init__(self, memory_budget_bytes):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.models = collections.OrderedDict()
+        self.loading = {}
+        self.lock = threading.Lock()
+
+    def _get_or_load(self, key, loader, use=False):
+        while True:
+            with self.lock:
+                if key in self.models:
+                    self.models.move_to_end(key)
+                    self.models[key].users += use
+                    return self.models[key]
+                loaded = self.loading.get(key)
+                if loaded is None:
+                    self.loading[key] = threading.Event()
+                    break
+            loaded.wait()
+
+        try:
+            allocated_before = _cuda_memory_allocated()
+            start_time = time.time()
+            model = loader()
+            TTS_MODEL_LOAD_SECONDS.labels(engine=key[0]).observe(time.time() - start_time)
+            allocated_after = _cuda_memory_allocated()
+            if allocated_before is not None and allocated_after is not None and allocated_after > allocated_before:
+                size = allocated_after - allocated_before
+            else:
+                size = DEFAULT_MODEL_BYTES
+
+            entry = _PooledModel(model, size)
+            entry.users += use
+            with self.lock:
+                self.models[key] = entry
+                self._evict_idle(keep=key)
+                self._update_gauges()
+            return entry
+        finally:
+            with self.lock:
+                self.loading.pop(key).set()
+
+    def _evict_idle(self, keep):
+        evicted = False
+        for key in list(self.models):
+            if sum(entry.size for entry in self.models.values()) <= self.memory_budget_bytes:
+                break
+            entry = self.models[key]
+            if key == keep or entry.users > 0:
+                continue
+            print(f"Evicting idle TTS model from pool: {key}")
+            del self.models[key]
+            evicted = True
+        if evicted:
+            gc.collect()
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            except ImportError:
+                pass
+
+    def _update_gauges(self):
+        TTS_MODEL_POOL_MODELS.set(len(self.models))
+        TTS_MODEL_POOL_IN_USE.set(sum(1 for entry in self.models.values() if entry.users > 0))
+        TTS_MODEL_POOL_BYTES.set(sum(entry.size for entry in self.models.values()))
+
+    def preload(self, key, loader):
+        """加载模型但不借出，用于启动时预热和客户端构造时提前发现加载错误"""
+        self._get_or_load(key, loader)
+
+    @contextmanager
+    def borrow(self, key, loader):
+        """独占借用模型，同一模型同时只被一个请求使用，用完后放回池中"""
+        start_time = time.time()
+        entry = self._get_or_load(key, loader, use=True)
+        with self.lock:
+            self._update_gauges()
+        entry.lock.acquire()
+        TTS_MODEL_BORROW_WAIT_SECONDS.labels(engine=key[0]).observe(time.time() - start_time)
+        try:
+            yield entry.model
+        finally:
+            with self.lock:
+                entry.users -= 1
+                entry.last_used = time.time()
+                # 借用期间超出预算的模型此时才能淘汰
+                self._evict_idle(keep=None)
+                self._update_gauges()
+            entry.lock.release()
+
+    def loaded_models(self):
+        with self.lock:
+            return list(self.models.keys())
+
+
+tts_model_pool = TTSModelPool(memory_budget_bytes=12 * 1024 ** 3)
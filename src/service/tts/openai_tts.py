@@ -1,18 +1,25 @@
 import os
 import copy
+import wave
+import struct
 import srt
 import tenacity
+import concurrent.futures
 from pathlib import Path
 from openai import OpenAI
 import httpx
 from packaging import version
-from pydub import AudioSegment
 from src.service.tts.tts_client import TTSClient
 
+# 同时进行的 OpenAI TTS 请求数
+OPENAI_TTS_MAX_CONCURRENCY = int(os.environ.get("OPENAI_TTS_MAX_CONCURRENCY", 4))
+# response_format 为 pcm 时的采样率
+OPENAI_PCM_SAMPLE_RATE = 24000
 
 
 class OpenAITTSClient(TTSClient):
-    def __init__(self, voice="alloy", model="tts-1", instructions=None):
+    def __init__(self, voice="alloy", model="tts-1", instructions=None, response_format="pcm",
+                 max_concurrency=OPENAI_TTS_MAX_CONCURRENCY):
         """
         Initialize OpenAI TTS client.
 
@@ -20,7 +27,11 @@ class OpenAITTSClient(TTSClient):
             voice: OpenAI voice to use (alloy, echo, fable, onyx, nova, shimmer)
             model: OpenAI TTS model (tts-1 or tts-1-hd)
             instructions: Optional instructions for voice tone/style
+            response_format: "wav" or "pcm", both are written as WAV without transcoding
+            max_concurrency: Number of segments synthesized in parallel
         """
+        if response_format not in ("wav", "pcm"):
+            raise ValueError(f"Unsupported OpenAI TTS response format: {response_format}")
         # Get OpenAI API key from environment variable
         api_key = os.environ.get('OPENAI_API_KEY')
         if not api_key:
@@ -33,7 +44,8 @@ class OpenAITTSClient(TTSClient):
                 or os.getenv("https_proxy")
                 or os.getenv("http_proxy")
             )
-            kwargs = {"timeout": 60}
+            kwargs = {"timeout": 60,
+                      "limits": httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)}
             if proxy_url:
                 if version.parse(httpx.__version__) >= version.parse("0.28.0"):
                     kwargs["proxy"] = proxy_url          # httpx>=0.28
@@ -46,30 +58,65 @@ class OpenAITTSClient(TTSClient):
         self.voice = voice
         self.model = model
         self.instructions = instructions
+        self.response_format = response_format
+        self.max_concurrency = max_concurrency
 
+    def get_cache_params(self):
+        return "openai", self.voice, self.model, None, self.instructions or ""
 
-
+    @tenacity.retry(wait=tenacity.wait_exponential(multiplier=1, min=4, max=10),
+                    stop=tenacity.stop_after_attempt(5),
+                    reraise=True)
     def _convert_text_to_voice_openai(self, text, output_path):
-        """Convert text to speech using OpenAI TTS API."""
-        speech_file_path = Path(output_path)
-
+        """Convert text to speech using OpenAI TTS API, retrying this segment only."""
         # Create the speech request
         kwargs = {
             "model": self.model,
             "voice": self.voice,
             "input": text,
+            "response_format": self.response_format,
         }
 
         # Add instructions if provided
         if self.instructions:
             kwargs["instructions"] = self.instructions
 
+        if self.response_format == "wav":
+            with self.client.audio.speech.with_streaming_response.create(**kwargs) as response:
+                response.stream_to_file(Path(output_path))
+            self._fix_wav_header(output_path)
+            return
+
+        # pcm 为 24kHz 16 位单声道裸数据，只需补上 WAV 文件头
         with self.client.audio.speech.with_streaming_response.create(**kwargs) as response:
-            response.stream_to_file(speech_file_path)
+            with wave.open(output_path, "wb") as wav_file:
+                wav_file.setnchannels(1)
+                wav_file.setsampwidth(2)
+                wav_file.setframerate(OPENAI_PCM_SAMPLE_RATE)
+                for chunk in response.iter_bytes():
+                    wav_file.writeframes(chunk)
+
+    @staticmethod
+    def _fix_wav_header(path):
+        """流式返回的 WAV 文件头中长度字段未知（0xFFFFFFFF），按实际文件大小改写"""
+        file_size = os.path.getsize(path)
+        with open(path, "r+b") as file:
+            file.seek(4)
+            file.write(struct.pack("<I", file_size - 8))
+            offset = 12
+            while offset + 8 <= file_size:
+                file.seek(offset)
+                chunk_id, chunk_size = struct.unpack("<4sI", file.read(8))
+                if chunk_id == b"data":
+                    file.seek(offset + 4)
+                    file.write(struct.pack("<I", file_size - offset - 8))
+                    break
+                offset += 8 + chunk_size + (chunk_size % 2)
+
+    def _synthesize_segment(self, text, output_path):
+        self._convert_text_to_voice_openai(text, output_path)
+        self._cache_segment(text, output_path)
 
-    @tenacity.retry(wait=tenacity.wait_exponential(multiplier=1, min=4, max=10),
-                    stop=tenacity.stop_after_attempt(5),
-                    reraise=True)
     def srt_to_voice(self, srt_file_path, output_dir):
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
@@ -79,34 +126,33 @@ class OpenAITTSClient(TTSClient):
 
         sub_generator = srt.parse(srt_content)
         sub_title_list = list(sub_generator)
-        file_mp3_names = []
         file_names = []
 
-        try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = {}
             for index, sub_title in enumerate(sub_title_list, start=1):
-                file_mp3_name = f"{index}.mp3"
                 file_name = f"{index}.wav"
-                output_mp3_path = os.path.join(output_dir, file_mp3_name)
-                file_mp3_names.append(file_mp3_name)
+                output_path = os.path.join(output_dir, file_name)
                 file_names.append(file_name)
-
-                # Convert text to speech using OpenAI
-                self._convert_text_to_voice_openai(sub_title.content, output_mp3_path)
-
-            print("convert srt to mp3 voice using OpenAI successfully")
-        except Exception as e:
-            print(f"convert srt to mp3 voice using OpenAI exception: {e}")
-            raise
-
-        # Convert MP3 to WAV files
-        for mp3_file_name, wav_file_name in zip(file_mp3_names, file_names):
-            mp3_path = os.path.join(output_dir, mp3_file_name)
-            wav_path = os.path.join(output_dir, wav_file_name)
-            sound = AudioSegment.from_mp3(mp3_path)
-            sound.export(wav_path, format="wav")
-            os.remove(mp3_path)
-
-        print("Converted to wav successfully")
+                if self._restore_cached_segment(sub_title.content, output_path):
+                    continue
+                futures[executor.submit(self._synthesize_segment, sub_title.content, output_path)] = index
+
+            print(f"Synthesizing {len(futures)} of {len(sub_title_list)} segments with OpenAI TTS, "
+                  f"concurrency: {self.max_concurrency}")
+            failed = []
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"convert segment {futures[future]} to voice using OpenAI exception: {e}")
+                    failed.append(futures[future])
+
+        # 成功的片段已写入缓存，重新执行时只需合成失败的片段
+        if failed:
+            raise Exception(f"OpenAI TTS failed for {len(failed)} segments: {sorted(failed)[:10]}")
+
+        print("convert srt to wav voice using OpenAI successfully")
         voice_map_srt = copy.deepcopy(sub_title_list)
         for i, sub_title in enumerate(voice_map_srt):
             sub_title.content = file_names[i]
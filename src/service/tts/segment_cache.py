@@ -0,0 +1,105 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+
+
+class TTSSegmentCache:
+    """
+    Content-addressed cache of synthesized subtitle WAVs shared by all videos.
+
+    Segments are keyed by (vendor, voice, model, reference audio hash, options, text). Restoring a segment refreshes
+    its modification time, and once the cache grows beyond max_bytes the least recently used segments are removed.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total_bytes = sum(size for _, _, size in self._list_segments())
+
+    @staticmethod
+    def segment_key(vendor, voice, model, reference_audio_hash, text, options=""):
+        key_source = json.dumps([vendor, voice, model, reference_audio_hash, options, text.strip()], ensure_ascii=False)
+        return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+    def _get_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.wav")
+
+    def _list_segments(self):
+        segments = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".wav"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    segments.append((stat.st_mtime, path, stat.st_size))
+        return segments
+
+    def restore(self, key, output_path):
+        """命中时把缓存的片段复制到 output_path 并返回 True"""
+        path = self._get_path(key)
+        try:
+            shutil.copyfile(path, output_path)
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def store(self, key, wav_path):
+        path = self._get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            # 先写临时文件再替换，避免其他请求读到不完整的片段
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            os.close(fd)
+            shutil.copyfile(wav_path, tmp_path)
+            existed = os.path.exists(path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Warning: Failed to cache TTS segment {wav_path}: {e}")
+            return
+
+        with self.lock:
+            if not existed:
+                self.total_bytes += os.path.getsize(path)
+            over_budget = self.total_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def evict(self):
+        """按最近使用时间淘汰，直到缓存降到上限的 90%"""
+        with self.lock:
+            segments = sorted(self._list_segments())
+            total_bytes = sum(size for _, _, size in segments)
+            target_bytes = self.max_bytes * 0.9
+            for _, path, size in segments:
+                if total_bytes <= target_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total_bytes -= size
+                except FileNotFoundError:
+                    pass
+            self.total_bytes = total_bytes
+
+
+_segment_caches = {}
+_segment_caches_lock = threading.Lock()
+
+
+def get_tts_segment_cache(cache_dir, max_bytes):
+    """同一目录在进程内共用一个缓存实例"""
+    with _segment_caches_lock:
+        cache = _segment_caches.get(cache_dir)
+        if cache is None:
+            cache = TTSSegmentCache(cache_dir, max_bytes)
+            _segment_caches[cache_dir] = cache
+        cache.max_bytes = max_bytes
+        return cache
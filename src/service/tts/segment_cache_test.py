@@ -0,0 +1,115 @@
+import os
+import datetime
+import tempfile
+import unittest
+
+import srt
+
+from src.service.tts.segment_cache import TTSSegmentCache
+from src.service.tts.tts_client import TTSClient
+
+
+class CachedTTSClient(TTSClient):
+    """按文本写出固定内容的 wav，记录实际合成了哪些文本"""
+
+    def __init__(self, segment_cache, voice="zh-CN-XiaoxiaoNeural", model="tts-1", reference_audio_path=None,
+                 options="rate=+0%"):
+        self.segment_cache = segment_cache
+        self.cache_params = ("edge", voice, model, reference_audio_path, options)
+        self.synthesized = []
+
+    def get_cache_params(self):
+        return self.cache_params
+
+    def srt_to_voice(self, srt_file_path, output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        with open(srt_file_path, "r", encoding="utf-8") as file:
+            sub_title_list = list(srt.parse(file.read()))
+        for index, sub_title in enumerate(sub_title_list, start=1):
+            output_path = os.path.join(output_dir, f"{index}.wav")
+            if self._restore_cached_segment(sub_title.content, output_path):
+                continue
+            with open(output_path, "wb") as file:
+                file.write(f"{self.cache_params}{sub_title.content}".encode("utf-8"))
+            self.synthesized.append(sub_title.content)
+            self._cache_segment(sub_title.content, output_path)
+
+
+class TestTTSSegmentCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, "tts_cache")
+        self.cache = TTSSegmentCache(self.cache_dir, max_bytes=1000)
+        self.output_path = os.path.join(self.temp_dir.name, "out.wav")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def write_srt(self, *texts):
+        path = os.path.join(self.temp_dir.name, "zh.srt")
+        subs = [srt.Subtitle(index, datetime.timedelta(seconds=index), datetime.timedelta(seconds=index + 1), text)
+                for index, text in enumerate(texts, start=1)]
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(srt.compose(subs))
+        return path
+
+    def synthesize(self, client, *texts):
+        """用 client 合成 texts，返回实际合成（未命中缓存）的文本"""
+        output_dir = os.path.join(self.temp_dir.name, "zh_source")
+        client.srt_to_voice(self.write_srt(*texts), output_dir)
+        for index, text in enumerate(texts, start=1):
+            with open(os.path.join(output_dir, f"{index}.wav"), "rb") as f:
+                self.assertTrue(f.read().endswith(text.encode("utf-8")))
+        return client.synthesized
+
+    def test_changing_any_key_input_misses(self):
+        reference_path = self.write("reference.wav", b"speaker a")
+        self.assertEqual(self.synthesize(CachedTTSClient(self.cache, reference_audio_path=reference_path),
+                                         "Hello world", "Good bye"), ["Hello world", "Good bye"])
+
+        # 另一个视频中相同的句子直接命中，文本不同则不命中
+        client = CachedTTSClient(self.cache, reference_audio_path=reference_path)
+        self.assertEqual(self.synthesize(client, "Good bye", "Hello world", "Hello World"), ["Hello World"])
+
+        for changed in (dict(voice="zh-CN-YunxiNeural"), dict(model="tts-1-hd"), dict(options="rate=+10%"),
+                        dict(reference_audio_path=None)):
+            other = CachedTTSClient(self.cache, **{"reference_audio_path": reference_path, **changed})
+            self.assertEqual(self.synthesize(other, "Hello world"), ["Hello world"], changed)
+
+        # 参考音频按内容哈希参与键计算，路径不变但内容变了也不命中
+        self.write("reference.wav", b"speaker b")
+        client = CachedTTSClient(self.cache, reference_audio_path=reference_path)
+        self.assertEqual(self.synthesize(client, "Good bye"), ["Good bye"])
+        self.write("reference.wav", b"speaker a")
+        client = CachedTTSClient(self.cache, reference_audio_path=reference_path)
+        self.assertEqual(self.synthesize(client, "Good bye"), [])
+
+        key = TTSSegmentCache.segment_key("edge", "voice", "model", "digest", "text", "options")
+        self.assertNotEqual(key, TTSSegmentCache.segment_key("openai", "voice", "model", "digest", "text", "options"))
+
+    def test_least_recently_used_segments_are_evicted_over_limit(self):
+        segment_path = self.write("segment.wav", b"x" * 300)
+        for age, name in enumerate(("a", "b", "c")):
+            self.cache.store(name * 64, segment_path)
+            os.utime(self.cache._get_path(name * 64), (1000 + age, 1000 + age))
+        self.assertEqual(self.cache.total_bytes, 900)
+
+        # 读取 a 之后它成为最近使用的片段，超出上限时先淘汰 b
+        self.assertTrue(self.cache.restore("a" * 64, self.output_path))
+        self.cache.store("d" * 64, segment_path)
+
+        self.assertEqual([self.cache.restore(name * 64, self.output_path) for name in "abcd"],
+                         [True, False, True, True])
+        self.assertEqual(self.cache.total_bytes, 900)
+        self.assertEqual(TTSSegmentCache(self.cache_dir, max_bytes=1000).total_bytes, 900)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,43 @@
 from abc import ABC, abstractmethod
+from prometheus_client import Counter
+
+from src.service.tts.segment_cache import TTSSegmentCache
+from src.utils.hash_util import file_digest
+
+TTS_SEGMENT_CACHE_LOOKUPS = Counter("tts_segment_cache_lookups_total", "Subtitle segments looked up in the TTS segment cache",
+                                    ["vendor", "result"])
 
 
 class TTSClient(ABC):
+    # 由调用方设置为 TTSSegmentCache，为 None 时不使用缓存
+    segment_cache = None
+
     @abstractmethod
     def srt_to_voice(self, srt_file_path, output_dir):
         pass
+
+    def get_cache_params(self):
+        """
+        返回参与片段缓存键计算的参数 (vendor, voice, model, reference_audio_path, options)，
+        返回 None 表示该客户端的输出不缓存
+        """
+        return None
+
+    def _segment_cache_key(self, text):
+        vendor, voice, model, reference_audio_path, options = self.get_cache_params()
+        reference_audio_hash = file_digest(reference_audio_path) if reference_audio_path else ""
+        return TTSSegmentCache.segment_key(vendor, voice, model, reference_audio_hash, text, options)
+
+    def _restore_cached_segment(self, text, output_path):
+        """缓存命中时把片段写到 output_path 并返回 True，调用方只需合成未命中的片段"""
+        if self.segment_cache is None or self.get_cache_params() is None:
+            return False
+        hit = self.segment_cache.restore(self._segment_cache_key(text), output_path)
+        TTS_SEGMENT_CACHE_LOOKUPS.labels(vendor=self.get_cache_params()[0], result="hit" if hit else "miss").inc()
+        return hit
+
+    def _cache_segment(self, text, wav_path):
+        """缓存合成成功的片段，失败时生成的静音占位不要缓存"""
+        if self.segment_cache is None or self.get_cache_params() is None:
+            return
+        self.segment_cache.store(self._segment_cache_key(text), wav_path)
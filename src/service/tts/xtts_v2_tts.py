@@ -1,12 +1,16 @@
 import os
 import copy
 import srt
-import time
+import hashlib
+import threading
+import collections
 import torch
 import numpy as np
 from pathlib import Path
 from pydub import AudioSegment
 from src.service.tts.tts_client import TTSClient
+from src.service.tts.model_pool import tts_model_pool
+from src.utils.hash_util import file_digest
 
 try:
     from TTS.api import TTS
@@ -15,6 +19,11 @@ except ImportError:
     XTTS_AVAILABLE = False
     print("Warning: XTTS v2 not available. Install with: pip install TTS")
 
+# 内存中保留的参考音频说话人特征数量
+SPEAKER_LATENTS_MEMORY_ENTRIES = 16
+_speaker_latents = collections.OrderedDict()
+_speaker_latents_lock = threading.Lock()
+
 
 class XTTSv2Client(TTSClient):
     """
@@ -23,7 +32,7 @@ class XTTSv2Client(TTSClient):
     """
     
     def __init__(self, model_name="tts_models/multilingual/multi-dataset/xtts_v2", 
-                 reference_audio_path=None, language="zh"):
+                 reference_audio_path=None, language="zh", latent_cache_dir="./xtts_speaker_latents"):
         """
         初始化 XTTS v2 客户端
         
@@ -31,10 +40,12 @@ class XTTSv2Client(TTSClient):
             model_name: XTTS v2 模型名称
             reference_audio_path: 参考音频文件路径（用于克隆声音）
             language: 目标语言代码 (zh, en, es, fr, de, it, pt, pl, tr, ru, nl, cs, ar, sv, hu, ko, ja)
+            latent_cache_dir: 参考音频说话人特征（条件 latent 和说话人嵌入）的磁盘缓存目录
         """
         self.model_name = model_name
         self.reference_audio_path = reference_audio_path
         self.language = language
+        self.latent_cache_dir = latent_cache_dir
         self.tts_model = None
         
         if not XTTS_AVAILABLE:
@@ -43,16 +54,79 @@ class XTTSv2Client(TTSClient):
         # 初始化模型
         self._load_model()
     
+    @staticmethod
+    def _model_key(model_name):
+        return "xtts_v2", model_name, "cuda" if torch.cuda.is_available() else "cpu"
+
+    @staticmethod
+    def _create_model(model_name):
+        print(f"Loading XTTS v2 model: {model_name}")
+        tts_model = TTS(model_name).to(torch.device("cuda" if torch.cuda.is_available() else "cpu"))
+        print("XTTS v2 model loaded successfully")
+        return tts_model
+
+    @classmethod
+    def preload_model(cls, model_name="tts_models/multilingual/multi-dataset/xtts_v2"):
+        """把模型加载到进程级模型池中，之后的请求直接借用"""
+        tts_model_pool.preload(cls._model_key(model_name), lambda: cls._create_model(model_name))
+
     def _load_model(self):
-        """加载 XTTS v2 模型"""
+        """确保 XTTS v2 模型已在模型池中，合成时再借用"""
         try:
-            print(f"Loading XTTS v2 model: {self.model_name}")
-            self.tts_model = TTS(self.model_name).to(torch.device("cuda" if torch.cuda.is_available() else "cpu"))
-            print("XTTS v2 model loaded successfully")
+            self.preload_model(self.model_name)
         except Exception as e:
             print(f"Failed to load XTTS v2 model: {e}")
             raise
     
+    def get_cache_params(self):
+        return "xtts_v2", "", self.model_name, self.reference_audio_path, self.language
+
+    def _get_speaker_latents(self, xtts):
+        """
+        获取参考音频的 gpt 条件 latent 和说话人嵌入。
+
+        按 (模型, 参考音频内容哈希) 缓存在内存和磁盘中，同一参考音频在各片段和各任务间只计算一次。
+        """
+        model_hash = hashlib.sha1(self.model_name.encode("utf-8")).hexdigest()[:8]
+        key = f"{model_hash}_{file_digest(self.reference_audio_path)}"
+        with _speaker_latents_lock:
+            if key in _speaker_latents:
+                _speaker_latents.move_to_end(key)
+                return _speaker_latents[key]
+
+        cache_path = os.path.join(self.latent_cache_dir, f"{key}.pt")
+        latents = None
+        if os.path.exists(cache_path):
+            try:
+                saved = torch.load(cache_path, map_location=xtts.device)
+                latents = (saved["gpt_cond_latent"], saved["speaker_embedding"])
+            except Exception as e:
+                print(f"Warning: Failed to load speaker latents from {cache_path}: {e}")
+
+        if latents is None:
+            config = xtts.config
+            latents = xtts.get_conditioning_latents(
+                audio_path=[self.reference_audio_path],
+                gpt_cond_len=config.gpt_cond_len,
+                gpt_cond_chunk_len=config.gpt_cond_chunk_len,
+                max_ref_length=config.max_ref_len,
+                sound_norm_refs=config.sound_norm_refs
+            )
+            print(f"Computed speaker latents for reference audio: {self.reference_audio_path}")
+            try:
+                os.makedirs(self.latent_cache_dir, exist_ok=True)
+                tmp_path = cache_path + ".tmp"
+                torch.save({"gpt_cond_latent": latents[0].cpu(), "speaker_embedding": latents[1].cpu()}, tmp_path)
+                os.replace(tmp_path, cache_path)
+            except Exception as e:
+                print(f"Warning: Failed to save speaker latents to {cache_path}: {e}")
+
+        with _speaker_latents_lock:
+            _speaker_latents[key] = latents
+            while len(_speaker_latents) > SPEAKER_LATENTS_MEMORY_ENTRIES:
+                _speaker_latents.popitem(last=False)
+        return latents
+
     def _generate_single_audio(self, text, output_path):
         """
         为单个文本生成音频
@@ -65,13 +139,33 @@ class XTTSv2Client(TTSClient):
             if not self.reference_audio_path or not os.path.exists(self.reference_audio_path):
                 raise ValueError("Reference audio path is required and must exist")
             
-            # 使用 XTTS v2 生成语音
-            self.tts_model.tts_to_file(
-                text=text,
-                speaker_wav=self.reference_audio_path,
-                language=self.language,
-                file_path=output_path
-            )
+            synthesizer = self.tts_model.synthesizer
+            xtts = synthesizer.tts_model
+            if hasattr(xtts, "get_conditioning_latents"):
+                # 使用缓存的说话人特征直接推理，不再为每个片段重新处理参考音频
+                gpt_cond_latent, speaker_embedding = self._get_speaker_latents(xtts)
+                config = xtts.config
+                result = xtts.inference(
+                    text,
+                    self.language,
+                    gpt_cond_latent,
+                    speaker_embedding,
+                    temperature=config.temperature,
+                    length_penalty=config.length_penalty,
+                    repetition_penalty=config.repetition_penalty,
+                    top_k=config.top_k,
+                    top_p=config.top_p,
+                    enable_text_splitting=True
+                )
+                synthesizer.save_wav(wav=result["wav"], path=output_path)
+            else:
+                # 使用 XTTS v2 生成语音
+                self.tts_model.tts_to_file(
+                    text=text,
+                    speaker_wav=self.reference_audio_path,
+                    language=self.language,
+                    file_path=output_path
+                )
             
             # 验证生成的音频文件
             if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
@@ -111,24 +205,31 @@ class XTTSv2Client(TTSClient):
         
         print(f"Processing {len(sub_title_list)} subtitle entries with XTTS v2...")
         
-        for index, sub_title in enumerate(sub_title_list, start=1):
-            file_name = f"{index}.wav"
-            output_path = os.path.join(output_dir, file_name)
-            file_names.append(file_name)
+        with tts_model_pool.borrow(self._model_key(self.model_name), lambda: self._create_model(self.model_name)) as tts_model:
+            self.tts_model = tts_model
+            try:
+                for index, sub_title in enumerate(sub_title_list, start=1):
+                    file_name = f"{index}.wav"
+                    output_path = os.path.join(output_dir, file_name)
+                    file_names.append(file_name)
             
-            # 生成音频
-            if self._generate_single_audio(sub_title.content, output_path):
-                success_count += 1
-            else:
-                # 如果生成失败，创建静音文件作为占位符
-                duration_seconds = max(1, len(sub_title.content) / 2.5)
-                silence = AudioSegment.silent(duration=int(duration_seconds * 1000))
-                silence.export(output_path, format="wav")
-                print(f"Created silence placeholder for failed generation: {file_name}")
-            
-            # 添加延迟避免过载
-            time.sleep(0.1)
-        
+                    if self._restore_cached_segment(sub_title.content, output_path):
+                        success_count += 1
+                        continue
+
+                    # 生成音频
+                    if self._generate_single_audio(sub_title.content, output_path):
+                        self._cache_segment(sub_title.content, output_path)
+                        success_count += 1
+                    else:
+                        # 如果生成失败，创建静音文件作为占位符
+                        duration_seconds = max(1, len(sub_title.content) / 2.5)
+                        silence = AudioSegment.silent(duration=int(duration_seconds * 1000))
+                        silence.export(output_path, format="wav")
+                        print(f"Created silence placeholder for failed generation: {file_name}")
+            finally:
+                self.tts_model = None
+
         # 创建语音映射文件
         voice_map_srt = copy.deepcopy(sub_title_list)
         for i, sub_title in enumerate(voice_map_srt):
@@ -1,22 +1,199 @@
 import os
+import sys
 import copy
 import srt
 import time
+import queue
+import shutil
+import itertools
+import threading
 import subprocess
 import json
 from pathlib import Path
 from pydub import AudioSegment
 from src.service.tts.tts_client import TTSClient
 
+# 运行常驻合成进程的解释器，默认使用 tts 命令所在环境的 Python
+XTTS_WORKER_PYTHON = os.environ.get("XTTS_WORKER_PYTHON", "")
+XTTS_WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "xtts_v2_worker.py")
+# 模型加载、单句合成和健康检查的超时（秒）
+XTTS_WORKER_STARTUP_TIMEOUT = int(os.environ.get("XTTS_WORKER_STARTUP_TIMEOUT", "600"))
+XTTS_WORKER_REQUEST_TIMEOUT = int(os.environ.get("XTTS_WORKER_REQUEST_TIMEOUT", "120"))
+XTTS_WORKER_PING_TIMEOUT = 10
+# 空闲超过该时间后，下一次请求前先做健康检查
+XTTS_WORKER_HEALTH_CHECK_INTERVAL = 60
+
+
+def _find_tts_python():
+    """根据 tts 命令的 shebang 找到安装了 TTS 库的解释器，找不到时使用当前解释器"""
+    if XTTS_WORKER_PYTHON:
+        return [XTTS_WORKER_PYTHON]
+    tts_path = shutil.which("tts")
+    if tts_path:
+        try:
+            with open(tts_path, "r", encoding="utf-8", errors="ignore") as file:
+                first_line = file.readline().strip()
+            if first_line.startswith("#!") and "python" in first_line:
+                return first_line[2:].split()
+        except OSError:
+            pass
+    return [sys.executable]
+
+
+class XTTSWorkerError(Exception):
+    pass
+
+
+class XTTSWorkerStartError(XTTSWorkerError):
+    pass
+
+
+class XTTSWorker:
+    """
+    A long-lived XTTS v2 synthesis subprocess that loads the model once.
+
+    Requests are sent one at a time as JSON lines over the worker's stdin and answered on its stdout. A worker that
+    exits, stops answering health checks or times out on a request is killed and started again on the next request.
+    """
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.process = None
+        self.responses = None
+        self.request_ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.last_used = 0
+
+    def _start(self):
+        command = _find_tts_python() + [XTTS_WORKER_SCRIPT, "--model_name", self.model_name]
+        print(f"Starting XTTS v2 worker: {' '.join(command)}")
+        try:
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                            text=True, encoding="utf-8", bufsize=1)
+        except OSError as e:
+            raise XTTSWorkerStartError(f"Failed to start XTTS v2 worker: {e}")
+        self.responses = queue.Queue()
+        threading.Thread(target=self._read_responses, args=(self.process, self.responses), daemon=True).start()
+
+        try:
+            ready = self._wait_response(XTTS_WORKER_STARTUP_TIMEOUT)
+        except XTTSWorkerError as e:
+            self._kill()
+            raise XTTSWorkerStartError(str(e))
+        if not ready.get("ready"):
+            self._kill()
+            raise XTTSWorkerStartError(ready.get("error", "XTTS v2 worker failed to start"))
+        self.last_used = time.time()
+        print(f"XTTS v2 worker ready (pid {self.process.pid}, device {ready.get('device')})")
+
+    @staticmethod
+    def _read_responses(process, responses):
+        for line in process.stdout:
+            try:
+                responses.put(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"XTTS v2 worker: {line.rstrip()}")
+        # 进程退出时通知等待中的请求
+        responses.put(None)
+
+    def _wait_response(self, timeout, request_id=None):
+        deadline = time.time() + timeout
+        while True:
+            try:
+                response = self.responses.get(timeout=max(0, deadline - time.time()))
+            except queue.Empty:
+                raise XTTSWorkerError(f"XTTS v2 worker did not respond within {timeout}s")
+            if response is None:
+                raise XTTSWorkerError(f"XTTS v2 worker exited with code {self.process.wait()}")
+            # 忽略之前超时请求迟到的响应
+            if request_id is None or response.get("id") == request_id:
+                return response
+
+    def _kill(self):
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def _request(self, message, timeout):
+        request_id = next(self.request_ids)
+        try:
+            self.process.stdin.write(json.dumps(dict(message, id=request_id), ensure_ascii=False) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise XTTSWorkerError(f"Failed to send request to XTTS v2 worker: {e}")
+        response = self._wait_response(timeout, request_id)
+        self.last_used = time.time()
+        return response
+
+    def _ensure_healthy(self):
+        if self.process is not None and self.process.poll() is not None:
+            print(f"XTTS v2 worker exited with code {self.process.returncode}, restarting")
+            self._kill()
+        if self.process is not None and time.time() - self.last_used > XTTS_WORKER_HEALTH_CHECK_INTERVAL:
+            try:
+                self._request({"op": "ping"}, XTTS_WORKER_PING_TIMEOUT)
+            except XTTSWorkerError as e:
+                print(f"XTTS v2 worker health check failed, restarting: {e}")
+                self._kill()
+        if self.process is None:
+            self._start()
+
+    def synthesize(self, text, speaker_wav, language, out_path, max_attempts=2):
+        """合成一句到 out_path，进程崩溃或超时时重启后重试"""
+        with self.lock:
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    self._ensure_healthy()
+                    response = self._request({"op": "synthesize", "text": text, "speaker_wav": speaker_wav,
+                                              "language": language, "out_path": out_path},
+                                             XTTS_WORKER_REQUEST_TIMEOUT)
+                except XTTSWorkerStartError:
+                    raise
+                except XTTSWorkerError as e:
+                    print(f"XTTS v2 worker failed (attempt {attempt}/{max_attempts}): {e}")
+                    self._kill()
+                    if attempt == max_attempts:
+                        raise
+                    continue
+                if not response.get("ok"):
+                    raise XTTSWorkerError(response.get("error", "Unknown XTTS v2 worker error"))
+                return
+
+    def stop(self):
+        with self.lock:
+            if self.process is not None and self.process.poll() is None:
+                try:
+                    self._request({"op": "shutdown"}, XTTS_WORKER_PING_TIMEOUT)
+                except XTTSWorkerError:
+                    pass
+            self._kill()
+
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def get_xtts_worker(model_name):
+    """同一模型在进程内共用一个常驻合成进程"""
+    with _workers_lock:
+        worker = _workers.get(model_name)
+        if worker is None:
+            worker = XTTSWorker(model_name)
+            _workers[model_name] = worker
+        return worker
+
 
 class XTTSv2CompatibleClient(TTSClient):
     """
-    XTTS v2 兼容客户端 - 使用命令行接口避免 Python 版本兼容性问题
+    XTTS v2 兼容客户端 - 在 TTS 库所在的解释器中运行常驻合成进程，避免 Python 版本兼容性问题
+    常驻进程不可用时退回到每句调用一次 tts 命令行
     支持多语言语音合成，需要提供参考音频
     """
     
     def __init__(self, model_name="tts_models/multilingual/multi-dataset/xtts_v2", 
-                 reference_audio_path=None, language="zh"):
+                 reference_audio_path=None, language="zh", use_worker=True):
         """
         初始化 XTTS v2 兼容客户端
         
@@ -24,10 +201,12 @@ class XTTSv2CompatibleClient(TTSClient):
             model_name: XTTS v2 模型名称
             reference_audio_path: 参考音频文件路径（用于克隆声音）
             language: 目标语言代码 (zh, en, es, fr, de, it, pt, pl, tr, ru, nl, cs, ar, sv, hu, ko, ja)
+            use_worker: 是否使用常驻合成进程，为 False 时每句调用一次 tts 命令行
         """
         self.model_name = model_name
         self.reference_audio_path = reference_audio_path
         self.language = language
+        self.use_worker = use_worker
         
         # 检查 TTS 命令行工具是否可用
         self._check_tts_availability()
@@ -42,6 +221,9 @@ class XTTSv2CompatibleClient(TTSClient):
         except (subprocess.TimeoutExpired, FileNotFoundError, RuntimeError) as e:
             raise ImportError(f"TTS command line tool not available: {e}. Please install TTS: pip install TTS==0.22.0")
     
+    def get_cache_params(self):
+        return "xtts_v2", "", self.model_name, self.reference_audio_path, self.language
+
     def _generate_single_audio(self, text, output_path):
         """
         为单个文本生成音频
@@ -50,6 +232,29 @@ class XTTSv2CompatibleClient(TTSClient):
             text: 要合成的文本
             output_path: 输出音频文件路径
         """
+        if not self.use_worker:
+            return self._generate_single_audio_cli(text, output_path)
+        try:
+            if not self.reference_audio_path or not os.path.exists(self.reference_audio_path):
+                raise ValueError("Reference audio path is required and must exist")
+
+            get_xtts_worker(self.model_name).synthesize(text, os.path.abspath(self.reference_audio_path),
+                                                        self.language, os.path.abspath(output_path))
+            if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+                print(f"Generated audio for: {text[:50]}... -> {output_path}")
+                return True
+            print(f"Failed to generate audio for: {text[:50]}...")
+            return False
+        except XTTSWorkerStartError as e:
+            print(f"XTTS v2 worker unavailable, falling back to command line: {e}")
+            self.use_worker = False
+            return self._generate_single_audio_cli(text, output_path)
+        except Exception as e:
+            print(f"Error generating audio with XTTS v2: {e}")
+            return False
+
+    def _generate_single_audio_cli(self, text, output_path):
+        """每句启动一次 tts 命令行生成音频，常驻进程不可用时使用"""
         try:
             if not self.reference_audio_path or not os.path.exists(self.reference_audio_path):
                 raise ValueError("Reference audio path is required and must exist")
@@ -113,8 +318,13 @@ class XTTSv2CompatibleClient(TTSClient):
             output_path = os.path.join(output_dir, file_name)
             file_names.append(file_name)
             
+            if self._restore_cached_segment(sub_title.content, output_path):
+                success_count += 1
+                continue
+
             # 生成音频
             if self._generate_single_audio(sub_title.content, output_path):
+                self._cache_segment(sub_title.content, output_path)
                 success_count += 1
             else:
                 # 如果生成失败，创建静音文件作为占位符
@@ -122,9 +332,6 @@ class XTTSv2CompatibleClient(TTSClient):
                 silence = AudioSegment.silent(duration=int(duration_seconds * 1000))
                 silence.export(output_path, format="wav")
                 print(f"Created silence placeholder for failed generation: {file_name}")
-            
-            # 添加延迟避免过载
-            time.sleep(0.5)
         
         # 创建语音映射文件
         voice_map_srt = copy.deepcopy(sub_title_list)
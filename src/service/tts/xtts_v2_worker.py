@@ -0,0 +1,70 @@
+"""
+XTTS v2 常驻合成进程，由 XTTSv2CompatibleClient 在安装了 TTS 库的 Python 环境中启动。
+
+模型只加载一次，之后通过 stdin/stdout 逐行收发 JSON 请求：
+    {"id": 1, "op": "ping"}
+    {"id": 2, "op": "synthesize", "text": "...", "speaker_wav": "...", "language": "zh", "out_path": "..."}
+每个请求返回一行 {"id": ..., "ok": true/false, "error": "..."}。启动完成时先输出 {"ready": true}。
+
+本文件不能导入项目中的其他模块，它运行在 TTS 库所在的解释器中。
+"""
+import os
+import sys
+import json
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description="XTTS v2 synthesis worker")
+    parser.add_argument("--model_name", default="tts_models/multilingual/multi-dataset/xtts_v2")
+    args = parser.parse_args()
+
+    # 协议只使用原来的 stdout，库自身的输出全部转到 stderr，避免混进响应
+    protocol_out = os.fdopen(os.dup(1), "w", encoding="utf-8", buffering=1)
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    def respond(message):
+        protocol_out.write(json.dumps(message, ensure_ascii=False) + "\n")
+        protocol_out.flush()
+
+    try:
+        import torch
+        from TTS.api import TTS
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        tts_model = TTS(args.model_name).to(torch.device(device))
+    except Exception as e:
+        respond({"ready": False, "error": f"Failed to load XTTS v2 model: {e}"})
+        return 1
+    respond({"ready": True, "model_name": args.model_name, "device": device})
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            op = request.get("op")
+            if op == "ping":
+                respond({"id": request_id, "ok": True})
+            elif op == "synthesize":
+                tts_model.tts_to_file(
+                    text=request["text"],
+                    speaker_wav=request["speaker_wav"],
+                    language=request["language"],
+                    file_path=request["out_path"]
+                )
+                respond({"id": request_id, "ok": True})
+            elif op == "shutdown":
+                respond({"id": request_id, "ok": True})
+                break
+            else:
+                respond({"id": request_id, "ok": False, "error": f"Unknown op: {op}"})
+        except Exception as e:
+            respond({"id": request_id, "ok": False, "error": str(e)})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import os
+import json
+import math
+import wave
+import hashlib
+import tempfile
+import numpy as np
+from scipy.io import wavfile
+from scipy.signal import resample_poly
+from src.utils.hash_util import file_digest
+
+# 每次处理的输出时长（秒），整条音轨不必同时放在内存中
+MIX_BLOCK_SECONDS = 30
+# 软限幅的起始电平，超过的部分被平滑压缩到满幅以内
+LIMITER_THRESHOLD = 0.95
+
+
+class _WavSource:
+    """以内存映射方式读取的 wav 文件，按输出采样率分块取出 float32 采样"""
+
+    def __init__(self, path, gain_db, output_rate):
+        self.frame_rate, data = wavfile.read(path, mmap=True)
+        self.data = data.reshape(len(data), -1)
+        self.channels = self.data.shape[1]
+        self.gain = 10 ** (gain_db / 20)
+        if data.dtype == np.uint8:
+            self.offset, self.scale = 128.0, 128.0
+        elif np.issubdtype(data.dtype, np.integer):
+            self.offset, self.scale = 0.0, float(np.iinfo(data.dtype).max + 1)
+        else:
+            self.offset, self.scale = 0.0, 1.0
+
+        ratio = math.gcd(output_rate, self.frame_rate)
+        self.up = output_rate // ratio
+        self.down = self.frame_rate // ratio
+        self.output_frames = -(-len(self.data) * self.up // self.down)
+        # 分块重采样时两侧多取的输入帧数，覆盖 resample_poly 滤波器的半长，并保持 down 的整数倍
+        self.padding = self.down * (math.ceil(10 * max(self.up, self.down) / self.up / self.down) + 1)
+
+    def _samples(self, start, end):
+        block = np.zeros((end - start, self.channels), dtype=np.float32)
+        source_start, source_end = max(start, 0), min(end, len(self.data))
+        if source_end > source_start:
+            block[source_start - start:source_end - start] = self.data[source_start:source_end]
+        if self.offset:
+            block[source_start - start:source_end - start] -= self.offset
+        return block / self.scale
+
+    def block(self, start, length):
+        """输出采样率下 [start, start + length) 的采样，start 和 length 需为 up 的整数倍"""
+        if self.up == self.down:
+            return self._samples(start, start + length) * self.gain
+        source_start = start // self.up * self.down
+        source_length = length // self.up * self.down
+        samples = self._samples(source_start - self.padding, source_start + source_length + self.padding)
+        resampled = resample_poly(samples, self.up, self.down, axis=0)
+        trim = self.padding // self.down * self.up
+        return resampled[trim:trim + length].astype(np.float32) * self.gain
+
+
+def soft_limit(samples, threshold=LIMITER_THRESHOLD):
+    """超过 threshold 的部分按 tanh 平滑压缩，输出不超过满幅，阈值以下的采样不变"""
+    magnitude = np.abs(samples)
+    over = magnitude > threshold
+    if np.any(over):
+        headroom = 1.0 - threshold
+        limited = threshold + headroom * np.tanh((magnitude[over] - threshold) / headroom)
+        samples[over] = np.sign(samples[over]) * limited
+    return samples
+
+
+def mix_audio_files(sources, output_path, limit=True):
+    """
+    把多个 wav 相加混成一条 16 位音轨，一次写出
+
+    Args:
+        sources: [(wav 路径, 增益 dB), ...]，采样率和声道数可以不同，输出取最高采样率和最多声道，单声道会复制到各声道
+        limit: 是否对超过满幅的混音做软限幅，为 False 时直接截断
+    """
+    output_rate = max(wavfile.read(path, mmap=True)[0] for path, _ in sources)
+    wav_sources = [_WavSource(path, gain_db, output_rate) for path, gain_db in sources]
+    channels = max(source.channels for source in wav_sources)
+    total_frames = max(source.output_frames for source in wav_sources)
+    # 分块长度取各来源 up 的公倍数，保证每块都能对齐到输入帧
+    alignment = math.lcm(*(source.up for source in wav_sources))
+    block_frames = max(alignment, MIX_BLOCK_SECONDS * output_rate // alignment * alignment)
+
+    with wave.open(output_path, "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(output_rate)
+        for start in range(0, total_frames, block_frames):
+            length = min(block_frames, total_frames - start)
+            padded_length = -(-length // alignment) * alignment
+            mixed = np.zeros((padded_length, channels), dtype=np.float32)
+            for source in wav_sources:
+                # 单声道通过广播叠加到每个声道
+                mixed += source.block(start, padded_length)
+            mixed = mixed[:length]
+            if limit:
+                soft_limit(mixed)
+            pcm = np.clip(np.round(mixed * 32768), -32768, 32767).astype("<i2")
+            wav_file.writeframes(pcm.tobytes())
+
+
+def get_mixed_audio(voice_path, background_path, cache_dir, voice_gain_db=0.0, background_gain_db=0.0, limit=True):
+    """
+    返回人声和背景声混音后的 wav 路径
+
+    混音结果按 (人声内容哈希, 背景声内容哈希, 增益, 限幅) 缓存在 cache_dir 中，重复渲染预览时直接复用。
+    """
+    key_source = json.dumps([file_digest(voice_path), file_digest(background_path),
+                             voice_gain_db, background_gain_db, limit])
+    key = hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+    mixed_path = os.path.join(cache_dir, f"{key}.wav")
+    if os.path.exists(mixed_path):
+        os.utime(mixed_path)
+        print(f"Reuse mixed preview audio: {mixed_path}")
+        return mixed_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    os.close(fd)
+    try:
+        mix_audio_files([(voice_path, voice_gain_db), (background_path, background_gain_db)], tmp_path, limit)
+        os.replace(tmp_path, mixed_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    print(f"Mixed preview audio: {mixed_path}")
+    return mixed_path
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from unittest.mock import patch
+from scipy.io import wavfile
+from scipy.signal import resample_poly
+from src.service.video_synthesis import audio_mix
+from src.service.video_synthesis.audio_mix import mix_audio_files, get_mixed_audio, soft_limit
+
+
+class TestAudioMix(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.voice = (rng.normal(0, 0.1, 24000 * 3 + 13) * 32767).astype(np.int16)
+        self.background = rng.normal(0, 0.1, (44100 * 2 + 7, 2)).astype(np.float32)
+        self.voice_path = os.path.join(self.temp_dir.name, "voice.wav")
+        self.background_path = os.path.join(self.temp_dir.name, "bg.wav")
+        wavfile.write(self.voice_path, 24000, self.voice)
+        wavfile.write(self.background_path, 44100, self.background)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    @patch.object(audio_mix, "MIX_BLOCK_SECONDS", 1)
+    def test_blockwise_mix_matches_whole_signal(self):
+        output_path = os.path.join(self.temp_dir.name, "mixed.wav")
+        mix_audio_files([(self.voice_path, 0.0), (self.background_path, -6.0)], output_path, limit=False)
+
+        voice = resample_poly(self.voice / 32768.0, 147, 80)[:, None]
+        expected = np.zeros((max(len(voice), len(self.background)), 2))
+        expected[:len(voice)] += voice
+        expected[:len(self.background)] += self.background * 10 ** (-6 / 20)
+        expected = np.clip(np.round(expected * 32768), -32768, 32767)
+
+        frame_rate, mixed = wavfile.read(output_path)
+        self.assertEqual(frame_rate, 44100)
+        self.assertEqual(mixed.shape, expected.shape)
+        self.assertLessEqual(np.abs(mixed - expected).max(), 1)
+
+    def test_soft_limit_keeps_quiet_samples(self):
+        samples = np.array([0.5, -0.9, 0.97, 1.8, -4.0], dtype=np.float32)
+        limited = soft_limit(samples.copy())
+        np.testing.assert_array_equal(limited[:2], samples[:2])
+        self.assertTrue(np.all(np.abs(limited) <= 1.0))
+        self.assertTrue(0.95 < limited[2] < limited[3])
+
+    def test_mixed_audio_is_cached_by_content(self):
+        cache_dir = os.path.join(self.temp_dir.name, "cache")
+        first = get_mixed_audio(self.voice_path, self.background_path, cache_dir)
+        with patch.object(audio_mix, "mix_audio_files") as mix:
+            second = get_mixed_audio(self.voice_path, self.background_path, cache_dir)
+            mix.assert_not_called()
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, get_mixed_audio(self.voice_path, self.background_path, cache_dir,
+                                                   background_gain_db=-3.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
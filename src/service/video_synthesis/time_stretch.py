@@ -0,0 +1,89 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# WSOLA 的分析窗长和搜索范围（毫秒）
+WSOLA_WINDOW_MS = 40
+WSOLA_TOLERANCE_MS = 10
+# 粗略搜索拼接位置时使用的采样率
+WSOLA_SEARCH_RATE = 4000
+
+
+def wsola_time_stretch(samples, speed, frame_rate, window_ms=WSOLA_WINDOW_MS, tolerance_ms=WSOLA_TOLERANCE_MS):
+    """
+    Shorten (speed > 1) or lengthen (speed < 1) audio without changing its pitch using WSOLA.
+
+    Output frames are Hann windowed and overlap by half, so they sum back to unit gain. Each analysis frame is taken
+    from near its nominal position speed * t, shifted by up to tolerance_ms to the offset whose waveform best
+    continues the previous frame, which is what keeps the result free of phasing. The output always has exactly
+    round(len(samples) / speed) frames.
+
+    Args:
+        samples: float 采样，形状为 (frames,) 或 (frames, channels)
+        speed: 加速倍数
+        frame_rate: 采样率
+    """
+    if speed <= 0:
+        raise ValueError(f"speed must be positive, got {speed}")
+    samples = np.asarray(samples, dtype=np.float32)
+    mono_input = samples.ndim == 1
+    if mono_input:
+        samples = samples[:, None]
+    input_length = len(samples)
+    output_length = int(round(input_length / speed))
+    if speed == 1.0 or input_length == 0 or output_length == 0:
+        stretched = samples[:output_length].copy()
+        return stretched[:, 0] if mono_input else stretched
+
+    window_length = max(4, int(frame_rate * window_ms / 1000) // 2 * 2)
+    hop = window_length // 2
+    tolerance = int(frame_rate * tolerance_ms / 1000)
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(window_length) / window_length)).astype(np.float32)
+
+    # 输出缓冲区的第 hop 个采样对应输出的起点，使开头半个窗也能被完整叠加
+    frame_count = (output_length + hop) // hop + 1
+    frame_count += frame_count % 2
+    nominal = np.round((np.arange(frame_count) * hop - hop) * speed).astype(np.int64)
+    pad_front = int(np.ceil(hop * speed)) + tolerance
+    pad_back = max(0, int(nominal[-1]) + tolerance + window_length - input_length) + window_length
+    padded = np.pad(samples, ((pad_front, pad_back), (0, 0)))
+    positions = nominal + pad_front
+
+    # 先在降采样后的信号上粗略搜索拼接位置，再在原采样率下细化
+    guide = padded.mean(axis=1)
+    decimation = max(1, min(frame_rate // WSOLA_SEARCH_RATE, tolerance))
+    coarse = guide[:len(guide) // decimation * decimation].reshape(-1, decimation).mean(axis=1)
+    coarse_window = window_length // decimation
+    chosen = positions.copy()
+    for k in range(1, frame_count):
+        natural = chosen[k - 1] + hop
+        start = positions[k] - tolerance
+        template = coarse[natural // decimation:natural // decimation + coarse_window]
+        region = coarse[start // decimation:(start + 2 * tolerance + window_length) // decimation]
+        if not np.any(template) or not np.any(region):
+            continue
+        candidate = start // decimation * decimation + int(np.argmax(np.correlate(region, template, "valid"))) * decimation
+        low = max(start, candidate - decimation)
+        high = min(start + 2 * tolerance, candidate + decimation)
+        candidates = sliding_window_view(guide[low:high + window_length], window_length)
+        chosen[k] = low + int(np.argmax(candidates @ guide[natural:natural + window_length]))
+
+    # 相邻帧重叠半个窗，偶数帧和奇数帧各自首尾相接，可以整体叠加
+    frames = padded[chosen[:, None] + np.arange(window_length)] * window[None, :, None]
+    output = np.zeros((frame_count * hop + window_length, samples.shape[1]), dtype=np.float32)
+    even = frames[0::2].reshape(-1, samples.shape[1])
+    odd = frames[1::2].reshape(-1, samples.shape[1])
+    output[:len(even)] += even
+    output[hop:hop + len(odd)] += odd
+
+    stretched = output[hop:hop + output_length]
+    return stretched[:, 0] if mono_input else stretched
+
+
+def speed_up_audio(audio, speed):
+    """AudioSegment 版本的加速，替代 AudioSegment.speedup，时长精确为原来的 1 / speed"""
+    dtype = {1: np.int8, 2: np.int16, 4: np.int32}[audio.sample_width]
+    full_scale = float(1 << (8 * audio.sample_width - 1))
+    samples = np.frombuffer(audio.raw_data, dtype=np.dtype(dtype).newbyteorder("<")).reshape(-1, audio.channels)
+    stretched = wsola_time_stretch(samples / full_scale, speed, audio.frame_rate)
+    stretched = np.clip(np.round(stretched * full_scale), -full_scale, full_scale - 1)
+    return audio._spawn(stretched.astype(np.dtype(dtype).newbyteorder("<")).tobytes())
@@ -0,0 +1,39 @@
+import unittest
+import numpy as np
+from pydub.generators import Sine
+from src.service.video_synthesis.time_stretch import wsola_time_stretch, speed_up_audio
+
+
+def dominant_frequency(samples, frame_rate):
+    spectrum = np.abs(np.fft.rfft(samples * np.hanning(len(samples))))
+    return np.argmax(spectrum) * frame_rate / len(samples)
+
+
+class TestTimeStretch(unittest.TestCase):
+
+    def setUp(self):
+        self.frame_rate = 24000
+        t = np.arange(self.frame_rate * 2) / self.frame_rate
+        self.tone = 0.5 * np.sin(2 * np.pi * 220 * t)
+
+    def test_output_length_is_exact(self):
+        for speed in [1.0, 1.001, 1.05, 1.3, 2.0, 3.7]:
+            stretched = wsola_time_stretch(self.tone, speed, self.frame_rate)
+            self.assertEqual(len(stretched), round(len(self.tone) / speed))
+
+    def test_pitch_and_level_are_preserved(self):
+        for speed in [1.01, 1.2, 2.0]:
+            stretched = wsola_time_stretch(self.tone, speed, self.frame_rate)
+            self.assertAlmostEqual(dominant_frequency(stretched, self.frame_rate), 220, delta=1)
+            self.assertAlmostEqual(np.sqrt(np.mean(stretched[1000:-1000] ** 2)), 0.5 / np.sqrt(2), delta=0.01)
+
+    def test_speed_up_audio_keeps_format(self):
+        audio = Sine(220).to_audio_segment(duration=1500).set_channels(2)
+        stretched = speed_up_audio(audio, 1.25)
+        self.assertEqual((stretched.channels, stretched.frame_rate, stretched.sample_width),
+                         (audio.channels, audio.frame_rate, audio.sample_width))
+        self.assertEqual(stretched.frame_count(), round(audio.frame_count() / 1.25))
+
+
+if __name__ == '__main__':
+    unittest.main()
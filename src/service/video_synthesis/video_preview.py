@@ -1,10 +1,19 @@
 from moviepy.editor import VideoFileClip, AudioFileClip, CompositeAudioClip
+from concurrent.futures import ThreadPoolExecutor
 import os
+import shutil
+import tempfile
+import datetime
 import subprocess
+from src.service.video_synthesis.audio_mix import get_mixed_audio
+
+SUBTITLE_FORCE_STYLE = ("FontSize=24,PrimaryColour=&Hffffff,OutlineColour=&H000000,BackColour=&H000000,"
+                        "Outline=2,Shadow=1,Alignment=2,MarginV=30")
 
 
 def zhVideoPreview(logger, videoFileNameAndPath, voiceFileNameAndPath, insturmentFileNameAndPath, srtFileNameAndPath,
-                   outputFileNameAndPath, hardcode_subtitles=False, max_chars_per_line=30):
+                   outputFileNameAndPath, hardcode_subtitles=False, max_chars_per_line=30, encode_segments=1,
+                   audio_cache_dir=None):
     """
     视频预览合成函数
     
@@ -17,22 +26,93 @@ def zhVideoPreview(logger, videoFileNameAndPath, voiceFileNameAndPath, insturmen
         outputFileNameAndPath: 输出文件路径
         hardcode_subtitles: 是否硬编码字幕到视频中，默认False
         max_chars_per_line: 每行最大字符数，默认30
+        encode_segments: 硬编码字幕时把视频按关键帧切成几段并行编码，默认1（不切分）
+        audio_cache_dir: 人声和背景声混音的缓存目录，默认为输出目录下的 preview_audio_cache
     """
+
+    # 人声和背景声先混成一条音轨并缓存，后续各路径只需处理一路音频
+    if voiceFileNameAndPath and os.path.exists(voiceFileNameAndPath) and \
+            insturmentFileNameAndPath and os.path.exists(insturmentFileNameAndPath):
+        if audio_cache_dir is None:
+            audio_cache_dir = os.path.join(os.path.dirname(os.path.abspath(outputFileNameAndPath)), "preview_audio_cache")
+        try:
+            voiceFileNameAndPath = get_mixed_audio(voiceFileNameAndPath, insturmentFileNameAndPath, audio_cache_dir)
+            insturmentFileNameAndPath = None
+        except Exception as e:
+            print(f"混音失败，改为在合成视频时混音: {e}")
     
     # 如果启用硬编码字幕且字幕文件存在，使用FFmpeg处理
     if hardcode_subtitles and srtFileNameAndPath and os.path.exists(srtFileNameAndPath):
+        if encode_segments > 1:
+            if _create_video_with_hardcoded_subtitles_parallel(
+                    videoFileNameAndPath, voiceFileNameAndPath, insturmentFileNameAndPath,
+                    srtFileNameAndPath, outputFileNameAndPath, max_chars_per_line, encode_segments):
+                return True
+            print("分段并行编码失败，改用单进程编码")
         return _create_video_with_hardcoded_subtitles(
             videoFileNameAndPath, voiceFileNameAndPath, insturmentFileNameAndPath, 
             srtFileNameAndPath, outputFileNameAndPath, max_chars_per_line
         )
     else:
-        # 使用原来的MoviePy方法
+        # 不需要烧录字幕时只替换音轨，视频流直接复制，失败时退回 MoviePy 重新编码
+        if _create_video_with_remux(videoFileNameAndPath, voiceFileNameAndPath, insturmentFileNameAndPath,
+                                    outputFileNameAndPath):
+            return True
+        print("音轨替换失败，改用 MoviePy 重新编码视频")
         return _create_video_with_moviepy(
             videoFileNameAndPath, voiceFileNameAndPath, insturmentFileNameAndPath, 
             outputFileNameAndPath
         )
 
 
+def _run_ffmpeg(command):
+    """执行 FFmpeg 命令，成功返回 True"""
+    try:
+        print(f"执行FFmpeg命令: {' '.join(command)}")
+        subprocess.run(command, check=True, capture_output=True, text=True)
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"FFmpeg执行失败: {e}")
+        print(f"错误输出: {e.stderr}")
+        return False
+    except Exception as e:
+        print(f"FFmpeg执行过程中发生错误: {e}")
+        return False
+
+
+def _create_video_with_remux(videoFileNameAndPath, voiceFileNameAndPath, insturmentFileNameAndPath,
+                             outputFileNameAndPath):
+    """
+    使用FFmpeg替换音轨（不包含硬编码字幕）
+
+    人声和背景音乐在一次处理中直接相加（与 CompositeAudioClip 相同，不做音量归一化）并编码为 AAC，
+    视频流不解码直接复制，输出时长与原视频一致。
+    """
+    audio_paths = [path for path in (voiceFileNameAndPath, insturmentFileNameAndPath)
+                   if path is not None and os.path.exists(path)]
+
+    command = ['ffmpeg', '-y', '-i', videoFileNameAndPath]
+    for path in audio_paths:
+        command.extend(['-i', path])
+
+    command.extend(['-map', '0:v:0'])
+    if audio_paths:
+        audio_inputs = ''.join(f'[{index + 1}:a]' for index in range(len(audio_paths)))
+        if len(audio_paths) > 1:
+            audio_filter = f"{audio_inputs}amix=inputs={len(audio_paths)}:duration=longest:normalize=0,apad[a]"
+        else:
+            audio_filter = f"{audio_inputs}apad[a]"
+        # apad 配合 -shortest：音频比视频短时补静音，比视频长时截断
+        command.extend(['-filter_complex', audio_filter, '-map', '[a]', '-shortest',
+                        '-c:a', 'aac', '-b:a', '192k'])
+    else:
+        # 没有人声和背景音乐时保留原视频的音轨（与 MoviePy 路径一致），原视频没有音轨时不输出音频
+        command.extend(['-map', '0:a?', '-c:a', 'copy'])
+    command.extend(['-c:v', 'copy', '-movflags', '+faststart', outputFileNameAndPath])
+
+    return _run_ffmpeg(command)
+
+
 def _create_video_with_moviepy(videoFileNameAndPath, voiceFileNameAndPath, insturmentFileNameAndPath, outputFileNameAndPath):
     """使用MoviePy创建视频（不包含硬编码字幕）"""
     # 从moviepy.editor导入VideoFileClip的创建音-视频剪辑
@@ -113,9 +193,9 @@ def _create_video_with_hardcoded_subtitles(videoFileNameAndPath, voiceFileNameAn
         audio_inputs.append(f'[{audio_count + 1}:a]')
         audio_count += 1
     
-    # 音频混合
+    # 音频混合，直接相加不做音量归一化，与 _create_video_with_remux 和 CompositeAudioClip 一致
     if len(audio_inputs) > 1:
-        filter_complex.append(f"{' '.join(audio_inputs)}amix=inputs={len(audio_inputs)}[a]")
+        filter_complex.append(f"{' '.join(audio_inputs)}amix=inputs={len(audio_inputs)}:normalize=0[a]")
     elif len(audio_inputs) == 1:
         filter_complex.append(f"{audio_inputs[0]}copy[a]")
     
@@ -126,7 +206,7 @@ def _create_video_with_hardcoded_subtitles(videoFileNameAndPath, voiceFileNameAn
     subtitle_path_for_ffmpeg = processed_srt_path.replace('\\', '/').replace(':', '\\:')
     print(f"   字幕路径(FFmpeg): {subtitle_path_for_ffmpeg}")
     
-    filter_complex.append(f"[0:v]subtitles={subtitle_path_for_ffmpeg}:force_style='FontSize=24,PrimaryColour=&Hffffff,OutlineColour=&H000000,BackColour=&H000000,Outline=2,Shadow=1,Alignment=2,MarginV=30'[v]")
+    filter_complex.append(f"[0:v]subtitles={subtitle_path_for_ffmpeg}:force_style='{SUBTITLE_FORCE_STYLE}'[v]")
     
     # 组合过滤器
     if filter_complex:
@@ -171,6 +251,122 @@ def _create_video_with_hardcoded_subtitles(videoFileNameAndPath, voiceFileNameAn
         return False
 
 
+def _probe_keyframes(videoFileNameAndPath):
+    """读取视频流的时长和所有关键帧时间（秒），只解析数据包，不解码画面"""
+    duration = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', videoFileNameAndPath],
+        check=True, capture_output=True, text=True).stdout.strip()
+    packets = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags',
+         '-of', 'csv=p=0', videoFileNameAndPath],
+        check=True, capture_output=True, text=True).stdout
+    keyframes = []
+    for line in packets.splitlines():
+        fields = line.strip().split(',')
+        if len(fields) >= 2 and 'K' in fields[1] and fields[0] not in ('', 'N/A'):
+            keyframes.append(float(fields[0]))
+    return float(duration), sorted(keyframes)
+
+
+def _split_at_keyframes(duration, keyframes, segment_count):
+    """把 [0, duration) 在最接近等分点的关键帧处切成最多 segment_count 段，返回 [(start, end), ...]"""
+    boundaries = [0.0]
+    for index in range(1, segment_count):
+        target = duration * index / segment_count
+        candidates = [keyframe for keyframe in keyframes if keyframe > boundaries[-1]]
+        if not candidates:
+            break
+        boundary = min(candidates, key=lambda keyframe: abs(keyframe - target))
+        if boundary < duration:
+            boundaries.append(boundary)
+    boundaries.append(duration)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _write_shifted_subtitles(subs, start, end, output_path):
+    """只保留 [start, end) 内的字幕，并把时间轴平移到从 0 开始"""
+    import srt
+
+    range_start = datetime.timedelta(seconds=start)
+    range_end = datetime.timedelta(seconds=end)
+    shifted = []
+    for sub in subs:
+        if sub.end <= range_start or sub.start >= range_end:
+            continue
+        shifted.append(srt.Subtitle(len(shifted) + 1, max(sub.start, range_start) - range_start,
+                                    min(sub.end, range_end) - range_start, sub.content))
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(srt.compose(shifted, reindex=False))
+
+
+def _create_video_with_hardcoded_subtitles_parallel(videoFileNameAndPath, voiceFileNameAndPath,
+                                                    insturmentFileNameAndPath, srtFileNameAndPath,
+                                                    outputFileNameAndPath, max_chars_per_line=30, encode_segments=4):
+    """
+    分段并行烧录字幕
+
+    在关键帧处把视频切成 encode_segments 段，每段用平移过时间轴的字幕文件单独编码，各段并行执行；
+    然后不重新编码直接拼接，最后只混合一次音频并封装进去。
+    """
+    import srt
+
+    try:
+        duration, keyframes = _probe_keyframes(videoFileNameAndPath)
+    except Exception as e:
+        print(f"读取关键帧失败: {e}")
+        return False
+    ranges = _split_at_keyframes(duration, keyframes, encode_segments)
+    if len(ranges) < 2:
+        print("视频关键帧不足，无法分段编码")
+        return False
+
+    processed_srt_path = _process_subtitle_wrapping(srtFileNameAndPath, max_chars_per_line)
+    with open(processed_srt_path, 'r', encoding='utf-8') as f:
+        subs = list(srt.parse(f.read()))
+
+    work_dir = tempfile.mkdtemp(prefix='preview_parts_', dir=os.path.dirname(os.path.abspath(outputFileNameAndPath)))
+    try:
+        commands = []
+        part_paths = []
+        for index, (start, end) in enumerate(ranges):
+            part_srt_path = os.path.join(work_dir, f'part_{index}.srt')
+            part_path = os.path.join(work_dir, f'part_{index}.mp4')
+            _write_shifted_subtitles(subs, start, end, part_srt_path)
+            subtitle_path_for_ffmpeg = part_srt_path.replace('\\', '/').replace(':', '\\:')
+            commands.append([
+                'ffmpeg', '-y', '-ss', f'{start:.6f}', '-i', videoFileNameAndPath, '-t', f'{end - start:.6f}',
+                '-map', '0:v:0', '-an',
+                '-vf', f"subtitles={subtitle_path_for_ffmpeg}:force_style='{SUBTITLE_FORCE_STYLE}'",
+                '-c:v', 'libx264', '-preset', 'medium', '-crf', '23', part_path
+            ])
+            part_paths.append(part_path)
+
+        print(f"🎬 分 {len(ranges)} 段并行烧录字幕: {[(round(s, 2), round(e, 2)) for s, e in ranges]}")
+        with ThreadPoolExecutor(max_workers=len(commands)) as executor:
+            if not all(executor.map(_run_ffmpeg, commands)):
+                return False
+
+        # 各段都从关键帧开始且编码参数相同，可以直接拼接
+        concat_list_path = os.path.join(work_dir, 'parts.txt')
+        with open(concat_list_path, 'w', encoding='utf-8') as f:
+            for part_path in part_paths:
+                f.write(f"file '{part_path}'\n")
+        video_only_path = os.path.join(work_dir, 'video.mp4')
+        if not _run_ffmpeg(['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', concat_list_path,
+                            '-c', 'copy', video_only_path]):
+            return False
+
+        return _create_video_with_remux(video_only_path, voiceFileNameAndPath, insturmentFileNameAndPath,
+                                        outputFileNameAndPath)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        if processed_srt_path != srtFileNameAndPath:
+            try:
+                os.remove(processed_srt_path)
+            except OSError:
+                pass
+
+
 def _process_subtitle_wrapping(srt_file_path, max_chars_per_line=30):
     """
     处理字幕换行
@@ -0,0 +1,60 @@
+import os
+import datetime
+import tempfile
+import unittest
+
+import srt
+
+from src.service.video_synthesis.video_preview import _split_at_keyframes, _write_shifted_subtitles
+
+
+def seconds(value):
+    return datetime.timedelta(seconds=value)
+
+
+class TestSplitAtKeyframes(unittest.TestCase):
+
+    def test_splits_at_keyframes_nearest_to_even_points(self):
+        self.assertEqual(_split_at_keyframes(20.0, [0.0, 4.0, 8.0, 12.0, 16.0], 4),
+                         [(0.0, 4.0), (4.0, 8.0), (8.0, 16.0), (16.0, 20.0)])
+
+    def test_too_few_keyframes_gives_fewer_segments(self):
+        self.assertEqual(_split_at_keyframes(20.0, [0.0, 5.0], 4), [(0.0, 5.0), (5.0, 20.0)])
+        self.assertEqual(_split_at_keyframes(20.0, [0.0], 4), [(0.0, 20.0)])
+        self.assertEqual(_split_at_keyframes(20.0, [], 4), [(0.0, 20.0)])
+
+    def test_keyframe_past_duration_is_not_a_boundary(self):
+        self.assertEqual(_split_at_keyframes(20.0, [0.0, 21.0], 2), [(0.0, 20.0)])
+        self.assertEqual(_split_at_keyframes(20.0, [0.0, 10.0, 20.0, 25.0], 3), [(0.0, 10.0), (10.0, 20.0)])
+
+
+class TestWriteShiftedSubtitles(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_path = os.path.join(self.temp_dir.name, "segment.srt")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_keeps_cues_in_range_and_shifts_them_to_zero(self):
+        subs = [
+            srt.Subtitle(1, seconds(1), seconds(4), "before"),
+            srt.Subtitle(2, seconds(8), seconds(12), "straddles start"),
+            srt.Subtitle(3, seconds(13), seconds(15), "inside"),
+            srt.Subtitle(4, seconds(18), seconds(22), "straddles end"),
+            srt.Subtitle(5, seconds(20), seconds(21), "after"),
+        ]
+        _write_shifted_subtitles(subs, 10.0, 20.0, self.output_path)
+
+        with open(self.output_path, encoding="utf-8") as f:
+            shifted = list(srt.parse(f.read()))
+        self.assertEqual([(sub.index, sub.start, sub.end, sub.content) for sub in shifted], [
+            (1, seconds(0), seconds(2), "straddles start"),
+            (2, seconds(3), seconds(5), "inside"),
+            (3, seconds(8), seconds(10), "straddles end"),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
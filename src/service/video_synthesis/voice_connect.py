@@ -1,15 +1,92 @@
 import os
 import srt
+import time
 import datetime
+import collections
+from concurrent.futures import ProcessPoolExecutor
 from pydub import AudioSegment
 from src.utils.log_util import WarningFile
+from src.service.video_synthesis.voice_timeline import VoiceTimeline, read_wav_format
+from src.service.video_synthesis.time_stretch import speed_up_audio
 
+MAX_SPEED_UP = 1.2  # 最大音频加速
+MIN_GAP_DURATION = 0.1  # 最小间隔时间，单位秒。低于这个间隔时间就认为音频重叠了
 
-def connect_voice(logger, sourceDir, outputAndPath, warningFilePath):
-    MAX_SPEED_UP = 1.2  # 最大音频加速
-    MIN_SPEED_UP = 1.05  # 最小音频加速
-    MIN_GAP_DURATION = 0.1  # 最小间隔时间，单位秒。低于这个间隔时间就认为音频重叠了
+# 默认的预处理进程数上限。每个 /voice_connect 请求和每个流水线任务各自启动一个进程池，
+# 并发时总进程数是并发数乘以该值，所以默认不占满全部 CPU 核
+DEFAULT_VOICE_CONNECT_WORKERS = min(4, os.cpu_count() or 1)
+# 预处理进程数，0 表示使用 DEFAULT_VOICE_CONNECT_WORKERS
+VOICE_CONNECT_WORKERS = int(os.environ.get("VOICE_CONNECT_WORKERS", "0"))
 
+
+def prepare_voice_segment(index, audioFileAndPath, audioPosition, audioNextPosition):
+    """
+    读取一句配音，去除头尾静音，如果与下一句重叠则加速。各句之间互不依赖，可以在子进程中并行执行。
+
+    Returns:
+        (index, audio, warnings, timings)，timings 为各阶段耗时（秒）
+    """
+    timings = {}
+    warnings = []
+
+    startTime = time.perf_counter()
+    audio = AudioSegment.from_wav(audioFileAndPath)
+    timings["load"] = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    audio = audio.strip_silence(silence_thresh=-40, silence_len=100)  # 去除头尾的静音
+    timings["strip_silence"] = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    if audioNextPosition is not None:
+        # 检查上这一句的结尾到下一句的开头之间是否有静音，如果没有则需要缩小音频
+        audio_end_position = audioPosition + audio.duration_seconds * 1000 + MIN_GAP_DURATION * 1000
+        if audioNextPosition < audio_end_position:
+            position_delta = (audioNextPosition - audioPosition)
+            speedUp = (audio.duration_seconds * 1000 + MIN_GAP_DURATION * 1000) / position_delta
+            seconds = audioPosition / 1000.0
+            timeStr = str(datetime.timedelta(seconds=seconds))
+            if speedUp > MAX_SPEED_UP:
+                # 转换为 HH:MM:SS 格式
+                warnings.append(f"Warning: The audio {index + 1} , at {timeStr} , is too short, speed up is {speedUp}.")
+
+            # WSOLA 加速不改变音高，加速后的时长精确为原来的 1 / speedUp，接近 1.0 的倍数也不会出错
+            audio = speed_up_audio(audio, speedUp)
+    timings["stretch"] = time.perf_counter() - startTime
+
+    return index, audio, warnings, timings
+
+
+def _prepare_voice_segments(segmentArgs, workers):
+    """按顺序逐句产出预处理结果，同时最多有 2 * workers 句在处理或等待合并，内存占用有上限"""
+    if workers <= 1:
+        for args in segmentArgs:
+            yield prepare_voice_segment(*args)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        segmentArgs = iter(segmentArgs)
+        for args in segmentArgs:
+            pending.append(executor.submit(prepare_voice_segment, *args))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            result = pending.popleft().result()
+            nextArgs = next(segmentArgs, None)
+            if nextArgs is not None:
+                pending.append(executor.submit(prepare_voice_segment, *nextArgs))
+            yield result
+
+
+def connect_voice(logger, sourceDir, outputAndPath, warningFilePath, workers=None):
+    """
+    把各句配音按 voiceMap.srt 的时间拼接成一条音轨
+
+    Args:
+        workers: 本次拼接的预处理进程数，默认取 VOICE_CONNECT_WORKERS，为 0 时使用 DEFAULT_VOICE_CONNECT_WORKERS，
+            为 1 时不使用子进程
+    """
     if not os.path.exists(sourceDir):
         return False
 
@@ -18,6 +95,11 @@ def connect_voice(logger, sourceDir, outputAndPath, warningFilePath):
     if not os.path.exists(srtMapFileAndPath):
         return False
 
+    if workers is None:
+        workers = VOICE_CONNECT_WORKERS
+    if workers <= 0:
+        workers = DEFAULT_VOICE_CONNECT_WORKERS
+
     voiceMapSrtContent = ""
     with open(srtMapFileAndPath, "r", encoding="utf-8") as f:
         voiceMapSrtContent = f.read()
@@ -31,37 +113,33 @@ def connect_voice(logger, sourceDir, outputAndPath, warningFilePath):
     duration = max(duration, finalAudioEnd)
 
     diagnosisLog = WarningFile(warningFilePath)
-    # 初始化一个空的音频段
-    combined = AudioSegment.silent(duration=duration)
+    # 初始化一个空的时间轴，各句音频直接叠加到其中，不再每句复制整条音频
+    segmentFormats = [read_wav_format(os.path.join(sourceDir, sub.content)) for sub in voiceMapSrt]
+    combined = VoiceTimeline(duration, segmentFormats)
+
+    segmentArgs = []
     for i in range(len(voiceMapSrt)):
-        audioFileAndPath = os.path.join(sourceDir, voiceMapSrt[i].content)
-        audio = AudioSegment.from_wav(audioFileAndPath)
-        audio = audio.strip_silence(silence_thresh=-40, silence_len=100)  # 去除头尾的静音
-        audio_position = voiceMapSrt[i].start.total_seconds() * 1000
-
-        if i != len(voiceMapSrt) - 1:
-            # 检查上这一句的结尾到下一句的开头之间是否有静音，如果没有则需要缩小音频
-            audio_end_position = audio_position + audio.duration_seconds * 1000 + MIN_GAP_DURATION * 1000
-            audio_next_position = voiceMapSrt[i + 1].start.total_seconds() * 1000
-            if audio_next_position < audio_end_position:
-                position_delta = (audio_next_position - audio_position)
-                speedUp = (audio.duration_seconds * 1000 + MIN_GAP_DURATION * 1000) / position_delta
-                seconds = audio_position / 1000.0
-                timeStr = str(datetime.timedelta(seconds=seconds))
-                if speedUp > MAX_SPEED_UP:
-                    # 转换为 HH:MM:SS 格式
-                    logStr = f"Warning: The audio {i + 1} , at {timeStr} , is too short, speed up is {speedUp}."
-                    diagnosisLog.write(logStr)
-
-                # 音频如果提速一个略大于1，则speedup函数可能会出现一个错误的音频，所以这里确定最小的speedup为1.01
-                if speedUp < MIN_SPEED_UP:
-                    logStr = (f"Warning: The audio {i + 1} , at {timeStr} , speed up {speedUp} is too near to 1.0."
-                              f" Set to {MIN_SPEED_UP} forcibly.")
-                    diagnosisLog.write(logStr)
-                    speedUp = MIN_SPEED_UP
-                audio = audio.speedup(playback_speed=speedUp)
-
-        combined = combined.overlay(audio, position=audio_position)
-
-    combined.export(outputAndPath, format="wav")
-    return True
\ No newline at end of file
+        audioNextPosition = voiceMapSrt[i + 1].start.total_seconds() * 1000 if i != len(voiceMapSrt) - 1 else None
+        segmentArgs.append((i, os.path.join(sourceDir, voiceMapSrt[i].content),
+                            voiceMapSrt[i].start.total_seconds() * 1000, audioNextPosition))
+
+    phaseTimings = collections.Counter()
+    startTime = time.perf_counter()
+    for i, audio, warnings, timings in _prepare_voice_segments(segmentArgs, workers):
+        for logStr in warnings:
+            diagnosisLog.write(logStr)
+        phaseTimings.update(timings)
+        mixStartTime = time.perf_counter()
+        combined.add(audio, segmentArgs[i][2])
+        phaseTimings["mix"] += time.perf_counter() - mixStartTime
+    prepareWallTime = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    combined.export(outputAndPath)
+    phaseTimings["export"] = time.perf_counter() - startTime
+
+    if logger is not None:
+        phaseSummary = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in phaseTimings.items())
+        logger.info(f"Voice connect {len(voiceMapSrt)} segments with {workers} workers in {prepareWallTime:.2f}s, "
+                    f"total time per phase: {phaseSummary}")
+    return True
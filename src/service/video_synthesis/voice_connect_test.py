@@ -0,0 +1,87 @@
+import os
+import time
+import hashlib
+import datetime
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import srt
+from pydub.generators import Sine
+
+from src.service.video_synthesis import voice_connect
+from src.service.video_synthesis.voice_connect import connect_voice, _prepare_voice_segments
+
+
+def file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class TestConnectVoice(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source_dir = os.path.join(self.temp_dir.name, "source")
+        os.makedirs(self.source_dir)
+        # (开始时间, 配音时长) 毫秒，部分句子与下一句重叠需要加速，其中几句加速超过 MAX_SPEED_UP 会写警告
+        segments = [(0, 900), (1000, 1500), (2000, 700), (2600, 1200), (3400, 400), (4000, 2000), (5000, 600),
+                    (6000, 800), (6900, 1000), (8000, 500)]
+        subs = []
+        for index, (start, duration) in enumerate(segments):
+            name = f"{index + 1}.wav"
+            audio = Sine(220 * (index % 4 + 1), sample_rate=24000).to_audio_segment(duration=duration, volume=-6.0)
+            audio.export(os.path.join(self.source_dir, name), format="wav")
+            subs.append(srt.Subtitle(index + 1, datetime.timedelta(milliseconds=start),
+                                     datetime.timedelta(milliseconds=start + duration), name))
+        with open(os.path.join(self.source_dir, "voiceMap.srt"), "w", encoding="utf-8") as f:
+            f.write(srt.compose(subs))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def connect(self, workers):
+        output_path = os.path.join(self.temp_dir.name, f"voice_{workers}.wav")
+        warning_path = os.path.join(self.temp_dir.name, f"warning_{workers}.log")
+        self.assertTrue(connect_voice(None, self.source_dir, output_path, warning_path, workers=workers))
+        return file_sha256(output_path), file_sha256(warning_path), os.path.getsize(warning_path)
+
+    def test_parallel_output_matches_single_process(self):
+        single = self.connect(1)
+        parallel = self.connect(4)
+        self.assertGreater(single[2], 0)
+        self.assertEqual(parallel, single)
+
+
+class TestPrepareVoiceSegments(unittest.TestCase):
+
+    def test_results_are_in_order_with_bounded_in_flight(self):
+        workers = 2
+        count = 12
+        submitted = []
+
+        class RecordingExecutor(ThreadPoolExecutor):
+            def submit(self, fn, *args):
+                submitted.append(args[0])
+                return super().submit(fn, *args)
+
+        def prepare(index, audioFileAndPath, audioPosition, audioNextPosition):
+            # 靠前的句子处理得更慢，完成顺序与提交顺序相反
+            time.sleep(0.002 * (count - index))
+            return index, None, [], {}
+
+        segment_args = [(index, f"{index}.wav", index * 1000, None) for index in range(count)]
+        yielded = []
+        with patch.object(voice_connect, "ProcessPoolExecutor", RecordingExecutor), \
+                patch.object(voice_connect, "prepare_voice_segment", prepare):
+            for index, _, _, _ in _prepare_voice_segments(segment_args, workers):
+                # 取走一句后才提交下一句，已提交但还没有被取走的句子不超过 2 * workers
+                self.assertEqual(len(submitted), min(count, len(yielded) + 1 + 2 * workers))
+                yielded.append(index)
+        self.assertEqual(yielded, list(range(count)))
+        self.assertEqual(submitted, list(range(count)))
+
+
+if __name__ == '__main__':
+    unittest.main()
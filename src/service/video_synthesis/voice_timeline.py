@@ -0,0 +1,101 @@
+import wave
+import numpy as np
+from pydub import AudioSegment
+
+# pydub 的 AudioSegment.silent 默认格式，connect_voice 原先以它为起点叠加
+SILENT_FRAME_RATE = 11025
+SILENT_SAMPLE_WIDTH = 2
+SILENT_CHANNELS = 1
+
+# 写文件时每次写出的帧数
+WRITE_CHUNK_FRAMES = 1 << 20
+
+
+def read_wav_format(path):
+    """返回 pydub 读取 wav 文件后的 (channels, frame_rate, sample_width)，wave 模块不支持的格式用 pydub 读取"""
+    try:
+        with wave.open(path, "rb") as wav_file:
+            # pydub 读取 24 位音频时会转换为 32 位
+            sample_width = 4 if wav_file.getsampwidth() == 3 else wav_file.getsampwidth()
+            return wav_file.getnchannels(), wav_file.getframerate(), sample_width
+    except (wave.Error, EOFError):
+        audio = AudioSegment.from_wav(path)
+        return audio.channels, audio.frame_rate, audio.sample_width
+
+
+def _ratecv_frame_count(frame_count, in_rate, out_rate):
+    """audioop.ratecv 重采样后的帧数"""
+    if frame_count == 0:
+        return 0
+    return (frame_count - 1) * out_rate // in_rate + 1
+
+
+class VoiceTimeline:
+    """
+    A single sample buffer that dubbed segments are mixed into in place.
+
+    It produces the same WAV as starting from AudioSegment.silent(duration_ms) and calling overlay() once per segment,
+    but each segment only touches its own span of the buffer instead of copying the whole timeline. Like overlay(),
+    the output uses the largest channel count, frame rate and sample width among the silent base and the segments,
+    segments running past the end are truncated, and overlapping samples are added with clipping.
+
+    segment_formats must list the (channels, frame_rate, sample_width) of every segment in overlay order; it decides
+    the output format and reproduces the length overlay() reaches while converting the timeline between rates. When
+    segments come at different frame rates, each is resampled straight to the output rate, so samples can differ
+    slightly from overlay(), which resampled the already mixed timeline again.
+    """
+
+    def __init__(self, duration_ms, segment_formats):
+        self.channels = SILENT_CHANNELS
+        self.frame_rate = SILENT_FRAME_RATE
+        self.sample_width = SILENT_SAMPLE_WIDTH
+        self.frame_count = int(SILENT_FRAME_RATE * (duration_ms / 1000.0))
+        for channels, frame_rate, sample_width in segment_formats:
+            if frame_rate > self.frame_rate:
+                self.frame_count = _ratecv_frame_count(self.frame_count, self.frame_rate, frame_rate)
+                self.frame_rate = frame_rate
+            # overlay() 按毫秒切分再拼接，长度会取整到整毫秒对应的帧数
+            self.frame_count = int(self.duration_ms * self.frame_rate / 1000.0)
+            self.channels = max(self.channels, channels)
+            self.sample_width = max(self.sample_width, sample_width)
+
+        if self.sample_width not in (2, 4):
+            raise ValueError(f"Unsupported sample width: {self.sample_width}")
+        self.dtype = np.int16 if self.sample_width == 2 else np.int32
+        self.max_value = (1 << (8 * self.sample_width - 1)) - 1
+        self.min_value = -self.max_value - 1
+        self.samples = np.zeros(self.frame_count * self.channels, dtype=self.dtype)
+
+    @property
+    def duration_ms(self):
+        # 与 len(AudioSegment) 相同
+        return round(1000 * (self.frame_count / self.frame_rate))
+
+    def _to_samples(self, audio):
+        audio = audio.set_channels(self.channels).set_frame_rate(self.frame_rate).set_sample_width(self.sample_width)
+        return np.frombuffer(audio.raw_data, dtype=np.dtype(self.dtype).newbyteorder("<"))
+
+    def add(self, audio, position_ms):
+        """把 AudioSegment 叠加到 position_ms 处，等同于 overlay(audio, position=position_ms)"""
+        offset = int(min(position_ms, self.duration_ms) * self.frame_rate / 1000.0)
+        start = min(offset, self.frame_count) * self.channels
+        samples = self._to_samples(audio)[:len(self.samples) - start]
+        if len(samples) == 0:
+            return
+        end = start + len(samples)
+        mixed = self.samples[start:end].astype(np.int64)
+        mixed += samples
+        np.clip(mixed, self.min_value, self.max_value, out=mixed)
+        self.samples[start:end] = mixed
+
+    def export(self, path):
+        with wave.open(path, "wb") as wav_file:
+            wav_file.setnchannels(self.channels)
+            wav_file.setsampwidth(self.sample_width)
+            wav_file.setframerate(self.frame_rate)
+            wav_file.setnframes(self.frame_count)
+            little_endian = np.dtype(self.dtype).newbyteorder("<")
+            chunk_size = WRITE_CHUNK_FRAMES * self.channels
+            for start in range(0, len(self.samples), chunk_size):
+                chunk = self.samples[start:start + chunk_size].astype(little_endian, copy=False)
+                wav_file.writeframesraw(chunk.tobytes())
@@ -0,0 +1,44 @@
+import os
+import tempfile
+import unittest
+from pydub import AudioSegment
+from pydub.generators import Sine
+from src.service.video_synthesis.voice_timeline import VoiceTimeline
+
+
+def sine(duration_ms, frame_rate=24000, channels=1, volume=-6.0):
+    audio = Sine(440, sample_rate=frame_rate).to_audio_segment(duration=duration_ms, volume=volume)
+    return audio.set_channels(channels)
+
+
+class TestVoiceTimeline(unittest.TestCase):
+
+    def assert_matches_overlay(self, duration_ms, segments):
+        combined = AudioSegment.silent(duration=duration_ms)
+        for audio, position in segments:
+            combined = combined.overlay(audio, position=position)
+
+        timeline = VoiceTimeline(duration_ms, [(a.channels, a.frame_rate, a.sample_width) for a, _ in segments])
+        for audio, position in segments:
+            timeline.add(audio, position)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            expected_path = os.path.join(temp_dir, "expected.wav")
+            actual_path = os.path.join(temp_dir, "actual.wav")
+            combined.export(expected_path, format="wav")
+            timeline.export(actual_path)
+            with open(expected_path, "rb") as expected, open(actual_path, "rb") as actual:
+                self.assertEqual(expected.read(), actual.read())
+
+    def test_matches_overlay(self):
+        self.assert_matches_overlay(5003.7, [(sine(1200), 0), (sine(800), 1000.5), (sine(1500), 4200)])
+
+    def test_overlapping_segments_are_clipped(self):
+        self.assert_matches_overlay(3000, [(sine(2000, volume=0), 100), (sine(2000, volume=0), 600)])
+
+    def test_stereo_segment_upgrades_timeline(self):
+        self.assert_matches_overlay(4000, [(sine(1000), 500), (sine(1000, channels=2), 2000)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,10 @@
 import time
 
 from src.service.video_synthesis.video_preview import zhVideoPreview
+from src.service.pipeline import PipelineJobStore, run_stage
+from src.service.pipeline.job_store import STAGE_RUNNING, STAGE_FAILED
+from src.service.pipeline.stages import can_skip_stage
+from src.service.pipeline.streaming import run_streaming_stages
 from src.task_manager.celery_tasks import celery_app
 
 from prometheus_client import Counter, Histogram
@@ -15,19 +19,29 @@ VIDEO_PREVIEW_TASK_SOFT_TIMEOUT = Counter(
     'video_preview_task_soft_timeout_total', 'Total number of times video preview task failed due to soft timeout')
 VIDEO_PREVIEW_TASK_DURATION = Histogram(
     'video_preview_task_duration_seconds', 'Duration of video preview task in seconds')
+PIPELINE_STAGE_INVOKED = Counter(
+    'pipeline_stage_invoked_total', 'Total number of pipeline stages invoked', ['stage', 'state'])
+PIPELINE_STAGE_DURATION = Histogram(
+    'pipeline_stage_duration_seconds', 'Duration of pipeline stages in seconds', ['stage'])
+PIPELINE_STREAMING_TIME_TO_FIRST_AUDIO = Histogram(
+    'pipeline_streaming_time_to_first_audio_seconds', 'Time from transcription start to the first dubbed sentence')
+PIPELINE_STREAMING_DURATION = Histogram(
+    'pipeline_streaming_duration_seconds', 'Duration of streamed transcribe, translate and TTS stages in seconds')
 
 
 @celery_app.task(bind=True)
-def video_preview_task(self, video_path, voice_path, audio_bg_path, video_out_path, srt_path=None, hardcode_subtitles=False, max_chars_per_line=30):
+def video_preview_task(self, video_path, voice_path, audio_bg_path, video_out_path, srt_path=None, hardcode_subtitles=False, max_chars_per_line=30,
+                       encode_segments=1):
     print(f"Invoke video preview task {self.request.id}.")
     print(f"Hardcode subtitles: {hardcode_subtitles}")
     print(f"Max chars per line: {max_chars_per_line}")
+    print(f"Encode segments: {encode_segments}")
     VIDEO_PREVIEW_TASK_INVOKED.inc()
     start_time = time.time()
 
     try:
         _ = zhVideoPreview(None, video_path, voice_path, audio_bg_path,
-                           srt_path, video_out_path, hardcode_subtitles, max_chars_per_line)
+                           srt_path, video_out_path, hardcode_subtitles, max_chars_per_line, encode_segments)
     except SoftTimeLimitExceeded as soft_exception:
         VIDEO_PREVIEW_TASK_SOFT_TIMEOUT.inc()
         print(f"Invoke video preview task {self.request.id} failed with soft timeout: {soft_exception}")
@@ -38,3 +52,64 @@ def video_preview_task(self, video_path, voice_path, audio_bg_path, video_out_pa
         duration = time.time() - start_time
         VIDEO_PREVIEW_TASK_DURATION.observe(duration)
         print(f"Invoke video preview task {self.request.id} took {duration:.2f} seconds.")
+
+
+def _run_pipeline_stage(job_store, job_id, stage, context):
+    job_store.update_stage(job_id, stage, STAGE_RUNNING)
+    start_time = time.time()
+    # SystemExit、KeyboardInterrupt 等不经过下面的 except，任务文件中也要记录为失败
+    state, message = STAGE_FAILED, "interrupted"
+
+    try:
+        state, message = run_stage(stage, context)
+    except SoftTimeLimitExceeded as soft_exception:
+        state, message = STAGE_FAILED, f"Soft timeout: {soft_exception}"
+        raise
+    except Exception as exception:
+        state, message = STAGE_FAILED, f"{type(exception).__name__}: {exception}"
+        raise
+    finally:
+        duration = time.time() - start_time
+        PIPELINE_STAGE_INVOKED.labels(stage=stage, state=state).inc()
+        PIPELINE_STAGE_DURATION.labels(stage=stage).observe(duration)
+        job_store.update_stage(job_id, stage, state, message)
+        print(f"Pipeline {job_id} stage {stage} {state} in {duration:.2f} seconds: {message}")
+    return state
+
+
+@celery_app.task(bind=True)
+def pipeline_stage_task(self, job_id, stage, context):
+    """
+    执行流水线的一个阶段并把状态写回任务文件
+
+    各阶段以不可变签名串成一条 chain，阶段失败时抛出异常，chain 中后续阶段不再执行。
+    """
+    print(f"Invoke pipeline {job_id} stage {stage} in task {self.request.id}.")
+    return _run_pipeline_stage(PipelineJobStore(context["jobs_dir"]), job_id, stage, context)
+
+
+@celery_app.task(bind=True)
+def pipeline_streaming_task(self, job_id, stages, context):
+    """
+    重叠执行转写、翻译和配音三个阶段，句子转写出来就开始翻译和合成
+
+    其中有阶段的输出已是最新或可以从产物仓库取用时，流式执行会把它重做一遍，这种情况下退回逐个阶段执行。
+    """
+    print(f"Invoke pipeline {job_id} streaming stages {stages} in task {self.request.id}.")
+    job_store = PipelineJobStore(context["jobs_dir"])
+    if any(can_skip_stage(stage, context) for stage in stages):
+        return [_run_pipeline_stage(job_store, job_id, stage, context) for stage in stages]
+
+    def on_stage_state(stage, state, message):
+        job_store.update_stage(job_id, stage, state, message)
+        if state != STAGE_RUNNING:
+            PIPELINE_STAGE_INVOKED.labels(stage=stage, state=state).inc()
+
+    # 阶段失败时 run_streaming_stages 已写回各阶段状态，异常继续抛出以中止 chain
+    stats = run_streaming_stages(context, on_stage_state)
+    PIPELINE_STREAMING_DURATION.observe(stats["duration"])
+    if stats["time_to_first_audio"] is not None:
+        PIPELINE_STREAMING_TIME_TO_FIRST_AUDIO.observe(stats["time_to_first_audio"])
+    print(f"Pipeline {job_id} streamed {stats['sentences']} sentences in {stats['duration']:.2f} seconds, "
+          f"first dubbed sentence after {stats['time_to_first_audio']} seconds.")
+    return stats
@@ -0,0 +1,24 @@
+import os
+import hashlib
+import threading
+
+
+_file_digests = {}
+_file_digests_lock = threading.Lock()
+
+
+def file_digest(path):
+    """文件内容的 sha256，按 (路径, 大小, 修改时间) 记忆，同一文件不重复读取"""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _file_digests_lock:
+        if memo_key in _file_digests:
+            return _file_digests[memo_key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    with _file_digests_lock:
+        _file_digests[memo_key] = digest.hexdigest()
+    return _file_digests[memo_key]
@@ -1,5 +1,6 @@
+import time
 import requests
-from typing import Tuple, List
+from typing import Tuple, List, Optional, Iterator
 
 
 class WorkloadClientError(Exception):
@@ -16,24 +17,129 @@ class WorkloadResponseError(WorkloadClientError):
         super().__init__(f"Workload Error {status_code}: {message}")
 
 
+class WorkloadTimeoutError(WorkloadClientError):
+    """Raised when a submitted workload job does not finish in time."""
+
+    def __init__(self, job_id, timeout):
+        self.job_id = job_id
+        self.timeout = timeout
+        super().__init__(f"Workload job {job_id} did not finish within {timeout} seconds")
+
+
 class EasyVideoTransWorkloadClient:
+    """
+    Client of the GPU workloads backend (inference.py).
+
+    Work is submitted as asynchronous jobs: submit_* returns a job id at once, get_job reports its state and
+    wait_for_job polls with exponential backoff until the result is ready, so long videos are no longer
+    bound by a single HTTP request timeout.
+    """
 
     def __init__(
             self,
             audio_separation_endpoint="localhost:8199/audio_sep",
-            audio_transcribe_endpoint="localhost:8199/audio-transcribe"
+            audio_transcribe_endpoint="localhost:8199/audio-transcribe",
+            jobs_endpoint=None,
+            job_timeout=None,
+            request_timeout=30
     ):
         self.audio_separation_endpoint = audio_separation_endpoint
         self.audio_transcribe_endpoint = audio_transcribe_endpoint
+        # Job routes live next to the synchronous ones, e.g. http://host:8199/jobs
+        self.jobs_endpoint = (jobs_endpoint or audio_separation_endpoint.rsplit('/', 1)[0] + "/jobs").rstrip('/')
+        # Seconds to wait for a job in separate_audio / transcribe_audio, None waits as long as it takes
+        self.job_timeout = job_timeout
+        self.request_timeout = request_timeout
 
-    def separate_audio(self, audio_filename: str) -> Tuple[str, str]:
-        payload = {"file_name": audio_filename}
+    def _submit(self, job_type: str, payload: dict) -> str:
+        response = requests.post(f"{self.jobs_endpoint}/{job_type}", json=payload, timeout=self.request_timeout)
+        if response.status_code != 202:
+            raise WorkloadResponseError(response.status_code, response.text)
+
+        return response.json()["job_id"]
 
-        response = requests.post(self.audio_separation_endpoint, json=payload, timeout=180)
+    def submit_audio_separation(self, audio_filename: str) -> str:
+        return self._submit("audio-sep", {"file_name": audio_filename})
+
+    def submit_audio_transcribe(self, audio_filename: str, output_filenames: List[str], streaming: bool = False) -> str:
+        payload = {"file_name": audio_filename, "output_filenames": output_filenames}
+        if streaming:
+            payload["streaming"] = True
+        return self._submit("audio-transcribe", payload)
+
+    def get_job(self, job_id: str) -> dict:
+        response = requests.get(f"{self.jobs_endpoint}/{job_id}", timeout=self.request_timeout)
         if response.status_code != 200:
             raise WorkloadResponseError(response.status_code, response.text)
 
-        response_data = response.json()
+        return response.json()
+
+    def get_job_result(self, job_id: str) -> Optional[dict]:
+        """Returns the job result, or None while the job is still queued or running."""
+        response = requests.get(f"{self.jobs_endpoint}/{job_id}/result", timeout=self.request_timeout)
+        if response.status_code == 202:
+            return None
+        if response.status_code != 200:
+            raise WorkloadResponseError(response.status_code, response.text)
+
+        return response.json()
+
+    def get_job_partial(self, job_id: str, start: int = 0) -> dict:
+        """Returns the items a streaming job has produced from index start on, see inference.job_partial."""
+        response = requests.get(f"{self.jobs_endpoint}/{job_id}/partial", params={"start": start},
+                                timeout=self.request_timeout)
+        if response.status_code != 200:
+            raise WorkloadResponseError(response.status_code, response.text)
+
+        return response.json()
+
+    def iter_job_partial(self, job_id: str, timeout: Optional[float] = None, poll_interval: float = 0.5,
+                         max_poll_interval: float = 5.0, backoff: float = 1.5) -> Iterator[dict]:
+        """Yields the items of a streaming job as they are produced, returns once the job has succeeded."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        start = 0
+        current_interval = poll_interval
+
+        while True:
+            try:
+                partial = self.get_job_partial(job_id, start)
+                start = partial["next"]
+                yield from partial["items"]
+                if partial["state"] == "succeeded":
+                    return
+                if partial["items"]:
+                    current_interval = poll_interval
+                    continue
+            except requests.ConnectionError as e:
+                # The backend may be restarting, keep polling until the deadline
+                print(f"Polling workload job {job_id} failed, retrying: {e}")
+
+            if deadline is not None and time.monotonic() + current_interval > deadline:
+                raise WorkloadTimeoutError(job_id, timeout)
+            time.sleep(current_interval)
+            current_interval = min(current_interval * backoff, max_poll_interval)
+
+    def wait_for_job(self, job_id: str, timeout: Optional[float] = None, poll_interval: float = 1.0,
+                     max_poll_interval: float = 15.0, backoff: float = 1.5) -> dict:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        while True:
+            try:
+                result = self.get_job_result(job_id)
+                if result is not None:
+                    return result
+            except requests.ConnectionError as e:
+                # The backend may be restarting, keep polling until the deadline
+                print(f"Polling workload job {job_id} failed, retrying: {e}")
+
+            if deadline is not None and time.monotonic() + poll_interval > deadline:
+                raise WorkloadTimeoutError(job_id, timeout)
+            time.sleep(poll_interval)
+            poll_interval = min(poll_interval * backoff, max_poll_interval)
+
+    def separate_audio(self, audio_filename: str) -> Tuple[str, str]:
+        job_id = self.submit_audio_separation(audio_filename)
+        response_data = self.wait_for_job(job_id, timeout=self.job_timeout)
 
         separated_files = response_data.get("files", [])
         if len(separated_files) != 2:
@@ -43,9 +149,13 @@ class EasyVideoTransWorkloadClient:
         return bg_filename, voice_filename
 
     def transcribe_audio(self, audio_filename: str, output_filenames: List[str]) -> None:
-        payload = {"file_name": audio_filename,
-                   "output_filenames": output_filenames}
+        job_id = self.submit_audio_transcribe(audio_filename, output_filenames)
+        self.wait_for_job(job_id, timeout=self.job_timeout)
 
-        response = requests.post(self.audio_transcribe_endpoint, json=payload, timeout=180)
-        if response.status_code != 200:
-            raise WorkloadResponseError(response.status_code, response.text)
+    def iter_transcribed_sentences(self, audio_filename: str, output_filenames: List[str]) -> Iterator[dict]:
+        """
+        Transcribes like transcribe_audio, but yields each merged sentence ({"start", "end", "content"} with SRT
+        timestamps) as soon as the backend has produced it. Both SRT files exist once the iteration ends.
+        """
+        job_id = self.submit_audio_transcribe(audio_filename, output_filenames, streaming=True)
+        yield from self.iter_job_partial(job_id, timeout=self.job_timeout)
@@ -1,6 +1,15 @@
 import unittest
+import requests
 from unittest.mock import patch, MagicMock
-from src.workload_client import EasyVideoTransWorkloadClient, WorkloadResponseError  # Import your class
+from src.workload_client import EasyVideoTransWorkloadClient, WorkloadResponseError, WorkloadTimeoutError  # Import your class
+
+
+def mock_response(status_code, json_data=None, text=""):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = json_data
+    response.text = text
+    return response
 
 
 class TestEasyVideoTransWorkloadClient(unittest.TestCase):
@@ -12,31 +21,35 @@ class TestEasyVideoTransWorkloadClient(unittest.TestCase):
             audio_transcribe_endpoint="http://localhost:8199/audio-transcribe"
         )
 
+    def test_jobs_endpoint_derived_from_audio_separation_endpoint(self):
+        """Test that job routes default to the backend of the separation endpoint."""
+        self.assertEqual(self.client.jobs_endpoint, "http://localhost:8199/jobs")
+
+    @patch("time.sleep")
+    @patch("requests.get")
     @patch("requests.post")
-    def test_separate_audio_success(self, mock_post):
+    def test_separate_audio_success(self, mock_post, mock_get, mock_sleep):
         """Test successful audio separation."""
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {"files": ["bg.wav", "voice.wav"]}
-        mock_post.return_value = mock_response
+        mock_post.return_value = mock_response(202, {"job_id": "job-1"})
+        mock_get.side_effect = [mock_response(202, {"state": "running"}),
+                                mock_response(200, {"files": ["bg.wav", "voice.wav"]})]
 
         bg_file, voice_file = self.client.separate_audio("test_audio.wav")
 
         self.assertEqual(bg_file, "bg.wav")
         self.assertEqual(voice_file, "voice.wav")
         mock_post.assert_called_once_with(
-            "http://localhost:8199/audio-sep",
+            "http://localhost:8199/jobs/audio-sep",
             json={"file_name": "test_audio.wav"},
-            timeout=180
+            timeout=30
         )
+        mock_get.assert_called_with("http://localhost:8199/jobs/job-1/result", timeout=30)
+        mock_sleep.assert_called_once_with(1.0)
 
     @patch("requests.post")
     def test_separate_audio_error_response(self, mock_post):
-        """Test error handling when API returns a non-200 response."""
-        mock_response = MagicMock()
-        mock_response.status_code = 500
-        mock_response.text = "Internal Server Error"
-        mock_post.return_value = mock_response
+        """Test error handling when API returns a non-202 response."""
+        mock_post.return_value = mock_response(500, text="Internal Server Error")
 
         with self.assertRaises(WorkloadResponseError) as context:
             self.client.separate_audio("test_audio.wav")
@@ -44,13 +57,12 @@ class TestEasyVideoTransWorkloadClient(unittest.TestCase):
         self.assertEqual(context.exception.status_code, 500)
         self.assertEqual(context.exception.message, "Internal Server Error")
 
+    @patch("requests.get")
     @patch("requests.post")
-    def test_separate_audio_invalid_response_format(self, mock_post):
+    def test_separate_audio_invalid_response_format(self, mock_post, mock_get):
         """Test handling when the API returns an unexpected response format."""
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {"files": ["bg.wav"]}  # Only one file instead of two
-        mock_post.return_value = mock_response
+        mock_post.return_value = mock_response(202, {"job_id": "job-1"})
+        mock_get.return_value = mock_response(200, {"files": ["bg.wav"]})  # Only one file instead of two
 
         with self.assertRaises(WorkloadResponseError) as context:
             self.client.separate_audio("test_audio.wav")
@@ -58,28 +70,43 @@ class TestEasyVideoTransWorkloadClient(unittest.TestCase):
         self.assertEqual(context.exception.status_code, 500)
         self.assertEqual(context.exception.message, "Invalid response format. Expected two separated files.")
 
+    @patch("requests.get")
     @patch("requests.post")
-    def test_transcribe_audio_success(self, mock_post):
+    def test_transcribe_audio_success(self, mock_post, mock_get):
         """Test successful audio transcription."""
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_post.return_value = mock_response
+        mock_post.return_value = mock_response(202, {"job_id": "job-2"})
+        mock_get.return_value = mock_response(200, {"message": "Transcribe successful."})
 
         self.client.transcribe_audio("test_audio.wav", ["transcript.txt", "summary.txt"])
 
         mock_post.assert_called_once_with(
-            "http://localhost:8199/audio-transcribe",
+            "http://localhost:8199/jobs/audio-transcribe",
             json={"file_name": "test_audio.wav", "output_filenames": ["transcript.txt", "summary.txt"]},
-            timeout=180
+            timeout=30
         )
 
+    @patch("time.sleep")
+    @patch("requests.get")
+    @patch("requests.post")
+    def test_iter_transcribed_sentences(self, mock_post, mock_get, mock_sleep):
+        """Test that sentences of a streaming transcription are yielded as the backend produces them."""
+        mock_post.return_value = mock_response(202, {"job_id": "job-5"})
+        first, second = {"content": "Hello."}, {"content": "World."}
+        mock_get.side_effect = [mock_response(200, {"state": "running", "items": [], "next": 0}),
+                                mock_response(200, {"state": "running", "items": [first], "next": 1}),
+                                mock_response(200, {"state": "succeeded", "items": [second], "next": 2})]
+
+        sentences = list(self.client.iter_transcribed_sentences("test_audio.wav", ["en.srt", "en_merged.srt"]))
+
+        self.assertEqual(sentences, [first, second])
+        self.assertEqual(mock_post.call_args.kwargs["json"]["streaming"], True)
+        self.assertEqual([c.kwargs["params"]["start"] for c in mock_get.call_args_list], [0, 0, 1])
+        mock_sleep.assert_called_once()
+
     @patch("requests.post")
     def test_transcribe_audio_error_response(self, mock_post):
         """Test error handling when transcription API returns an error."""
-        mock_response = MagicMock()
-        mock_response.status_code = 400
-        mock_response.text = "Bad Request"
-        mock_post.return_value = mock_response
+        mock_post.return_value = mock_response(400, text="Bad Request")
 
         with self.assertRaises(WorkloadResponseError) as context:
             self.client.transcribe_audio("test_audio.wav", ["transcript.txt"])
@@ -87,6 +114,35 @@ class TestEasyVideoTransWorkloadClient(unittest.TestCase):
         self.assertEqual(context.exception.status_code, 400)
         self.assertEqual(context.exception.message, "Bad Request")
 
+    @patch("requests.get")
+    def test_wait_for_job_failed(self, mock_get):
+        """Test that a failed job surfaces the backend error."""
+        mock_get.return_value = mock_response(500, text="Job job-3 failed: out of memory")
+
+        with self.assertRaises(WorkloadResponseError) as context:
+            self.client.wait_for_job("job-3")
+
+        self.assertEqual(context.exception.status_code, 500)
+
+    @patch("time.sleep")
+    @patch("time.monotonic")
+    @patch("requests.get")
+    def test_wait_for_job_backoff_and_timeout(self, mock_get, mock_monotonic, mock_sleep):
+        """Test that polling backs off exponentially, survives connection errors and gives up at the deadline."""
+        clock = [0.0]
+        mock_monotonic.side_effect = lambda: clock[0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        mock_sleep.side_effect = sleep
+        mock_get.side_effect = [requests.ConnectionError("connection refused")] + [mock_response(202)] * 10
+
+        with self.assertRaises(WorkloadTimeoutError):
+            self.client.wait_for_job("job-4", timeout=10, poll_interval=1, backoff=2)
+
+        self.assertEqual([c.args[0] for c in mock_sleep.call_args_list], [1, 2, 4])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -37,17 +37,24 @@ sleep 3
 
 # 启动Celery worker（后台运行）
 echo "⚡ 启动Celery worker..."
-celery -A src.task_manager.celery_tasks.celery_app worker --concurrency 1 -Q video_preview &
+celery -A src.task_manager.celery_tasks.celery_app worker --concurrency 1 -Q video_preview,pipeline &
 CELERY_PID=$!
 echo "Celery worker PID: $CELERY_PID"
 
 # 等待一下让Celery启动
 sleep 3
 
+# 启动输出目录清理服务（后台运行）
+echo "🧹 启动输出目录清理服务（指标端口8082）..."
+python output_gc.py &
+GC_PID=$!
+echo "输出目录清理服务PID: $GC_PID"
+
 echo "🌐 启动Flask主应用（端口5000）..."
 echo "📝 进程ID保存信息："
 echo "GPU工作负载服务PID: $INFERENCE_PID"
 echo "Celery worker PID: $CELERY_PID"
+echo "输出目录清理服务PID: $GC_PID"
 echo ""
 echo "💡 在浏览器中访问: http://localhost:5000"
 echo "🛑 按Ctrl+C停止主服务"
@@ -69,6 +76,10 @@ if [ -f ".service_pids" ]; then
             PID=${line#celery_pid:}
             echo "停止Celery worker (PID: $PID)"
             kill $PID 2>/dev/null || echo "进程 $PID 可能已经停止"
+        elif [[ $line == gc_pid:* ]]; then
+            PID=${line#gc_pid:}
+            echo "停止输出目录清理服务 (PID: $PID)"
+            kill $PID 2>/dev/null || echo "进程 $PID 可能已经停止"
         fi
     done < .service_pids
     rm .service_pids
@@ -77,6 +88,7 @@ fi
 # 额外清理：按名称杀死相关进程
 pkill -f "python inference.py" 2>/dev/null
 pkill -f "celery.*worker" 2>/dev/null
+pkill -f "python output_gc.py" 2>/dev/null
 
 echo "✅ 服务停止完成"
 EOF
@@ -86,6 +98,7 @@ chmod +x stop_services.sh
 # 保存PID到文件
 echo "inference_pid:$INFERENCE_PID" > .service_pids
 echo "celery_pid:$CELERY_PID" >> .service_pids
+echo "gc_pid:$GC_PID" >> .service_pids
 
 # 定义清理函数
 cleanup() {
@@ -93,6 +106,7 @@ cleanup() {
     echo "🛑 接收到停止信号，正在清理..."
     kill $INFERENCE_PID 2>/dev/null
     kill $CELERY_PID 2>/dev/null
+    kill $GC_PID 2>/dev/null
     rm -f .service_pids
     echo "✅ 清理完成，服务已停止"
     exit 0
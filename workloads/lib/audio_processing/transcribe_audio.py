@@ -1,17 +1,35 @@
 import math
+import os
 import struct
 import wave
 import datetime
 
+import numpy as np
 import srt
 from faster_whisper import WhisperModel
 
+from workloads.lib.audio_processing.whisper_registry import WhisperModelRegistry
 
-def load_whisper_model(modelName, device="cuda"):
-    return WhisperModel(modelName, device=device, compute_type="float16", download_root="faster-whisper_models",
+# 常驻内存的 Whisper 模型总预算（估算值），超出后按 LRU 淘汰
+WHISPER_MODEL_MEMORY_BUDGET_MB = int(os.environ.get("WHISPER_MODEL_MEMORY_BUDGET_MB", 6144))
+
+
+def _create_whisper_model(modelName, device, compute_type):
+    return WhisperModel(modelName, device=device, compute_type=compute_type, download_root="faster-whisper_models",
                         local_files_only=False)
 
 
+whisper_models = WhisperModelRegistry(_create_whisper_model, WHISPER_MODEL_MEMORY_BUDGET_MB * 1024 * 1024)
+
+
+def load_whisper_model(modelName, device="cuda", compute_type="float16"):
+    return whisper_models.get(modelName, device, compute_type)
+
+
+def preload_whisper_models(modelNames, device="cuda", compute_type="float16"):
+    whisper_models.preload(modelNames, device, compute_type)
+
+
 def save_srt_file(subs, srtFilePathAndName):
     content = srt.compose(subs)
     with open(srtFilePathAndName, "w", encoding="utf-8") as file:
@@ -22,32 +40,126 @@ def calculate_not_silence_threshold(threshold_db):
     return math.pow(10, threshold_db / 20)
 
 
-def adjust_subtitle_timing(subs, path, notSilenceThreshold):
-    audio = wave.open(path, 'rb')
-    frameRate = audio.getframerate()
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# 每次向量化检测的帧数，避免长字幕一次性读入过多数据
+ONSET_SEARCH_BLOCK_FRAMES = 1 << 16
+
+
+def open_wav_memmap(path):
+    """
+    Memory-maps the sample data of a PCM / IEEE float WAV file.
+
+    Returns (samples, frame_rate, sample_width, full_scale, is_float). samples is a (frames, channels) view for 8, 16
+    and 32 bit files and a (frames, channels, 3) byte view for 24 bit files, see _frames_to_float.
+    """
+    with open(path, "rb") as file:
+        riff, _, wave_id = struct.unpack("<4sI4s", file.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise wave.Error(f"{path} is not a RIFF WAVE file")
+
+        fmt = None
+        while True:
+            header = file.read(8)
+            if len(header) < 8:
+                raise wave.Error(f"{path} has no data chunk")
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                chunk = file.read(chunk_size)
+                format_tag, channels, frame_rate, _, _, bits_per_sample = struct.unpack("<HHIIHH", chunk[:16])
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and len(chunk) >= 26:
+                    format_tag = struct.unpack("<H", chunk[24:26])[0]
+                fmt = (format_tag, channels, frame_rate, bits_per_sample)
+            elif chunk_id == b"data":
+                data_offset = file.tell()
+                break
+            else:
+                file.seek(chunk_size, 1)
+            # 块按 2 字节对齐
+            if chunk_size % 2:
+                file.seek(1, 1)
+        file.seek(0, 2)
+        data_size = min(chunk_size, file.tell() - data_offset)
+
+    if fmt is None:
+        raise wave.Error(f"{path} has no fmt chunk")
+    format_tag, channels, frame_rate, bits_per_sample = fmt
+    sample_width = bits_per_sample // 8
+    frames = data_size // (sample_width * channels)
+    if frames == 0:
+        return np.zeros((0, channels), dtype=np.int16), frame_rate, sample_width, 1.0, False
+
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        if sample_width not in (4, 8):
+            raise wave.Error(f"Unsupported float sample width: {bits_per_sample} bits")
+        dtype = np.float32 if sample_width == 4 else np.float64
+        samples = np.memmap(path, dtype=dtype, mode="r", offset=data_offset, shape=(frames, channels))
+        return samples, frame_rate, sample_width, 1.0, True
+    if format_tag != WAVE_FORMAT_PCM:
+        raise wave.Error(f"Unsupported WAV format tag: {format_tag:#x}")
+
+    if sample_width == 3:
+        samples = np.memmap(path, dtype=np.uint8, mode="r", offset=data_offset, shape=(frames, channels, 3))
+    elif sample_width in (1, 2, 4):
+        dtype = {1: np.uint8, 2: "<i2", 4: "<i4"}[sample_width]
+        samples = np.memmap(path, dtype=dtype, mode="r", offset=data_offset, shape=(frames, channels))
+    else:
+        raise wave.Error(f"Unsupported PCM sample width: {bits_per_sample} bits")
+    return samples, frame_rate, sample_width, float(1 << (8 * sample_width - 1)), False
+
+
+def _frames_to_float(block, sample_width, full_scale, is_float):
+    if is_float:
+        return block.astype(np.float64)
+    if sample_width == 1:
+        # 8 bit PCM 为无符号数
+        return (block.astype(np.int32) - 128) / full_scale
+    if sample_width == 3:
+        values = block[..., 0].astype(np.int32) | (block[..., 1].astype(np.int32) << 8) | (block[..., 2].astype(np.int32) << 16)
+        values = np.where(values >= 1 << 23, values - (1 << 24), values)
+        return values / full_scale
+    return block.astype(np.int64) / full_scale
+
+
+def frame_envelope(block, sample_width, full_scale, is_float, envelope="peak"):
+    samples = _frames_to_float(block, sample_width, full_scale, is_float)
+    if envelope == "rms":
+        return np.sqrt(np.mean(samples * samples, axis=1))
+    return np.max(np.abs(samples), axis=1)
+
+
+def adjust_subtitle_timing(subs, path, notSilenceThreshold, envelope="peak"):
+    """
+    Moves each subtitle start to the first frame after it whose volume is above notSilenceThreshold.
+
+    The frame volume is the peak over all channels (envelope="peak") or their RMS (envelope="rms"), relative to full scale.
+    """
+    samples, frameRate, sampleWidth, fullScale, isFloat = open_wav_memmap(path)
+    totalFrames = len(samples)
     for sub in subs:
         startTime = sub.start.total_seconds()
         startFrame = int(startTime * frameRate)
         endTime = sub.end.total_seconds()
-        endFrame = int(endTime * frameRate)
+        endFrame = min(int(endTime * frameRate), totalFrames)
 
         newStartTime = startTime
-        audio.setpos(startFrame)
-        readFrames = endFrame - startFrame
-        for i in range(readFrames):
-            frame = audio.readframes(1)
-            if not frame:
-                break
-            samples = struct.iter_unpack("<h", frame)
-            maxVolume = max(abs(sample[0]) / 32768 for sample in samples)
-            if maxVolume > notSilenceThreshold:
-                newStartTime = startTime + i / frameRate
+        for blockStart in range(startFrame, endFrame, ONSET_SEARCH_BLOCK_FRAMES):
+            blockEnd = min(blockStart + ONSET_SEARCH_BLOCK_FRAMES, endFrame)
+            volumes = frame_envelope(samples[blockStart:blockEnd], sampleWidth, fullScale, isFloat, envelope)
+            loud = np.flatnonzero(volumes > notSilenceThreshold)
+            if len(loud) > 0:
+                newStartTime = startTime + (blockStart - startFrame + loud[0]) / frameRate
                 break
 
         sub.start = datetime.timedelta(seconds=newStartTime)
 
 
-def transcribe_audio_en(logger, path, modelName="base.en", language="en", srtFilePathAndName="VIDEO_FILENAME.srt"):
+def iter_transcribed_sentences_en(logger, path, modelName="base.en", language="en"):
+    """
+    逐句产出英文转写结果（srt.Subtitle），Whisper 每断出一句就校准开头并立即产出，
+    下游的翻译和配音不必等整段音频转写完。
+    """
     # 非静音检测阈值，单位为分贝，越小越严格
     NOT_SILENCE_THRESHOLD_DB = -30
 
@@ -58,15 +170,16 @@ def transcribe_audio_en(logger, path, modelName="base.en", language="en", srtFil
     if language == "zh":
         initial_prompt = "简体"
 
-    model = WhisperModel(modelName, device="cuda", compute_type="float16", download_root="faster-whisper_models",
-                         local_files_only=False)
+    model = load_whisper_model(modelName)
     logger.info("Whisper model loaded.")
 
-    # faster-whisper
+    # 重新校准字幕开头，以字幕开始时间后声音大于阈值的第一帧为准
+    notSilenceThreshold = calculate_not_silence_threshold(NOT_SILENCE_THRESHOLD_DB)
+
+    # faster-whisper，segments 是生成器，边解码边产出
     segments, _ = model.transcribe(audio=path, language=language, word_timestamps=True, initial_prompt=initial_prompt)
     # 转换为srt的Subtitle对象
     index = 1
-    subs = []
     subtitle = None
     for segment in segments:
         for word in segment.words:
@@ -80,7 +193,8 @@ def transcribe_audio_en(logger, path, modelName="base.en", language="en", srtFil
             if (finalWord[-1] in END_INTERPUNCTION) and not (len(finalWord) > 1 and finalWord[-2] in NUMBER_CHARACTERS):
                 pushWord = " " + finalWord
                 subtitle.content += pushWord
-                subs.append(subtitle)
+                adjust_subtitle_timing([subtitle], path, notSilenceThreshold)
+                yield subtitle
                 index += 1
                 subtitle = None
 
@@ -97,14 +211,14 @@ def transcribe_audio_en(logger, path, modelName="base.en", language="en", srtFil
 
     # 补充最后一个字幕
     if subtitle is not None:
-        subs.append(subtitle)
-        index += 1
+        adjust_subtitle_timing([subtitle], path, notSilenceThreshold)
+        yield subtitle
 
     logger.info("Transcription complete.")
 
-    # 重新校准字幕开头，以字幕开始时间后声音大于阈值的第一帧为准
-    notSilenceThreshold = calculate_not_silence_threshold(NOT_SILENCE_THRESHOLD_DB)
-    adjust_subtitle_timing(subs, path, notSilenceThreshold)
+
+def transcribe_audio_en(logger, path, modelName="base.en", language="en", srtFilePathAndName="VIDEO_FILENAME.srt"):
+    subs = list(iter_transcribed_sentences_en(logger, path, modelName, language))
 
     save_srt_file(subs, srtFilePathAndName)
     logger.info("SRT file created.")
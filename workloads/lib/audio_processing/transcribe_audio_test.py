@@ -0,0 +1,137 @@
+import os
+import struct
+import datetime
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import srt
+
+from workloads.lib.audio_processing import transcribe_audio
+from workloads.lib.audio_processing.transcribe_audio import adjust_subtitle_timing, open_wav_memmap
+
+FRAME_RATE = 8000
+CHANNELS = 2
+THRESHOLD = 0.25
+
+
+def write_wav(path, samples, sample_width, is_float=False):
+    """按 sample_width 编码 [-1, 1) 范围内的 (frames, channels) 样本并写出 WAV，wave 模块不能写浮点格式所以手工写文件头"""
+    if is_float:
+        data = samples.astype("<f4").tobytes()
+    elif sample_width == 1:
+        data = (np.round(samples * 128) + 128).astype(np.uint8).tobytes()
+    else:
+        values = np.round(samples * (1 << (8 * sample_width - 1))).astype("<i4")
+        if sample_width == 3:
+            data = values.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+        else:
+            data = values.astype({2: "<i2", 4: "<i4"}[sample_width]).tobytes()
+    block_align = sample_width * CHANNELS
+    fmt = struct.pack("<HHIIHH", 3 if is_float else 1, CHANNELS, FRAME_RATE, FRAME_RATE * block_align, block_align,
+                      8 * sample_width)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<4sI4s", b"RIFF", 4 + 8 + len(fmt) + 8 + len(data), b"WAVE"))
+        f.write(struct.pack("<4sI", b"fmt ", len(fmt)) + fmt)
+        f.write(struct.pack("<4sI", b"data", len(data)) + data)
+
+
+def decode_frame(frame, sample_width, is_float):
+    """逐帧解码，16 bit 与原实现相同，其余位宽按同样的方式推广"""
+    if is_float:
+        return [abs(sample[0]) for sample in struct.iter_unpack("<f", frame)]
+    if sample_width == 2:
+        return [abs(sample[0]) / 32768 for sample in struct.iter_unpack("<h", frame)]
+    if sample_width == 1:
+        return [abs(value - 128) / 128 for value in frame]
+    samples = [frame[i:i + sample_width] for i in range(0, len(frame), sample_width)]
+    return [abs(int.from_bytes(sample, "little", signed=True)) / (1 << (8 * sample_width - 1)) for sample in samples]
+
+
+def per_frame_onsets(subs, path, notSilenceThreshold, sample_width, is_float):
+    """原先逐帧读取的实现，返回调整后的字幕开始时间"""
+    with open(path, "rb") as f:
+        data = f.read()[44:]
+    frame_size = sample_width * CHANNELS
+    starts = []
+    for sub in subs:
+        startTime = sub.start.total_seconds()
+        startFrame = int(startTime * FRAME_RATE)
+        endFrame = int(sub.end.total_seconds() * FRAME_RATE)
+
+        newStartTime = startTime
+        for i in range(endFrame - startFrame):
+            frame = data[(startFrame + i) * frame_size:(startFrame + i + 1) * frame_size]
+            if not frame:
+                break
+            if max(decode_frame(frame, sample_width, is_float)) > notSilenceThreshold:
+                newStartTime = startTime + i / FRAME_RATE
+                break
+        starts.append(datetime.timedelta(seconds=newStartTime))
+    return starts
+
+
+def make_subs():
+    spans = [(0.0, 0.3), (0.25, 0.6), (0.61, 0.9), (0.9, 1.2), (1.5, 1.7), (1.9, 2.5)]
+    return [srt.Subtitle(index=i + 1, start=datetime.timedelta(seconds=start), end=datetime.timedelta(seconds=end),
+                         content=f"line {i}") for i, (start, end) in enumerate(spans)]
+
+
+class TestAdjustSubtitleTiming(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        # 低于阈值的底噪，中间夹着只出现在一个声道上的响声；恰好等于阈值的样本不算响
+        samples = rng.uniform(-0.2, 0.2, size=(2 * FRAME_RATE, CHANNELS))
+        samples[1000, 0] = -THRESHOLD
+        samples[1001, 1] = 0.5
+        samples[2400:2600, 0] = 0.5
+        samples[5123, 1] = -0.75
+        samples[7300:, :] = rng.uniform(-0.9, 0.9, size=(2 * FRAME_RATE - 7300, CHANNELS))
+        samples[12000:14000, :] = 0
+        self.samples = samples
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def assert_matches_per_frame_loop(self, sample_width, is_float=False):
+        path = os.path.join(self.temp_dir.name, f"{sample_width}_{is_float}.wav")
+        write_wav(path, self.samples, sample_width, is_float)
+        subs = make_subs()
+        expected = per_frame_onsets(subs, path, THRESHOLD, sample_width, is_float)
+
+        adjust_subtitle_timing(subs, path, THRESHOLD)
+        self.assertEqual([sub.start for sub in subs], expected)
+        # 检测块小于字幕长度时结果不变
+        subs = make_subs()
+        with patch.object(transcribe_audio, "ONSET_SEARCH_BLOCK_FRAMES", 7):
+            adjust_subtitle_timing(subs, path, THRESHOLD)
+        self.assertEqual([sub.start for sub in subs], expected)
+
+    def test_8_bit_pcm(self):
+        self.assert_matches_per_frame_loop(1)
+
+    def test_16_bit_pcm(self):
+        self.assert_matches_per_frame_loop(2)
+
+    def test_24_bit_pcm(self):
+        self.assert_matches_per_frame_loop(3)
+
+    def test_32_bit_pcm(self):
+        self.assert_matches_per_frame_loop(4)
+
+    def test_float_wav(self):
+        self.assert_matches_per_frame_loop(4, is_float=True)
+
+    def test_memmap_header(self):
+        path = os.path.join(self.temp_dir.name, "24.wav")
+        write_wav(path, self.samples, 3)
+        samples, frame_rate, sample_width, full_scale, is_float = open_wav_memmap(path)
+        self.assertEqual((samples.shape, frame_rate, sample_width, full_scale, is_float),
+                         ((2 * FRAME_RATE, CHANNELS, 3), FRAME_RATE, 3, float(1 << 23), False))
+
+
+if __name__ == '__main__':
+    unittest.main()
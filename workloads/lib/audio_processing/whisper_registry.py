@@ -0,0 +1,122 @@
+import collections
+import gc
+import threading
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+
+WHISPER_MODEL_HITS = Counter("whisper_model_registry_hits_total", "Whisper model requests served by a warm model",
+                             ["model"])
+WHISPER_MODEL_MISSES = Counter("whisper_model_registry_misses_total", "Whisper model requests that had to load the model",
+                               ["model"])
+WHISPER_MODEL_EVICTIONS = Counter("whisper_model_registry_evictions_total", "Whisper models evicted from the registry",
+                                  ["model"])
+WHISPER_MODEL_LOAD_SECONDS = Histogram("whisper_model_load_seconds", "Time spent loading a Whisper model", ["model"],
+                                       buckets=[1, 2, 5, 10, 20, 30, 60, 120, 300])
+WHISPER_MODELS_LOADED = Gauge("whisper_models_loaded", "Whisper models currently kept warm")
+WHISPER_MODELS_BYTES = Gauge("whisper_models_estimated_bytes", "Estimated memory held by warm Whisper models")
+
+# Parameter counts of the released Whisper checkpoints, used to estimate memory use.
+# Variants come before their base size so "large-v3-turbo" is a turbo and not a large model.
+WHISPER_MODEL_PARAMETERS = {
+    "turbo": 809_000_000,
+    "distil-large": 756_000_000,
+    "tiny": 39_000_000,
+    "base": 74_000_000,
+    "small": 244_000_000,
+    "medium": 769_000_000,
+    "large": 1_550_000_000,
+}
+COMPUTE_TYPE_BYTES = {
+    "float32": 4,
+    "float16": 2,
+    "bfloat16": 2,
+    "int8_float32": 1,
+    "int8_float16": 1,
+    "int8_bfloat16": 1,
+    "int8": 1,
+}
+
+
+def estimate_whisper_model_bytes(model_name, compute_type):
+    name = model_name.split("/")[-1].replace("faster-whisper-", "")
+    parameters = WHISPER_MODEL_PARAMETERS["large"]
+    for size_name, size_parameters in WHISPER_MODEL_PARAMETERS.items():
+        if size_name in name:
+            parameters = size_parameters
+            break
+    return parameters * COMPUTE_TYPE_BYTES.get(compute_type, 2)
+
+
+class WhisperModelRegistry(object):
+    """
+    Process-wide cache of loaded Whisper models keyed by (model name, device, compute type).
+
+    Models stay warm between requests and the least recently used ones are evicted once the estimated
+    memory of all warm models exceeds memory_budget_bytes. Concurrent requests for a model that is being
+    loaded wait for that load instead of starting their own.
+    """
+
+    def __init__(self, loader, memory_budget_bytes, size_estimator=estimate_whisper_model_bytes):
+        self.loader = loader
+        self.memory_budget_bytes = memory_budget_bytes
+        self.size_estimator = size_estimator
+        self.models = collections.OrderedDict()
+        self.loading = {}
+        self.lock = threading.Lock()
+
+    def get(self, model_name, device="cuda", compute_type="float16"):
+        key = (model_name, device, compute_type)
+        while True:
+            with self.lock:
+                if key in self.models:
+                    self.models.move_to_end(key)
+                    WHISPER_MODEL_HITS.labels(model=model_name).inc()
+                    return self.models[key][0]
+
+                loaded = self.loading.get(key)
+                if loaded is None:
+                    self.loading[key] = threading.Event()
+                    break
+            loaded.wait()
+
+        WHISPER_MODEL_MISSES.labels(model=model_name).inc()
+        try:
+            start_time = time.time()
+            model = self.loader(model_name, device, compute_type)
+            WHISPER_MODEL_LOAD_SECONDS.labels(model=model_name).observe(time.time() - start_time)
+
+            size = self.size_estimator(model_name, compute_type)
+            with self.lock:
+                self._make_room(size)
+                self.models[key] = (model, size)
+                self._update_gauges()
+            return model
+        finally:
+            with self.lock:
+                self.loading.pop(key).set()
+
+    def _make_room(self, size):
+        evicted = False
+        while self.models and self._total_bytes() + size > self.memory_budget_bytes:
+            (model_name, _, _), _ = self.models.popitem(last=False)
+            WHISPER_MODEL_EVICTIONS.labels(model=model_name).inc()
+            evicted = True
+        if evicted:
+            # Release the evicted models' device memory before the new one is kept
+            gc.collect()
+
+    def _total_bytes(self):
+        return sum(size for _, size in self.models.values())
+
+    def _update_gauges(self):
+        WHISPER_MODELS_LOADED.set(len(self.models))
+        WHISPER_MODELS_BYTES.set(self._total_bytes())
+
+    def preload(self, model_names, device="cuda", compute_type="float16"):
+        for model_name in model_names:
+            self.get(model_name, device, compute_type)
+
+    def loaded_models(self):
+        with self.lock:
+            return list(self.models.keys())
@@ -0,0 +1,58 @@
+import threading
+import time
+import unittest
+
+from workloads.lib.audio_processing.whisper_registry import WhisperModelRegistry, estimate_whisper_model_bytes
+
+
+class TestWhisperModelRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.loads = []
+
+    def loader(self, model_name, device, compute_type):
+        self.loads.append(model_name)
+        return object()
+
+    def test_warm_model_is_reused(self):
+        registry = WhisperModelRegistry(self.loader, memory_budget_bytes=100, size_estimator=lambda name, ct: 10)
+
+        first = registry.get("medium")
+        second = registry.get("medium")
+
+        self.assertIs(first, second)
+        self.assertEqual(self.loads, ["medium"])
+
+    def test_least_recently_used_model_is_evicted(self):
+        registry = WhisperModelRegistry(self.loader, memory_budget_bytes=20, size_estimator=lambda name, ct: 10)
+
+        registry.get("tiny")
+        registry.get("base")
+        registry.get("tiny")
+        registry.get("small")
+
+        self.assertEqual([key[0] for key in registry.loaded_models()], ["tiny", "small"])
+
+    def test_concurrent_requests_load_once(self):
+        def slow_loader(model_name, device, compute_type):
+            time.sleep(0.05)
+            return self.loader(model_name, device, compute_type)
+
+        registry = WhisperModelRegistry(slow_loader, memory_budget_bytes=100, size_estimator=lambda name, ct: 10)
+        models = []
+        threads = [threading.Thread(target=lambda: models.append(registry.get("medium"))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.loads, ["medium"])
+        self.assertTrue(all(model is models[0] for model in models))
+
+    def test_estimate_model_bytes(self):
+        self.assertEqual(estimate_whisper_model_bytes("medium.en", "float16"), 769_000_000 * 2)
+        self.assertEqual(estimate_whisper_model_bytes("large-v3-turbo", "int8"), 809_000_000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import collections
+import threading
+import time
+
+import numpy as np
+
+
+class _PatchJob(object):
+
+    def __init__(self, patches):
+        self.patches = patches
+        self.next = 0
+        self.masks = [None] * len(patches)
+        self.remaining = len(patches)
+        self.error = None
+        self.done = threading.Event()
+
+
+class PatchBatchScheduler(object):
+    """
+    Shares model batches between every separation job running in the process.
+
+    Jobs hand over all their crop patches and block until the masks are back. A single worker thread fills
+    batches round-robin across jobs, so a short job is not stuck behind a long one, and flushes a batch as
+    soon as it is full or the oldest queued patch has waited max_wait seconds.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait=0.02, on_batch=None):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        # Called with (batch_size, n_jobs) after every flushed batch, used for metrics
+        self.on_batch = on_batch
+        self.jobs = collections.deque()
+        self.cond = threading.Condition()
+        self.worker = threading.Thread(target=self._run, name='patch-batch-scheduler', daemon=True)
+        self.worker.start()
+
+    def pending_patches(self):
+        with self.cond:
+            return sum(len(job.patches) - job.next for job in self.jobs)
+
+    def pending_jobs(self):
+        with self.cond:
+            return len(self.jobs)
+
+    def submit(self, patches):
+        """Returns the masks of patches as an array of shape (n_patches, channels, bins, roi_size)."""
+        if len(patches) == 0:
+            raise ValueError('no patches to predict')
+        job = _PatchJob(patches)
+
+        with self.cond:
+            self.jobs.append(job)
+            self.cond.notify()
+        job.done.wait()
+
+        if job.error is not None:
+            raise job.error
+        return np.asarray(job.masks)
+
+    def _take_batch(self):
+        batch = []
+        while self.jobs and len(batch) < self.max_batch_size:
+            job = self.jobs.popleft()
+            batch.append((job, job.next))
+            job.next += 1
+            if job.next < len(job.patches):
+                self.jobs.append(job)
+        return batch
+
+    def _wait_for_batch(self):
+        with self.cond:
+            while not self.jobs:
+                self.cond.wait()
+
+            deadline = time.monotonic() + self.max_wait
+            while sum(len(job.patches) - job.next for job in self.jobs) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+
+            return self._take_batch()
+
+    def _run(self):
+        while True:
+            batch = self._wait_for_batch()
+            jobs = {id(job): job for job, _ in batch}
+            try:
+                masks = self.predict_fn(np.asarray([job.patches[i] for job, i in batch]))
+            except Exception as e:
+                with self.cond:
+                    for job in jobs.values():
+                        job.error = e
+                        if job in self.jobs:
+                            self.jobs.remove(job)
+                        job.done.set()
+                continue
+
+            for (job, i), mask in zip(batch, masks):
+                job.masks[i] = mask
+                job.remaining -= 1
+                if job.remaining == 0 and job.error is None:
+                    job.done.set()
+
+            if self.on_batch is not None:
+                self.on_batch(len(batch), len(jobs))
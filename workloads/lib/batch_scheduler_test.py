@@ -0,0 +1,60 @@
+import threading
+import unittest
+
+import numpy as np
+
+from workloads.lib.batch_scheduler import PatchBatchScheduler
+
+
+class TestPatchBatchScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.batches = []
+
+    def predict(self, X_batch):
+        self.batches.append(len(X_batch))
+        return X_batch * 2
+
+    def test_submit_returns_masks_in_order(self):
+        scheduler = PatchBatchScheduler(self.predict, max_batch_size=4, max_wait=0.01)
+        patches = np.arange(6 * 2, dtype=np.float32).reshape(6, 1, 1, 2)
+
+        masks = scheduler.submit(patches)
+
+        np.testing.assert_array_equal(masks, patches * 2)
+        self.assertEqual(self.batches, [4, 2])
+
+    def test_concurrent_jobs_share_batches(self):
+        scheduler = PatchBatchScheduler(self.predict, max_batch_size=4, max_wait=0.2)
+        fills = []
+        scheduler.on_batch = lambda batch_size, n_jobs: fills.append((batch_size, n_jobs))
+        results = {}
+
+        def run(name, n):
+            patches = np.full((n, 1, 1, 1), n, dtype=np.float32)
+            results[name] = scheduler.submit(patches)
+
+        threads = [threading.Thread(target=run, args=(name, n)) for name, n in (("a", 2), ("b", 2))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        np.testing.assert_array_equal(results["a"], np.full((2, 1, 1, 1), 4))
+        np.testing.assert_array_equal(results["b"], np.full((2, 1, 1, 1), 4))
+        self.assertEqual(fills, [(4, 2)])
+        self.assertEqual(scheduler.pending_patches(), 0)
+
+    def test_predict_error_is_raised_in_submitting_job(self):
+        def fail(X_batch):
+            raise RuntimeError("device lost")
+
+        scheduler = PatchBatchScheduler(fail, max_batch_size=2, max_wait=0.01)
+
+        with self.assertRaises(RuntimeError):
+            scheduler.submit(np.zeros((5, 1, 1, 1), dtype=np.float32))
+        self.assertEqual(scheduler.pending_jobs(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_STATES = (JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED)
+
+
+class JobManager(object):
+    """
+    Runs workload functions on a bounded thread pool and keeps their state so callers can poll for it
+    instead of holding an HTTP request open. Finished jobs are forgotten after ttl seconds.
+    """
+
+    def __init__(self, max_workers=2, ttl=24 * 3600):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gpu-job")
+        self.ttl = ttl
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, job_type, fn, *args, **kwargs):
+        return self._submit(job_type, fn, False, args, kwargs)
+
+    def submit_streaming(self, job_type, fn, *args, **kwargs):
+        """
+        Like submit, but fn is also given an emit callback. Items passed to emit are readable through get_partial
+        while the job is still running, so callers can start on the first results before the job finishes.
+        """
+        return self._submit(job_type, fn, True, args, kwargs)
+
+    def _submit(self, job_type, fn, streaming, args, kwargs):
+        self._evict_expired()
+
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "type": job_type,
+            "state": JOB_QUEUED,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+            "partial": [],
+        }
+        if streaming:
+            kwargs = dict(kwargs, emit=lambda item: self._emit(job, item))
+        with self.lock:
+            self.jobs[job_id] = job
+        self.executor.submit(self._run, job, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job, fn, args, kwargs):
+        with self.lock:
+            job["state"] = JOB_RUNNING
+            job["started_at"] = time.time()
+        try:
+            result = fn(*args, **kwargs)
+            with self.lock:
+                job["result"] = result
+                job["state"] = JOB_SUCCEEDED
+                job["finished_at"] = time.time()
+        except Exception as e:
+            with self.lock:
+                job["error"] = str(e)
+                job["state"] = JOB_FAILED
+                job["finished_at"] = time.time()
+
+    def _emit(self, job, item):
+        with self.lock:
+            job["partial"].append(item)
+
+    def _evict_expired(self):
+        now = time.time()
+        with self.lock:
+            expired = [job_id for job_id, job in self.jobs.items()
+                       if job["finished_at"] is not None and now - job["finished_at"] > self.ttl]
+            for job_id in expired:
+                del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def get_partial(self, job_id, start=0):
+        """Returns the job state with the items emitted from index start on, or None for unknown jobs."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            return {"job_id": job_id, "state": job["state"], "error": job["error"],
+                    "items": job["partial"][start:], "next": len(job["partial"])}
+
+    def count(self, state):
+        with self.lock:
+            return sum(1 for job in self.jobs.values() if job["state"] == state)
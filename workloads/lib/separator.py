@@ -8,13 +8,15 @@ from workloads.lib import spec_utils
 
 class Separator(object):
 
-    def __init__(self, model, device=None, batchsize=1, cropsize=256, postprocess=False):
+    def __init__(self, model, device=None, batchsize=1, cropsize=256, postprocess=False, scheduler=None):
         self.model = model
         self.offset = model.offset
         self.device = device
         self.batchsize = batchsize
         self.cropsize = cropsize
         self.postprocess = postprocess
+        # Optional PatchBatchScheduler that batches patches together with other concurrent jobs
+        self.scheduler = scheduler
 
     def _postprocess(self, X_spec, mask):
         if self.postprocess:
@@ -42,23 +44,30 @@ class Separator(object):
 
         X_dataset = np.asarray(X_dataset)
 
+        return self._predict_patches(X_dataset, progress=True)
+
+    def _predict_batch(self, X_batch):
         self.model.eval()
         with torch.no_grad():
-            mask_list = []
-            # To reduce the overhead, dataloader is not used.
-            for i in tqdm(range(0, patches, self.batchsize)):
-                X_batch = X_dataset[i: i + self.batchsize]
-                X_batch = torch.from_numpy(X_batch).to(self.device)
+            X_batch = torch.from_numpy(X_batch).to(self.device)
 
-                mask = self.model.predict_mask(torch.abs(X_batch))
+            mask = self.model.predict_mask(torch.abs(X_batch))
 
-                mask = mask.detach().cpu().numpy()
-                mask = np.concatenate(mask, axis=2)
-                mask_list.append(mask)
+            return mask.detach().cpu().numpy()
+
+    def _predict_patches(self, X_dataset, progress=False):
+        if self.scheduler is not None:
+            mask = self.scheduler.submit(X_dataset)
+        else:
+            mask_list = []
+            batches = range(0, len(X_dataset), self.batchsize)
+            # To reduce the overhead, dataloader is not used.
+            for i in (tqdm(batches) if progress else batches):
+                mask_list.append(self._predict_batch(X_dataset[i: i + self.batchsize]))
 
-            mask = np.concatenate(mask_list, axis=2)
+            mask = np.concatenate(mask_list)
 
-        return mask
+        return np.concatenate(mask, axis=2)
 
     def separate(self, X_spec):
         n_frame = X_spec.shape[2]
@@ -23,9 +23,9 @@ def crop_center(h1, h2):
     return h1
 
 
-def wave_to_spectrogram(wave, hop_length, n_fft):
-    spec_left = librosa.stft(wave[0], n_fft=n_fft, hop_length=hop_length)
-    spec_right = librosa.stft(wave[1], n_fft=n_fft, hop_length=hop_length)
+def wave_to_spectrogram(wave, hop_length, n_fft, center=True):
+    spec_left = librosa.stft(wave[0], n_fft=n_fft, hop_length=hop_length, center=center)
+    spec_right = librosa.stft(wave[1], n_fft=n_fft, hop_length=hop_length, center=center)
     spec = np.asarray([spec_left, spec_right])
 
     return spec
@@ -154,12 +154,12 @@ def cache_or_load(mix_path, inst_path, sr, hop_length, n_fft):
     return X, y, mix_cache_path, inst_cache_path
 
 
-def spectrogram_to_wave(spec, hop_length=1024):
+def spectrogram_to_wave(spec, hop_length=1024, center=True):
     if spec.ndim == 2:
-        wave = librosa.istft(spec, hop_length=hop_length)
+        wave = librosa.istft(spec, hop_length=hop_length, center=center)
     elif spec.ndim == 3:
-        wave_left = librosa.istft(spec[0], hop_length=hop_length)
-        wave_right = librosa.istft(spec[1], hop_length=hop_length)
+        wave_left = librosa.istft(spec[0], hop_length=hop_length, center=center)
+        wave_right = librosa.istft(spec[1], hop_length=hop_length, center=center)
         wave = np.asarray([wave_left, wave_right])
 
     return wave
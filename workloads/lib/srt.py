@@ -3,21 +3,13 @@ import re
 import srt
 
 
-def srt_sentense_merge(logger, source_srt_path, output_srt_path):
-    try:
-        with open(source_srt_path, "r", encoding="utf-8") as file:
-            srt_content = file.read()
-    except IOError as e:
-        logger.error(f"Failed to read source file: {e}")
-        return False
-
-    subtitles = list(srt.parse(srt_content))
-    if not subtitles:
-        logger.warning("No subtitles found.")
-        return False
+def merge_sentences(logger, subtitles):
+    """
+    把 Whisper 断出的短句按句号、感叹号、问号拼成整句，逐句产出。
 
+    subtitles 可以是生成器，每读到一句完整的话就立即产出，转写还没结束时下游就可以开始处理。
+    """
     subPorcessingIndex = 1
-    subItemList = []
     subItemProcessing = None
     for subItem in subtitles:
         dotIndex = subItem.content.rfind('.')
@@ -31,18 +23,6 @@ def srt_sentense_merge(logger, source_srt_path, output_srt_path):
             logString += f"Content: {subItem.content}"
             logger.info(logString)
 
-        # 以后一个字幕，直接拼接送入就可以了
-        if subItem == subtitles[-1]:
-            if subItemProcessing is None:
-                subItemProcessing = copy.copy(subItem)
-                subItemList.append(subItemProcessing)
-                break
-            else:
-                subItemProcessing.end = subItem.end
-                subItemProcessing.content += subItem.content
-                subItemList.append(subItemProcessing)
-                break
-
         # 新处理一串字符，则拷贝
         if subItemProcessing is None:
             subItemProcessing = copy.copy(subItem)
@@ -53,10 +33,30 @@ def srt_sentense_merge(logger, source_srt_path, output_srt_path):
         subItemProcessing.content += subItem.content
         # 如果一句话结束了，就把这一句话送入处理
         if endSentenceIndex == len(subItem.content) - 1:
-            subItemList.append(subItemProcessing)
+            yield subItemProcessing
             subItemProcessing = None
             subPorcessingIndex += 1
 
+    # 最后一个字幕没有句尾标点时，直接拼接送入
+    if subItemProcessing is not None:
+        yield subItemProcessing
+
+
+def srt_sentense_merge(logger, source_srt_path, output_srt_path):
+    try:
+        with open(source_srt_path, "r", encoding="utf-8") as file:
+            srt_content = file.read()
+    except IOError as e:
+        logger.error(f"Failed to read source file: {e}")
+        return False
+
+    subtitles = list(srt.parse(srt_content))
+    if not subtitles:
+        logger.warning("No subtitles found.")
+        return False
+
+    subItemList = list(merge_sentences(logger, subtitles))
+
     srtContent = srt.compose(subItemList)
     # 如果打开错误则返回false
     with open(output_srt_path, "w", encoding="utf-8") as file:
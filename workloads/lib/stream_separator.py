@@ -0,0 +1,161 @@
+import math
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from workloads.lib import spec_utils
+
+# Extra source samples decoded around every block when the input must be resampled, so the resampling
+# filter sees real neighbours instead of the block edge.
+RESAMPLE_MARGIN = 4096
+
+
+class AudioBlockReader(object):
+    """Random access to a stereo, fixed sample rate view of an audio file, zero outside the file."""
+
+    def __init__(self, path, sr):
+        self.file = sf.SoundFile(path)
+        self.sr = sr
+        self.src_sr = self.file.samplerate
+        if self.src_sr == sr:
+            self.length = self.file.frames
+        else:
+            gcd = math.gcd(self.src_sr, sr)
+            self.src_step, self.dst_step = self.src_sr // gcd, sr // gcd
+            self.length = int(math.ceil(self.file.frames * sr / self.src_sr))
+
+    def _read_source(self, start, stop):
+        self.file.seek(start)
+        wave = self.file.read(stop - start, dtype='float32', always_2d=True).T
+        if wave.shape[0] == 1:
+            # mono to stereo
+            wave = np.concatenate([wave, wave])
+        return wave[:2]
+
+    def _read_resampled(self, start, stop):
+        # Align the source window to the rate ratio so that resampled samples land on the global grid.
+        src_start = max(start * self.src_sr // self.sr - RESAMPLE_MARGIN, 0)
+        src_start -= src_start % self.src_step
+        src_stop = min(-(-stop * self.src_sr // self.sr) + RESAMPLE_MARGIN, self.file.frames)
+        wave = librosa.resample(self._read_source(src_start, src_stop), orig_sr=self.src_sr, target_sr=self.sr,
+                                res_type='kaiser_fast')
+        offset = start - src_start // self.src_step * self.dst_step
+        return wave[:, offset:offset + stop - start]
+
+    def read(self, start, stop):
+        wave = np.zeros((2, stop - start), dtype=np.float32)
+        lo, hi = max(start, 0), min(stop, self.length)
+        if lo < hi:
+            if self.src_sr == self.sr:
+                block = self._read_source(lo, hi)
+            else:
+                block = self._read_resampled(lo, hi)
+            wave[:, lo - start:lo - start + block.shape[1]] = block
+        return wave
+
+    def close(self):
+        self.file.close()
+
+
+class StreamingSeparator(object):
+    """
+    Runs Separator.separate_tta over a file in blocks of STFT frames.
+
+    Every block is decoded, transformed, masked and inverted on its own with enough context on both sides
+    for the crops that touch it, so peak memory follows block_size instead of the file length. The only
+    global quantity, the spectrogram peak used for normalization, is collected in a cheap first pass.
+    """
+
+    def __init__(self, separator, sr=44100, n_fft=2048, hop_length=1024, block_size=32):
+        if separator.postprocess:
+            raise ValueError('postprocess needs the whole mask and is not supported in streaming mode')
+
+        self.separator = separator
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.offset = separator.offset
+        self.roi_size = separator.cropsize - self.offset * 2
+        if self.roi_size == 0:
+            self.roi_size = separator.cropsize
+        # block_size is counted in model patches (roi_size frames each)
+        self.block_frames = block_size * self.roi_size
+
+    def _spectrogram(self, reader, n_frame, start, stop):
+        spec = np.zeros((2, self.n_fft // 2 + 1, stop - start), dtype=np.complex64)
+        lo, hi = max(start, 0), min(stop, n_frame)
+        if lo < hi:
+            # Frame t of a centered STFT covers samples [t * hop - n_fft // 2, t * hop + n_fft // 2).
+            half = self.n_fft // 2
+            wave = reader.read(lo * self.hop_length - half, (hi - 1) * self.hop_length + half)
+            spec[:, :, lo - start:hi - start] = spec_utils.wave_to_spectrogram(wave, self.hop_length, self.n_fft, center=False)
+        return spec
+
+    def _peak(self, reader, n_frame):
+        # Same value as X_spec_pad.max() in separate_tta, including the zero padding.
+        peak = 0j
+        for start in range(0, n_frame, self.block_frames):
+            block_peak = self._spectrogram(reader, n_frame, start, start + self.block_frames).max()
+            if (block_peak.real, block_peak.imag) > (peak.real, peak.imag):
+                peak = block_peak
+        return abs(peak) or 1.0
+
+    def _block_mask(self, X_ctx, ctx_start, start, stop):
+        roi_size, offset, cropsize = self.roi_size, self.offset, self.separator.cropsize
+        first, last = start // roi_size, stop // roi_size
+
+        crops = []
+        for i in range(first, last):
+            crop_start = i * roi_size - offset - ctx_start
+            crops.append(X_ctx[:, :, crop_start:crop_start + cropsize])
+        for i in range(first, last + 1):
+            crop_start = i * roi_size - roi_size // 2 - offset - ctx_start
+            crops.append(X_ctx[:, :, crop_start:crop_start + cropsize])
+
+        masks = self.separator._predict_patches(np.asarray(crops))
+        n = (last - first) * roi_size
+        mask = masks[:, :, :n]
+        mask_tta = masks[:, :, n + roi_size // 2:n + roi_size // 2 + n]
+        return (mask + mask_tta) * 0.5
+
+    def _to_wave(self, spec):
+        # Without centering the inverse covers samples [first_frame * hop - n_fft // 2, ...); keep only the
+        # part every contributing frame is present for.
+        wave = spec_utils.spectrogram_to_wave(spec, hop_length=self.hop_length, center=False)
+        half = self.n_fft // 2
+        return wave[:, half:half + (spec.shape[2] - 1) * self.hop_length]
+
+    def separate_tta_to_files(self, file_path, background_wave_path, voice_wave_path):
+        reader = AudioBlockReader(file_path, self.sr)
+        n_frame = 1 + reader.length // self.hop_length
+        try:
+            scale = self._peak(reader, n_frame)
+
+            # Context needed around a block: half a patch for the TTA grid plus the model's own offset.
+            ctx_left = self.roi_size // 2 + self.offset
+            ctx_right = self.roi_size - self.roi_size // 2 + self.offset
+            y_carry, v_carry = None, None
+            with sf.SoundFile(background_wave_path, 'w', samplerate=self.sr, channels=2) as bg_file, \
+                    sf.SoundFile(voice_wave_path, 'w', samplerate=self.sr, channels=2) as voice_file:
+                for start in range(0, n_frame, self.block_frames):
+                    stop = start + self.block_frames
+                    X_ctx = self._spectrogram(reader, n_frame, start - ctx_left, stop + ctx_right)
+                    mask = self._block_mask(np.abs(X_ctx) / scale, start - ctx_left, start, stop)
+
+                    n = min(stop, n_frame) - start
+                    X_spec = X_ctx[:, :, ctx_left:ctx_left + n]
+                    y_spec, v_spec = self.separator._postprocess(X_spec, mask[:, :, :n])
+
+                    # The last frame of a block also shapes the first samples of the next one.
+                    if y_carry is not None:
+                        y_spec = np.concatenate([y_carry, y_spec], axis=2)
+                        v_spec = np.concatenate([v_carry, v_spec], axis=2)
+                    y_carry, v_carry = y_spec[:, :, -1:], v_spec[:, :, -1:]
+                    if y_spec.shape[2] > 1:
+                        bg_file.write(self._to_wave(y_spec).T)
+                        voice_file.write(self._to_wave(v_spec).T)
+        finally:
+            reader.close()
+
+        return self.sr
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+
+import librosa
+import numpy as np
+import soundfile as sf
+import torch
+
+from workloads.lib import spec_utils
+from workloads.lib.separator import Separator
+from workloads.lib.stream_separator import StreamingSeparator
+
+SR = 44100
+HOP_LENGTH = 1024
+N_FFT = 2048
+
+
+class StubModel(object):
+    """与真实模型一样按 offset 裁掉两侧的掩码，掩码依赖幅度的绝对大小和整个 crop 的均值"""
+
+    offset = 4
+
+    def eval(self):
+        pass
+
+    def predict_mask(self, x):
+        mask = torch.sigmoid(8 * x - x.mean(dim=3, keepdim=True))
+        return mask[:, :, :, self.offset:-self.offset]
+
+
+def separate_whole_file(separator, path, background_path, voice_path):
+    """非流式路径：整段解码后调用 separate_tta，与 inference.py 中相同"""
+    X, _ = librosa.load(path, sr=SR, mono=False, dtype=np.float32, res_type='kaiser_fast')
+    if X.ndim == 1:
+        X = np.asarray([X, X])
+    x_spec = spec_utils.wave_to_spectrogram(X, hop_length=HOP_LENGTH, n_fft=N_FFT)
+    y_spec, v_spec = separator.separate_tta(x_spec)
+    sf.write(background_path, spec_utils.spectrogram_to_wave(y_spec).T, SR)
+    sf.write(voice_path, spec_utils.spectrogram_to_wave(v_spec).T, SR)
+
+
+class TestStreamingSeparator(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.separator = Separator(StubModel(), device='cpu', batchsize=4, cropsize=16)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.temp_dir.name, name)
+
+    def assert_matches_separate_tta(self, wave, sr):
+        sf.write(self.path('input.wav'), wave, sr)
+        separate_whole_file(self.separator, self.path('input.wav'), self.path('bg.wav'), self.path('voice.wav'))
+        # 每块 3 个 patch，输入跨越多个块，最后一块不满
+        streaming = StreamingSeparator(self.separator, sr=SR, n_fft=N_FFT, hop_length=HOP_LENGTH, block_size=3)
+        streaming.separate_tta_to_files(self.path('input.wav'), self.path('bg_stream.wav'),
+                                        self.path('voice_stream.wav'))
+
+        for name in ('bg', 'voice'):
+            expected, _ = sf.read(self.path(f'{name}.wav'), dtype='int16')
+            actual, _ = sf.read(self.path(f'{name}_stream.wav'), dtype='int16')
+            self.assertEqual(actual.shape, expected.shape)
+            self.assertLessEqual(np.abs(actual.astype(np.int32) - expected).max(), 1)
+
+    def test_stereo_at_model_rate(self):
+        rng = np.random.default_rng(0)
+        t = np.arange(int(SR * 2.3)) / SR
+        wave = np.stack([0.3 * np.sin(2 * np.pi * 440 * t), 0.2 * np.sin(2 * np.pi * 1250 * t)], axis=1)
+        wave += rng.normal(0, 0.05, wave.shape)
+        self.assert_matches_separate_tta(wave, SR)
+
+    def test_mono_with_resampling(self):
+        rng = np.random.default_rng(1)
+        sr = 22050
+        t = np.arange(int(sr * 2.3)) / sr
+        wave = 0.3 * np.sin(2 * np.pi * 330 * t) * (1 + np.sin(2 * np.pi * 2 * t)) / 2 + rng.normal(0, 0.05, len(t))
+        self.assert_matches_separate_tta(wave, sr)
+
+
+if __name__ == '__main__':
+    unittest.main()